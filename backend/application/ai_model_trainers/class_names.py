@@ -0,0 +1,23 @@
+import os
+import json
+
+# Имена классов хранятся рядом с моделью: порядок совпадает с номерами выходов сети
+class_names_file_name = 'class_names.json'
+
+def save_class_names(class_names, model_folder_path):
+    with open(os.path.join(model_folder_path, class_names_file_name), 'w', encoding='utf-8') as f:
+        json.dump(list(class_names), f, ensure_ascii=False)
+
+def load_class_names(model_folder_path):
+    """
+    Чтение имен классов сохраненной модели.
+
+    :param model_folder_path: Папка модели
+    :return: Список имен классов, либо None для моделей, сохраненных без class_names.json
+    """
+    class_names_path = os.path.join(model_folder_path, class_names_file_name)
+    if not os.path.isfile(class_names_path):
+        return None
+
+    with open(class_names_path, 'r', encoding='utf-8') as f:
+        return json.load(f)
@@ -1,18 +1,27 @@
+import logging
 import os
-import random
-from matplotlib import pyplot as plt
+import json
+import shutil
 from tensorflow import keras
-import tensorflow as tf
 from tensorflow.keras import layers
 from tensorflow.keras.callbacks import EarlyStopping
 
 import numpy as np
 from application import config_paths
 from application.results.Result import Result
-from application.ai_model_trainers.get_last_version import get_last_version_model
-from application.services import data_storage_services
+from application.ai_model_trainers.training_plots import create_training_plots
+from application.ai_model_trainers.class_names import save_class_names
+from application.services import data_storage_services, dataset_files_service
 from application.services.zip_archive_service import create_zip_archive
 from application.ai_models.ai_models import Model_Classification_Type, AI_Model_Type
+from application.jobs import job_progress, job_workspace
+from application.jobs.job_progress import JobProgressCallback
+from application.services.cnn_tfrecords_service import load_cnn_tfrecords_manifest
+from application.ai_model_trainers.cnn import cnn_input_pipeline
+from application.ai_model_trainers import training_checkpoints
+from application.ai_model_trainers.warm_start import resolve_warm_start, load_warm_start_weights
+from application.ai_model_trainers import tflite_export
+from application.services.lnn_dataset_cache_service import get_dataset_fingerprint
 
 class CNN_Trainer:
     def __init__(            
@@ -29,7 +38,10 @@ class CNN_Trainer:
             user_name,
             dataset_name,
             train_percentage,
-            test_percentage):
+            test_percentage,
+            cache=cnn_input_pipeline.CACHE_NONE,
+            warm_start_version=None,
+            tflite_quantization=tflite_export.QUANTIZATION_NONE):
         self.ai_model = ai_model 
         self.img_size = img_size
         self.epochs = epochs 
@@ -41,20 +53,62 @@ class CNN_Trainer:
         self.optimizer = optimizer 
         self.user_name = user_name
         self.dataset_name = dataset_name
+        self.tflite_quantization = tflite_quantization
 
         # Путь к датасету необходимому для обучения
         self.dataset_folder_path = config_paths.get_dataset_path(self.user_name, self.dataset_name).replace('.zip', '')
 
+        # Сохраненная версия модели, с весов которой начинается обучение. Тренер получает только конкретную версию:
+        # latest разрешается маршрутом по имени обучаемой модели, а здесь отклоняется с ValueError
+        self.warm_start_path = None
+        if warm_start_version is not None:
+            warm_start_result = resolve_warm_start(user_name, AI_Model_Type.CNN, None, warm_start_version)
+            if not warm_start_result.isSuccess:
+                raise ValueError(warm_start_result.errors)
+            _, self.warm_start_path = warm_start_result.result
+
         # Донастройка нейронной сети в зависимости от её типа: бинарная, либо многоклассовая
         self.__init_last_element_in_init_activations(ai_model)
         self.loss = self.__init_loss(ai_model)
         self.__init_last_element_in_neurons_in_layers(ai_model)
 
-        # Получение всей выборки данных
-        data, labels = self.__get_data()
-
-        # Кодирование labels
-        encoded_labels = self.__get_encode_labels(ai_model, labels)
+        # Если для img_size собраны шарды с декодированными изображениями, выборки задаются номерами записей,
+        # а метки читаются из шардов
+        self.tfrecords_manifest = load_cnn_tfrecords_manifest(self.dataset_folder_path, self.img_size)
+
+        # Прерванное обучение можно продолжить, поэтому выборка делится по зерну из ключа обучения
+        self.training_key = training_checkpoints.get_training_key('cnn', {
+            'ai_model': ai_model.name,
+            'img_size': img_size,
+            'epochs': epochs,
+            'batch_size': batch_size,
+            'filters': filters,
+            'kernel_sizes': kernel_sizes,
+            'pool_sizes': pool_sizes,
+            'activations': activations,
+            'optimizer': optimizer,
+            'user_name': user_name,
+            'dataset_name': dataset_name,
+            'train_percentage': train_percentage,
+            'test_percentage': test_percentage,
+            'tfrecords': self.tfrecords_manifest is not None,
+            'warm_start_version': warm_start_version
+        }, get_dataset_fingerprint(self.dataset_folder_path, '.jpg'))
+        rng = np.random.default_rng(training_checkpoints.get_split_seed(self.training_key))
+
+        if self.tfrecords_manifest is not None:
+            data = rng.permutation(self.tfrecords_manifest['total'])
+            encoded_labels = data
+            self.all_classes = self.tfrecords_manifest['classes']
+        else:
+            # Получение всей выборки данных
+            data, labels = self.__get_data(rng)
+
+            # Порядок классов совпадает с кодированием меток (np.unique сортирует значения)
+            self.all_classes = np.unique(labels).tolist()
+
+            # Кодирование labels
+            encoded_labels = self.__get_encode_labels(ai_model, labels)
 
         # Деление на тренировочную, тестовую и проверочную
         if train_percentage + test_percentage > 100:
@@ -67,18 +121,42 @@ class CNN_Trainer:
         train_data, test_data, valid_data = np.split(data, [train_size, train_size + test_size])
         train_labels, test_labels, valid_labels = np.split(encoded_labels, [train_size, train_size + test_size])
 
-        self.train_data = tf.data.Dataset.from_tensor_slices((train_data, train_labels))
-        self.train_data = self.train_data.map(self.process_path).batch(self.batch_size)
-
-        self.test_data = tf.data.Dataset.from_tensor_slices((test_data, test_labels))
-        self.test_data =  self.test_data.map(self.process_path).batch(self.batch_size)
-
-        self.valid_data = tf.data.Dataset.from_tensor_slices((valid_data, valid_labels))
-        self.valid_data =  self.valid_data.map(self.process_path).batch(self.batch_size)
+        # Датасет, хранящийся только архивом, читается без распаковки. Прочитанные файлы кэшируются для следующих эпох
+        self.reader = None
+        if self.tfrecords_manifest is None:
+            self.reader = dataset_files_service.open_dataset_reader(self.dataset_folder_path)
+
+        # Чекпоинт и кэш на диске хранятся в рабочей папке задачи. Кэш живет только во время обучения:
+        # состав выборок меняется от запуска к запуску
+        self.workspace_path = job_workspace.get_workspace_path()
+        self.checkpoint_path = f'{self.workspace_path}/checkpoint.keras'
+        self.cache = cache
+        self.cache_folder_path = None
+        if cache == cnn_input_pipeline.CACHE_DISK:
+            self.cache_folder_path = f'{self.workspace_path}/cnn_cache'
+            os.makedirs(self.cache_folder_path, exist_ok=True)
+
+        # Пропускная способность конвейера без обучения, для сравнения со скоростью обучения
+        self.train_size = len(train_data)
+        self.input_images_per_second = cnn_input_pipeline.measure_images_per_second(
+            self.__build_dataset(train_data, train_labels, 'train', cache=cnn_input_pipeline.CACHE_NONE))
+
+        self.train_data = self.__build_dataset(train_data, train_labels, 'train', shuffle=True)
+        self.test_data = self.__build_dataset(test_data, test_labels, 'test')
+        self.valid_data = self.__build_dataset(valid_data, valid_labels, 'valid')
+
+        # Примеры для калибровки квантования при экспорте. Без кэша: файловый кэш удаляется после обучения
+        self.representative_data = self.__build_dataset(
+            train_data[:tflite_export.representative_samples_count],
+            train_labels[:tflite_export.representative_samples_count],
+            'representative',
+            cache=cnn_input_pipeline.CACHE_NONE)
 
     def train_and_save(self, trained_model_name):
-        # Запуск обучения
-        model, history, _, _ = self.__train()
+        # Запуск обучения. При повторном запуске прерванного обучения оно продолжается с последней сохраненной эпохи
+        model, history, _, _ = self.__train([
+            JobProgressCallback(self.epochs),
+            training_checkpoints.create_backup_callback(self.training_key)])
         
         return self.save_model(trained_model_name, model, history)
     
@@ -90,21 +168,40 @@ class CNN_Trainer:
     
     def save_model(self, trained_model_name, model, history):
         # Создание директории, в которую будет сохраняться модель
-        trained_ai_model_folder_path = AI_Model_Type.get_name_for_trained_model(self.user_name, AI_Model_Type.LNN, trained_model_name)
+        trained_ai_model_folder_path = AI_Model_Type.get_name_for_trained_model(self.user_name, AI_Model_Type.CNN, trained_model_name)
         if not os.path.exists(trained_ai_model_folder_path):
             os.makedirs(trained_ai_model_folder_path)
 
         # Сохранение обученной модели
-        model.save(f'{trained_ai_model_folder_path}/{trained_model_name}.h5')
-        self.__create_plots(history, trained_ai_model_folder_path)
-
-        _, latest_version = get_last_version_model(self.user_name, AI_Model_Type.LNN, trained_model_name)
+        model_path = f'{trained_ai_model_folder_path}/{trained_model_name}.h5'
+        model.save(model_path)
+        save_class_names(self.all_classes, trained_ai_model_folder_path)
+        create_training_plots(history, trained_ai_model_folder_path)
+        self.__save_throughput(trained_ai_model_folder_path)
+
+        # Оптимизированная модель для предсказаний, калибровка - по примерам обучающей выборки
+        representative_samples = np.concatenate([images.numpy() for images, _ in self.representative_data])
+        tflite_export.export_tflite_or_warn(model, model_path, representative_samples, self.tflite_quantization)
+
+        # Имя сохраненной версии - имя её папки. Версия регистрируется вместе с итоговыми метриками обучения
+        latest_version = os.path.basename(trained_ai_model_folder_path)
         create_zip_archive(trained_ai_model_folder_path)
-
-        return data_storage_services.get_model_by_name(self.user_name, AI_Model_Type.LNN, latest_version)
-
-    def __train(self):
-        inputs = keras.Input(shape=(self.img_size, 180, 3))
+        data_storage_services.store_model_files(
+            self.user_name, AI_Model_Type.CNN, latest_version, {name: float(values[-1]) for name, values in history.history.items()})
+
+        return data_storage_services.get_model_by_name(self.user_name, AI_Model_Type.CNN, latest_version)
+
+    def __train(self, extra_callbacks=()):
+        try:
+            return self.__fit(extra_callbacks)
+        finally:
+            if self.cache_folder_path is not None:
+                shutil.rmtree(self.cache_folder_path, ignore_errors=True)
+            if self.reader is not None:
+                self.reader.close()
+
+    def __fit(self, extra_callbacks):
+        inputs = keras.Input(shape=(self.img_size, self.img_size, 3))
         x = layers.Rescaling(1./255)(inputs)
 
         for i in range(len(self.filters) - 2):
@@ -116,18 +213,23 @@ class CNN_Trainer:
 
         outputs = layers.Dense(self.filters[-1], activation=self.activations[-1])(x)
         model = keras.Model(inputs=inputs, outputs=outputs)
+        if self.warm_start_path is not None:
+            self.__load_warm_start(model)
 
         model.compile(
                     optimizer=self.optimizer,
                     loss=self.loss,
                     metrics=["accuracy"])
         
+        self.throughput_callback = cnn_input_pipeline.ThroughputCallback(self.train_size)
         callbacks = [
             keras.callbacks.ModelCheckpoint(
-                filepath='convert_from_scratch.keras',
+                filepath=self.checkpoint_path,
                 save_best_only=True,
                 monitor='val_loss'
-            )
+            ),
+            self.throughput_callback,
+            *extra_callbacks
         ]
 
         history = model.fit(
@@ -137,30 +239,48 @@ class CNN_Trainer:
             callbacks=callbacks
         )
 
-        test_model = keras.models.load_model('convert_from_scratch.keras')
+        job_progress.report(1.0, f'Input pipeline: {self.input_images_per_second:.1f} images/sec; training: {self.__get_train_images_per_second():.1f} images/sec')
+
+        # Если обучение продолжено из резервной копии уже после последней эпохи, чекпоинт лучшей модели не создается
+        test_model = keras.models.load_model(self.checkpoint_path) if os.path.exists(self.checkpoint_path) else model
         test_loss, test_acc = test_model.evaluate(self.test_data)
 
         return model, history, test_loss, test_acc
     
-    def __create_plots(self, history, save_folder):
-        # Построение графиков обучения
-        plt.figure(figsize=(8, 6))
-        plt.plot(history.history['loss'], label='training loss')
-        plt.plot(history.history['val_loss'], label='validation loss')
-        plt.title('Loss Plot')
-        plt.xlabel('Epochs')
-        plt.ylabel('Loss')
-        plt.legend()
-        plt.savefig(f'{save_folder}/loss_plot.png', dpi=300)
-
-        plt.figure(figsize=(8, 6))
-        plt.plot(history.history['accuracy'], label='training accuracy')
-        plt.plot(history.history['val_accuracy'], label='validation accuracy')
-        plt.title('Accuracy Plot')
-        plt.xlabel('Epochs')
-        plt.ylabel('Accuracy')
-        plt.legend()
-        plt.savefig(f'{save_folder}/accuracy_plot.png', dpi=300)
+    def __load_warm_start(self, model):
+        # Если архитектура изменилась, обучение начинается со случайных весов
+        result = load_warm_start_weights(model, self.warm_start_path)
+        if not result.isSuccess:
+            logging.warning(f'Warm start skipped: {result.errors}')
+            job_progress.report(0, f'Warm start skipped: {result.errors}')
+
+    def __build_dataset(self, data, labels, split_name, shuffle=False, cache=None):
+        cache = self.cache if cache is None else cache
+        cache_path = f'{self.cache_folder_path}/{split_name}' if self.cache_folder_path is not None else None
+
+        if self.tfrecords_manifest is not None:
+            one_hot_depth = None if self.ai_model == Model_Classification_Type.Binary else len(self.__get_quantity_classes())
+            return cnn_input_pipeline.build_tfrecords_dataset(
+                self.tfrecords_manifest, data, one_hot_depth, self.batch_size, shuffle=shuffle, cache=cache, cache_path=cache_path)
+
+        return cnn_input_pipeline.build_dataset(
+            data, labels, self.img_size, self.batch_size, shuffle=shuffle, cache=cache, cache_path=cache_path, reader=self.reader)
+
+    def __get_train_images_per_second(self):
+        # Первая эпоха не учитывается, если есть другие: в ней заполняется кэш
+        measurements = self.throughput_callback.images_per_second
+        measurements = measurements[1:] if len(measurements) > 1 else measurements
+        return sum(measurements) / len(measurements) if measurements else 0.0
+
+    def __save_throughput(self, save_folder):
+        with open(f'{save_folder}/input_pipeline.json', 'w') as f:
+            json.dump({
+                'cache': self.cache,
+                'tfrecords': self.tfrecords_manifest is not None,
+                'input_images_per_second': self.input_images_per_second,
+                'train_images_per_second': self.__get_train_images_per_second(),
+                'train_images_per_second_by_epoch': self.throughput_callback.images_per_second
+            }, f, indent=4)
 
     def __init_last_element_in_init_activations(self, ai_model):
         if ai_model == Model_Classification_Type.Binary:
@@ -183,41 +303,27 @@ class CNN_Trainer:
         self.filters.append(len(self.__get_quantity_classes()))
 
     def __get_quantity_classes(self):
-        all_items = os.listdir(self.dataset_folder_path)
-        return [item for item in all_items if os.path.isdir(os.path.join(self.dataset_folder_path, item))]
+        return dataset_files_service.get_class_folders(self.dataset_folder_path)
 
-    def __get_data(self):
-        all_files = self.__get_all_files(self.dataset_folder_path)
-        random.shuffle(all_files)
+    def __get_data(self, rng):
+        # Файлы отсортированы, поэтому перемешивание воспроизводимо
+        all_files = dataset_files_service.get_dataset_files(self.dataset_folder_path, '.jpg')
+        all_files = [all_files[i] for i in rng.permutation(len(all_files))]
 
         data = []
         labels = []
 
         # Читаем данные из каждого файла и сохраняем их вместе с меткой
         for file_path in all_files:
-            with open(file_path, 'r') as f:
-                data.append(file_path)
-                label = os.path.basename(os.path.dirname(file_path))  # Имя папки, где находится файл
-                labels.append(label)
+            data.append(file_path)
+            label = os.path.basename(os.path.dirname(file_path))  # Имя папки, где находится файл
+            labels.append(label)
 
         # Преобразуем списки в numpy массивы
         return np.array(data), np.array(labels)
 
     def process_path(self, file_path, label):
-        img = tf.io.read_file(file_path)
-        img = tf.image.decode_image(img, channels=3, expand_animations=False)
-        img = tf.image.resize(img, [180, 180])
-        img = img / 255.0
-        return img, label
-
-    # Функция для получения всех файлов в директории и её подпапках
-    def __get_all_files(self, root_dir):
-        files = []
-        for dir_name, _, file_names in os.walk(root_dir):
-            for file_name in file_names:
-                if file_name.endswith('.jpg'):
-                    files.append(os.path.join(dir_name, file_name))
-        return files
+        return cnn_input_pipeline.load_image(file_path, self.img_size, self.reader), label
 
     def __get_encode_labels(self, ai_model, labels):
         _, inverse_indices = np.unique(labels, return_inverse=True)
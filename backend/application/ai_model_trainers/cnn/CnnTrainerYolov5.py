@@ -1,12 +1,13 @@
 import os
 
 import yaml
-from application.ai_model_trainers.get_last_version import get_last_version_model
 from application.services.zip_archive_service import create_zip_archive
 import application.services.data_storage_services as data_storage_services
 from application.ai_models.ai_models import AI_Model_Type
 from application.ai_models.yolov5 import train
 from application import config_paths
+from application.jobs import job_workspace
+from application.services.dataset_files_service import is_zip_only
 
 class CnnTrainerYolov5:
     def __init__(            
@@ -37,24 +38,33 @@ class CnnTrainerYolov5:
         self.__train_yolov5()
 
         # Сохранение обученной модели
-        _, latest_version = get_last_version_model(self.user_name, AI_Model_Type.CNN, trained_model_name)
+        latest_version = os.path.basename(self.trained_ai_model_path)
         create_zip_archive(self.trained_ai_model_path)
+        data_storage_services.store_model_files(self.user_name, AI_Model_Type.CNN, latest_version)
 
         return data_storage_services.get_model_by_name(self.user_name, AI_Model_Type.CNN, latest_version)
 
 
     def __train_yolov5(self):
-        dataset_path = f'{self.dataset_folder_path}/data.yaml'
         device = 'cpu'
 
+        # YOLOv5 читает изображения и разметку только из папок, поэтому датасет, загруженный без распаковки,
+        # распаковывается в рабочую папку задачи. Она удаляется после успешного обучения
+        dataset_folder_path = self.dataset_folder_path
+        if is_zip_only(dataset_folder_path):
+            dataset_folder_path = data_storage_services.extract_dataset_copy(
+                dataset_folder_path, f'{job_workspace.get_workspace_path()}/dataset')
+
         # Чтение данных из YAML файла
-        with open(dataset_path, 'r') as file:
+        with open(f'{dataset_folder_path}/data.yaml', 'r') as file:
             data = yaml.safe_load(file)
         
-        data['train'] = data['train'].replace('./', f'{self.dataset_folder_path}/' )
-        data['val'] = data['val'].replace('./', f'{self.dataset_folder_path}/')
-        data['test'] = data['test'].replace('./', f'{self.dataset_folder_path}/')
+        data['train'] = data['train'].replace('./', f'{dataset_folder_path}/' )
+        data['val'] = data['val'].replace('./', f'{dataset_folder_path}/')
+        data['test'] = data['test'].replace('./', f'{dataset_folder_path}/')
 
+        # Исправленный YAML пишется в рабочую папку задачи: файл датасета общий для всех обучений
+        dataset_path = f'{job_workspace.get_workspace_path()}/data.yaml'
         with open(dataset_path, 'w') as file:
             yaml.dump(data, file)
 
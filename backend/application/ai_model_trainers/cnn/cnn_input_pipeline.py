@@ -0,0 +1,169 @@
+import time
+
+import numpy as np
+import tensorflow as tf
+from tensorflow import keras
+from application.services.cnn_tfrecords_service import parse_example
+
+# Режимы кэширования декодированных изображений
+CACHE_NONE = 'none'
+CACHE_MEMORY = 'memory'
+CACHE_DISK = 'disk'
+
+# Размер буфера перемешивания после кэша: декодированные изображения занимают много памяти
+__shuffle_buffer_size = 1024
+
+def build_dataset(file_paths, labels, img_size, batch_size, shuffle=False, cache=CACHE_NONE, cache_path=None, reader=None):
+    """
+    Конвейер tf.data: параллельное чтение и декодирование изображений, кэш, перемешивание каждую эпоху и предвыборка.
+
+    :param file_paths: Пути до изображений
+    :param labels: Закодированные метки
+    :param img_size: Размер, к которому приводятся изображения
+    :param batch_size: Размер батча
+    :param shuffle: Перемешивать ли примеры в каждой эпохе (для тренировочной выборки)
+    :param cache: none, memory - кэш в оперативной памяти, disk - кэш в файлах cache_path
+    :param cache_path: Префикс файлов кэша для режима disk
+    :param reader: ZipDatasetReader, если file_paths - пути внутри архива датасета
+    :return: tf.data.Dataset
+    """
+    dataset = tf.data.Dataset.from_tensor_slices((file_paths, labels))
+
+    # Без кэша дешевле перемешивать пути, а не декодированные изображения
+    if shuffle and cache == CACHE_NONE:
+        dataset = dataset.shuffle(len(file_paths), reshuffle_each_iteration=True)
+
+    dataset = dataset.map(
+        lambda file_path, label: (load_image(file_path, img_size, reader), label),
+        num_parallel_calls=tf.data.AUTOTUNE,
+        deterministic=not shuffle)
+
+    return __finalize_dataset(dataset, len(file_paths), batch_size, shuffle, cache, cache_path)
+
+def build_tfrecords_dataset(manifest, indices, one_hot_depth, batch_size, shuffle=False, cache=CACHE_NONE, cache_path=None):
+    """
+    Конвейер tf.data по шардам уже декодированных изображений (cnn_tfrecords_service): шарды читаются
+    параллельно через interleave, в выборку попадают только записи с номерами из indices.
+
+    :param manifest: Манифест шардов
+    :param indices: Номера записей выборки
+    :param one_hot_depth: Количество классов для one-hot кодирования меток, None - метки как есть (бинарная классификация)
+    :param batch_size: Размер батча
+    :param shuffle: Перемешивать ли шарды и примеры в каждой эпохе
+    :param cache: none, memory, disk - как в build_dataset
+    :param cache_path: Префикс файлов кэша для режима disk
+    :return: tf.data.Dataset
+    """
+    img_size = manifest['img_size']
+
+    # Принадлежность записи к выборке проверяется по маске без чтения изображения в Python
+    mask = np.zeros(manifest['total'], dtype=bool)
+    mask[indices] = True
+    mask = tf.constant(mask)
+
+    shard_paths = tf.data.Dataset.from_tensor_slices(manifest['shard_paths'])
+    if shuffle:
+        shard_paths = shard_paths.shuffle(len(manifest['shard_paths']), reshuffle_each_iteration=True)
+
+    dataset = shard_paths.interleave(
+        tf.data.TFRecordDataset,
+        cycle_length=min(len(manifest['shard_paths']), 8),
+        num_parallel_calls=tf.data.AUTOTUNE,
+        deterministic=not shuffle)
+    dataset = dataset.map(
+        lambda serialized_example: parse_example(serialized_example, img_size),
+        num_parallel_calls=tf.data.AUTOTUNE,
+        deterministic=not shuffle)
+    dataset = dataset.filter(lambda image, label, index: tf.gather(mask, index))
+    dataset = dataset.map(
+        lambda image, label, index: (tf.cast(image, tf.float32) / 255.0, __encode_label(label, one_hot_depth)),
+        num_parallel_calls=tf.data.AUTOTUNE,
+        deterministic=not shuffle)
+
+    # Записи внутри шардов идут в порядке классов, поэтому буфер нужен и без кэша
+    if shuffle and cache == CACHE_NONE:
+        dataset = dataset.shuffle(min(len(indices), __shuffle_buffer_size), reshuffle_each_iteration=True)
+
+    return __finalize_dataset(dataset, len(indices), batch_size, shuffle, cache, cache_path)
+
+def load_image(file_path, img_size, reader=None):
+    return decode_image(read_file(file_path, reader), img_size, img_size)
+
+def read_file(file_path, reader=None):
+    if reader is None:
+        return tf.io.read_file(file_path)
+
+    # Файл читается из архива в Python, декодирование остается в графе tf.data
+    content = tf.numpy_function(lambda member_name: reader.read(member_name.decode('utf-8')), [file_path], tf.string)
+    content.set_shape([])
+    return content
+
+def decode_image(image_bytes, height, width):
+    # Та же предобработка используется при предсказании, чтобы модель получала данные как при обучении
+    img = tf.image.decode_image(image_bytes, channels=3, expand_animations=False)
+    img = tf.image.resize(img, [height, width])
+    img = img / 255.0
+    return img
+
+def measure_images_per_second(dataset, max_batches=20):
+    """
+    Пропускная способность конвейера без обучения: сколько изображений в секунду он успевает подготовить.
+    Если значение заметно больше скорости обучения, конвейер не является узким местом.
+
+    :param dataset: Конвейер без кэша
+    :return: Изображений в секунду
+    """
+    images_count = 0
+    start_time = time.perf_counter()
+    for images, _ in dataset.take(max_batches):
+        images_count += int(images.shape[0])
+    elapsed = time.perf_counter() - start_time
+
+    return images_count / elapsed if elapsed > 0 else 0.0
+
+def __finalize_dataset(dataset, size, batch_size, shuffle, cache, cache_path):
+    if cache == CACHE_MEMORY:
+        dataset = dataset.cache()
+    elif cache == CACHE_DISK:
+        dataset = dataset.cache(cache_path)
+
+        # Keras читает ровно cardinality батчей и не доходит до конца выборки, из-за чего файловый кэш
+        # не завершается и отбрасывается. Заполняем его одним полным проходом до обучения
+        for _ in dataset.batch(batch_size):
+            pass
+
+    if shuffle and cache != CACHE_NONE:
+        dataset = dataset.shuffle(min(size, __shuffle_buffer_size), reshuffle_each_iteration=True)
+
+    return dataset.batch(batch_size).prefetch(tf.data.AUTOTUNE)
+
+def __encode_label(label, one_hot_depth):
+    if one_hot_depth is None:
+        return label
+
+    return tf.one_hot(label, one_hot_depth)
+
+class ThroughputCallback(keras.callbacks.Callback):
+    # Скорость обучения в изображениях в секунду для каждой эпохи. Время проверки на валидационной выборке не учитывается
+    def __init__(self, images_count):
+        super().__init__()
+        self.images_count = images_count
+        self.images_per_second = []
+        self.epoch_start_time = None
+
+    def on_epoch_begin(self, epoch, logs=None):
+        self.epoch_start_time = time.perf_counter()
+
+    def on_test_begin(self, logs=None):
+        self.__finish_epoch()
+
+    def on_epoch_end(self, epoch, logs=None):
+        self.__finish_epoch()
+
+    def __finish_epoch(self):
+        if self.epoch_start_time is None:
+            return
+
+        elapsed = time.perf_counter() - self.epoch_start_time
+        self.images_per_second.append(self.images_count / elapsed if elapsed > 0 else 0.0)
+        self.epoch_start_time = None
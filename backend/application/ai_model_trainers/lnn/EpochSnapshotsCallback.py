@@ -0,0 +1,42 @@
+from tensorflow import keras
+
+def beats_threshold(test_loss, test_acc, weights_threshold):
+    # Тот же критерий, что и при выборе лучшей модели: ошибка меньше и точность больше
+    if weights_threshold is None:
+        return True
+
+    threshold_loss, threshold_acc = weights_threshold
+    return test_loss < threshold_loss and test_acc > threshold_acc
+
+class EpochSnapshotsCallback(keras.callbacks.Callback):
+    # Оценивает модель на тестовой выборке после каждого из заданных количеств эпох.
+    # Одно обучение на max(epochs) эпох заменяет отдельные обучения на каждое значение epochs.
+    # weights_threshold - (test_loss, test_acc) лучшего результата на момент запуска обучения: лучший результат
+    # только улучшается, поэтому снимок, который его не превосходит, лучшим не станет и хранится без весов
+    def __init__(self, epochs, test_data, test_labels, weights_threshold=None):
+        super().__init__()
+        self.epochs = sorted(set(epochs))
+        self.test_data = test_data
+        self.test_labels = test_labels
+        self.weights_threshold = weights_threshold
+        self.snapshots = {}
+
+    def on_epoch_end(self, epoch, logs=None):
+        if epoch + 1 in self.epochs:
+            self.__take_snapshot(epoch + 1)
+
+    def on_train_end(self, logs=None):
+        # Обучение остановлено раньше (EarlyStopping): более длинное обучение остановилось бы там же
+        # с восстановленными лучшими весами, поэтому для оставшихся значений эпох берется итоговая модель
+        for epochs in self.epochs:
+            if epochs not in self.snapshots:
+                self.__take_snapshot(epochs)
+
+    def __take_snapshot(self, epochs):
+        test_loss, test_acc = self.model.evaluate(self.test_data, self.test_labels, verbose=0)
+        self.snapshots[epochs] = {
+            'test_loss': test_loss,
+            'test_acc': test_acc
+        }
+        if beats_threshold(test_loss, test_acc, self.weights_threshold):
+            self.snapshots[epochs]['weights'] = self.model.get_weights()
@@ -0,0 +1,160 @@
+import os
+from multiprocessing import shared_memory
+
+import numpy as np
+import configurations.config as config
+from application.ai_models.ai_models import Model_Classification_Type
+from application.services.lnn_dataset_cache_service import load_lnn_cache
+from application.services.lnn_samples_reader import parse_sample, read_samples
+from application.services import dataset_files_service
+
+class LnnDataset:
+    # Выборка, уже прочитанная, закодированная и поделенная на тренировочную, тестовую и проверочную части.
+    # Один экземпляр используется всеми обучениями в рамках подбора параметров только для чтения
+    def __init__(self, arrays, all_classes, quantity_classes):
+        self.train_data = arrays['train_data']
+        self.train_labels = arrays['train_labels']
+        self.test_data = arrays['test_data']
+        self.test_labels = arrays['test_labels']
+        self.valid_data = arrays['valid_data']
+        self.valid_labels = arrays['valid_labels']
+
+        self.all_classes = all_classes
+        self.quantity_classes = quantity_classes
+
+    def get_arrays(self):
+        return {
+            'train_data': self.train_data,
+            'train_labels': self.train_labels,
+            'test_data': self.test_data,
+            'test_labels': self.test_labels,
+            'valid_data': self.valid_data,
+            'valid_labels': self.valid_labels
+        }
+
+class SharedLnnDataset:
+    # Копия LnnDataset в разделяемой памяти. При передаче в другой процесс сериализуются только имена блоков
+    def __init__(self, dataset):
+        self.all_classes = dataset.all_classes
+        self.quantity_classes = dataset.quantity_classes
+        self.descriptors = {}
+        self.blocks = []
+
+        for name, array in dataset.get_arrays().items():
+            block = shared_memory.SharedMemory(create=True, size=max(array.nbytes, 1))
+            np.ndarray(array.shape, dtype=array.dtype, buffer=block.buf)[...] = array
+            self.descriptors[name] = (block.name, array.shape, array.dtype.str)
+            self.blocks.append(block)
+
+    def __getstate__(self):
+        return {
+            'all_classes': self.all_classes,
+            'quantity_classes': self.quantity_classes,
+            'descriptors': self.descriptors,
+            'blocks': []
+        }
+
+    def attach(self):
+        # Вызывается в процессе пула: массивы не копируются, а отображаются на разделяемую память
+        arrays = {}
+        for name, (block_name, shape, dtype) in self.descriptors.items():
+            block = shared_memory.SharedMemory(name=block_name)
+            array = np.ndarray(shape, dtype=np.dtype(dtype), buffer=block.buf)
+            array.flags.writeable = False
+            arrays[name] = array
+            self.blocks.append(block)
+
+        return LnnDataset(arrays, self.all_classes, self.quantity_classes)
+
+    def release(self):
+        # Вызывается процессом-владельцем после завершения всех обучений
+        for block in self.blocks:
+            block.close()
+            block.unlink()
+        self.blocks = []
+
+def load_lnn_dataset(ai_model, dataset_folder_path, train_percentage, test_percentage, seed=None):
+    """
+    Чтение датасета с диска, кодирование меток и деление на выборки.
+
+    :param ai_model: Тип классификации
+    :param dataset_folder_path: Путь до датасета (распакованного, либо хранящегося только архивом)
+    :param train_percentage: Процент тренировочной выборки
+    :param test_percentage: Процент тестовой выборки
+    :param seed: Зерно перемешивания. При одинаковом зерне выборки делятся одинаково
+    :return: LnnDataset
+    """
+    if train_percentage + test_percentage > 100:
+        raise ValueError("При делении выборки на обучающую и тестовую, сумма значений не должна быть больше 100")
+
+    quantity_classes = len(__get_quantity_classes(dataset_folder_path))
+
+    # Получение всей выборки данных
+    data, labels = __get_data(dataset_folder_path, np.random.default_rng(seed))
+
+    # Порядок классов совпадает с кодированием меток (np.unique сортирует значения)
+    all_classes = np.unique(labels).tolist()
+
+    # Кодирование labels
+    encoded_labels = __get_encode_labels(ai_model, labels, quantity_classes)
+
+    # Деление на тренировочную, тестовую и проверочную
+    total_size = len(data)
+    train_size = int(total_size * train_percentage * 0.01)
+    test_size = int(total_size * test_percentage * 0.01)
+
+    train_data, test_data, valid_data = np.split(data, [train_size, train_size + test_size])
+    train_labels, test_labels, valid_labels = np.split(encoded_labels, [train_size, train_size + test_size])
+
+    arrays = {
+        'train_data': train_data,
+        'train_labels': train_labels,
+        'test_data': test_data,
+        'test_labels': test_labels,
+        'valid_data': valid_data,
+        'valid_labels': valid_labels
+    }
+    return LnnDataset(arrays, all_classes, quantity_classes)
+
+def __get_quantity_classes(dataset_folder_path):
+    return dataset_files_service.get_class_folders(dataset_folder_path)
+
+def __get_data(dataset_folder_path, rng):
+    # Если при загрузке датасета был собран бинарный кэш, текстовые файлы не разбираются
+    cache = load_lnn_cache(dataset_folder_path)
+    if cache is not None:
+        features, label_indices, classes = cache
+        permutation = rng.permutation(len(label_indices))
+        return features[permutation], np.array(classes)[label_indices[permutation]]
+
+    # Сортировка делает перемешивание воспроизводимым: порядок os.walk не определен
+    all_files = dataset_files_service.get_dataset_files(dataset_folder_path, '.txt')
+    all_files = [all_files[i] for i in rng.permutation(len(all_files))]
+
+    # Читаем данные из всех файлов, метка - имя папки, где находится файл.
+    # Датасет, хранящийся только архивом, читается из архива без распаковки
+    reader = dataset_files_service.open_dataset_reader(dataset_folder_path, cache_members=False)
+    if reader is None:
+        data = read_samples(all_files, config.get_threads_configuration_io_threads())
+    else:
+        try:
+            data = read_samples(all_files, config.get_threads_configuration_io_threads(), read_function=lambda member_name: parse_sample(reader.read_text(member_name)))
+        finally:
+            reader.close()
+    labels = [os.path.basename(os.path.dirname(file_path)) for file_path in all_files]
+
+    return data, np.array(labels)
+
+def __get_encode_labels(ai_model, labels, quantity_classes):
+    _, inverse_indices = np.unique(labels, return_inverse=True)
+    encoded_labels = inverse_indices
+    if ai_model == Model_Classification_Type.Binary:
+        return encoded_labels
+
+    return __to_one_hot(encoded_labels, quantity_classes)
+
+def __to_one_hot(labels, dimension):
+    results = np.zeros((len(labels), dimension))
+    for i, label in enumerate(labels):
+        results[i, label] = 1
+    return results
@@ -0,0 +1,187 @@
+from tensorflow import keras
+from tensorflow.keras import layers
+
+from application.ai_model_trainers.lnn.LnnTrainer import LNN_Trainer, get_initial_epoch_and_history
+from application.ai_model_trainers.lnn.EpochSnapshotsCallback import beats_threshold
+
+class LnnEnsembleTrainer:
+    # Обучение нескольких конфигураций одной модели Keras: у каждой конфигурации свои слои, веса и функция потерь,
+    # общими являются только входные данные, оптимизатор и размер батча. Градиент каждой конфигурации
+    # зависит только от её собственной функции потерь, поэтому результат совпадает с раздельным обучением,
+    # а накладные расходы Keras на шаг обучения делятся между всеми конфигурациями
+    def __init__(self, trials, dataset):
+        # LNN_Trainer достраивает выходной слой и функцию потерь так же, как при обычном обучении
+        self.members = [LNN_Trainer(**trial, dataset=dataset) for trial in trials]
+        self.dataset = dataset
+
+        self.epochs = self.members[0].epochs
+        self.batch_size = self.members[0].batch_size
+        self.optimizer = self.members[0].optimizer
+        self.loss = self.members[0].loss
+
+    def train_snapshots(self, epochs_snapshots, weights_threshold=None, initial_states=None):
+        """
+        Обучение всех конфигураций с оценкой на тестовой выборке после каждого из значений epochs_snapshots.
+
+        :param epochs_snapshots: Количества эпох, после которых оцениваются конфигурации
+        :param weights_threshold: (test_loss, test_acc), который снимок должен превзойти, чтобы сохранить веса
+        :param initial_states: Для каждой конфигурации - продолжаемое обучение в формате LNN_Trainer.train_snapshots либо None.
+                               Продолжаемые обучения должны быть проведены на одинаковое число эпох
+        :return: Для каждой конфигурации - список снимков в формате LNN_Trainer.train_snapshots
+        """
+        model = self.__create_model()
+        output_names = self.__get_output_names()
+        members_layers = [self.__get_member_layers(model, member) for member in range(len(self.members))]
+
+        initial_states = initial_states or [None] * len(self.members)
+        initial_epoch = 0
+        for member, initial_state in enumerate(initial_states):
+            if initial_state is not None:
+                set_member_weights(members_layers[member], initial_state['weights'])
+                initial_epoch, _ = get_initial_epoch_and_history(initial_state)
+
+        snapshots_callback = EnsembleSnapshotsCallback(
+            epochs_snapshots,
+            output_names,
+            members_layers,
+            self.dataset.test_data,
+            {name: self.dataset.test_labels for name in output_names},
+            weights_threshold)
+
+        history = model.fit(
+            self.dataset.train_data,
+            {name: self.dataset.train_labels for name in output_names},
+            epochs=max(epochs_snapshots),
+            initial_epoch=initial_epoch,
+            batch_size=self.batch_size,
+            validation_data=(self.dataset.valid_data, {name: self.dataset.valid_labels for name in output_names}),
+            callbacks=[snapshots_callback])
+
+        members_snapshots = []
+        for member, name in enumerate(output_names):
+            # История конфигурации в том же виде, что и при обычном обучении. Keras хранит только эпохи после initial_epoch
+            member_history = {
+                metric: history.history[f'{prefix}{name}_{metric.replace("val_", "")}'][:snapshots_callback.trained_epochs[member] - initial_epoch]
+                for metric, prefix in (('loss', ''), ('accuracy', ''), ('val_loss', 'val_'), ('val_accuracy', 'val_'))
+            }
+            _, initial_history = get_initial_epoch_and_history(initial_states[member])
+
+            snapshots = []
+            for epochs, snapshot in sorted(snapshots_callback.snapshots[member].items()):
+                snapshot['epochs'] = epochs
+                snapshot['history'] = {
+                    metric: initial_history.get(metric, []) + values[:epochs - initial_epoch] for metric, values in member_history.items()}
+                snapshots.append(snapshot)
+            members_snapshots.append(snapshots)
+
+        return members_snapshots
+
+    def __create_model(self):
+        inputs = keras.Input(shape=(self.dataset.train_data.shape[1],))
+
+        outputs = {}
+        for member, (trainer, name) in enumerate(zip(self.members, self.__get_output_names())):
+            x = inputs
+            for i in range(len(trainer.neurons_in_layers)):
+                x = layers.Dense(trainer.neurons_in_layers[i], activation=trainer.activations[i], name=f'{name}_dense_{i}')(x)
+            outputs[name] = x
+
+        model = keras.Model(inputs=inputs, outputs=outputs)
+        model.compile(
+                    optimizer=self.optimizer,
+                    loss={name: self.loss for name in outputs},
+                    metrics={name: ["accuracy"] for name in outputs})
+
+        return model
+
+    def __get_member_layers(self, model, member):
+        name = self.__get_output_names()[member]
+        return [model.get_layer(f'{name}_dense_{i}') for i in range(len(self.members[member].neurons_in_layers))]
+
+    def __get_output_names(self):
+        return [f'member_{member}' for member in range(len(self.members))]
+
+class EnsembleSnapshotsCallback(keras.callbacks.Callback):
+    # Аналог EpochSnapshotsCallback и EarlyStopping(patience=5, restore_best_weights=True) для каждой конфигурации отдельно:
+    # остановившаяся конфигурация получает свои лучшие веса и замораживается, а обучение прекращается, когда остановились все
+    def __init__(self, epochs, output_names, members_layers, test_data, test_labels, weights_threshold=None, patience=5):
+        super().__init__()
+        self.epochs = sorted(set(epochs))
+        self.output_names = output_names
+        self.members_layers = members_layers
+        self.test_data = test_data
+        self.test_labels = test_labels
+        self.weights_threshold = weights_threshold
+        self.patience = patience
+
+        members_count = len(output_names)
+        self.snapshots = [{} for _ in range(members_count)]
+        self.trained_epochs = [max(self.epochs)] * members_count
+        self.active = [True] * members_count
+        self.best_losses = [float('inf')] * members_count
+        self.best_weights = [None] * members_count
+        self.waits = [0] * members_count
+
+    def on_epoch_end(self, epoch, logs=None):
+        stopped = []
+        for member, name in enumerate(self.output_names):
+            if not self.active[member]:
+                continue
+
+            self.waits[member] += 1
+            val_loss = logs[f'val_{name}_loss']
+            if val_loss < self.best_losses[member]:
+                self.best_losses[member] = val_loss
+                self.best_weights[member] = self.__get_weights(member)
+                self.waits[member] = 0
+
+            if self.waits[member] >= self.patience and epoch > 0:
+                stopped.append(member)
+
+        # Остановившиеся конфигурации возвращаются к лучшим весам и получают снимки для всех оставшихся значений эпох
+        for member in stopped:
+            set_member_weights(self.members_layers[member], self.best_weights[member])
+
+        snapshot_members = [member for member in range(len(self.output_names)) if self.active[member] and (member in stopped or epoch + 1 in self.epochs)]
+        if snapshot_members:
+            self.__take_snapshots(snapshot_members, epoch + 1, stopped)
+
+        for member in stopped:
+            self.active[member] = False
+            self.trained_epochs[member] = epoch + 1
+
+        if not any(self.active):
+            self.model.stop_training = True
+        elif stopped:
+            self.__freeze(stopped)
+
+    def __take_snapshots(self, members, epochs, stopped):
+        metrics = self.model.evaluate(self.test_data, self.test_labels, verbose=0, return_dict=True)
+        for member in members:
+            name = self.output_names[member]
+            snapshot_epochs = [value for value in self.epochs if value >= epochs] if member in stopped else [epochs]
+            test_loss, test_acc = metrics[f'{name}_loss'], metrics[f'{name}_accuracy']
+            weights = self.__get_weights(member) if beats_threshold(test_loss, test_acc, self.weights_threshold) else None
+            for value in snapshot_epochs:
+                self.snapshots[member][value] = {'test_loss': test_loss, 'test_acc': test_acc}
+                if weights is not None:
+                    self.snapshots[member][value]['weights'] = weights
+
+    def __freeze(self, members):
+        # Оптимизатор продолжал бы менять веса остановившейся конфигурации (например, по накопленному моменту Adam).
+        # Функция шага обучения пересоздается, чтобы в ней остались только переменные активных конфигураций
+        for member in members:
+            for layer in self.members_layers[member]:
+                layer.trainable = False
+        self.model.make_train_function(force=True)
+
+    def __get_weights(self, member):
+        return [weight for layer in self.members_layers[member] for weight in layer.get_weights()]
+
+def set_member_weights(member_layers, weights):
+    # Веса слоев конфигурации в том же порядке, что и model.get_weights() у отдельной модели LNN_Trainer
+    position = 0
+    for layer in member_layers:
+        count = len(layer.get_weights())
+        layer.set_weights(weights[position:position + count])
+        position += count
@@ -1,7 +1,25 @@
-import itertools
+import os
+import math
+import random
 import logging
+import itertools
+import multiprocessing
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
 
+from application import config_paths
+import configurations.config as config
+from application.results.Result import Result
+from application.ai_models.ai_models import AI_Model_Type
+from application.services.lnn_dataset_cache_service import get_dataset_fingerprint
 from application.ai_model_trainers.lnn.LnnTrainer import LNN_Trainer
+from application.ai_model_trainers.lnn.LnnDataset import SharedLnnDataset, load_lnn_dataset
+from application.ai_model_trainers.lnn.LnnTrial import TrialHistory, init_trial_worker, run_trials_group, get_trainer_kwargs
+from application.ai_model_trainers.lnn.LnnSearchSpace import LnnSearchSpace
+from application.ai_model_trainers.lnn.LnnTrialJournal import LnnTrialJournal
+from application.ai_model_trainers.lnn.LnnSurrogateModel import GaussianProcessSurrogate, expected_improvement
+from application.ai_model_trainers import tflite_export
+from application.jobs import job_progress
 
 # Настройка модуля логирования
 logging.basicConfig(
@@ -16,6 +34,11 @@ def log_message(message):
     logging.info(message)
 
 class LnnOptimizeTrainer:
+    # Количество случайных конфигураций, с которых начинается байесовский поиск,
+    # и количество кандидатов, среди которых суррогатная модель выбирает следующую конфигурацию
+    __bayesian_initial_trials = 5
+    __bayesian_candidates = 256
+
     def __init__(
             self,
             ai_model,
@@ -26,86 +49,407 @@ class LnnOptimizeTrainer:
             activation_functions,
             optimizers,
             user_name,
-            dataset_name):
+            dataset_name,
+            max_parallel_trials=1,
+            search_strategy='grid',
+            eta=3,
+            max_trials=None,
+            execution_mode='single',
+            ensemble_size=8,
+            tflite_quantization=tflite_export.QUANTIZATION_NONE):
         self.ai_model = ai_model
 
-        self.epochs = epochs
-        self.hidden_layers = hidden_layers
-        self.batch_sizes = batch_sizes
-        self.neurons_per_layer = neurons_per_layers
-        self.activation_functions = activation_functions
-        self.optimizers = optimizers
+        # Каждая конфигурация обучается один раз на максимальное число эпох и оценивается после каждого значения
+        self.epochs = sorted(set(epochs))
+        self.search_space = LnnSearchSpace(hidden_layers, neurons_per_layers, activation_functions, optimizers, batch_sizes)
 
         self.user_name = user_name
         self.dataset_name = dataset_name
 
+        # Доли тренировочной и тестовой выборок, общие для всех конфигураций
+        self.train_percentage = 50
+        self.test_percentage = 25
+
+        # Количество процессов, в которых одновременно обучаются конфигурации. 1 - последовательный режим
+        self.max_parallel_trials = max(1, max_parallel_trials)
+
+        # Стратегия перебора: grid - полный перебор, hyperband - эпохи используются как ступени бюджета,
+        # random и bayesian - случайный и байесовский поиск в пределах max_trials конфигураций.
+        # eta - во сколько раз сокращается число конфигураций при переходе на следующую ступень hyperband
+        self.search_strategy = search_strategy
+        self.eta = max(2, eta)
+        self.max_trials = max_trials
+
+        # Режим обучения: single - каждая конфигурация отдельной моделью, ensemble - до ensemble_size конфигураций
+        # с общими оптимизатором, размером батча и эпохами обучаются одной моделью с независимыми ветвями
+        self.execution_mode = execution_mode
+        self.ensemble_size = max(1, ensemble_size)
+
+        # Квантование TFLite модели, экспортируемой вместе с лучшей моделью
+        self.tflite_quantization = tflite_quantization
+
         self.total_count = 0
 
     def optimize_train(self, trained_model_name, is_create_app):
         self.test_loss = 1
         self.test_acc = 0
-        num_layers = 0
+        self.best_trial = None
+        self.executor = None
 
         try:
-            # Итерация по числу скрытых слоёв
-            for layers in self.hidden_layers:
-                log_message(f'Layers {num_layers}/{len(self.hidden_layers)}')
-                # Генерируем комбинации нейронов
-                neuron_combinations = list(itertools.product(self.neurons_per_layer, repeat=layers))
-
-                # Генерируем комбинации функций активаций
-                activation_combinations = list(itertools.product(self.activation_functions, repeat=layers))
-
-                # Полностью совмещаем нейроны и функции активаций между собой
-                full_combinations = [
-                    {'neurons': neurons, 'activations': activations}
-                    for neurons in neuron_combinations
-                    for activations in activation_combinations
-                ]
+            # Выборка читается и делится один раз, поэтому все конфигурации сравниваются на одних и тех же данных.
+            # Зерно деления зависит от отпечатка датасета: при повторном запуске выборки совпадут с записанными в журнал
+            dataset_folder_path = config_paths.get_dataset_path(self.user_name, self.dataset_name).replace('.zip', '')
+            dataset_fingerprint = get_dataset_fingerprint(dataset_folder_path)
+            self.dataset = load_lnn_dataset(
+                self.ai_model, dataset_folder_path, self.train_percentage, self.test_percentage, seed=int(dataset_fingerprint[:8], 16))
+
+            self.journal = LnnTrialJournal(
+                self.__get_journal_path(), dataset_fingerprint, self.ai_model, self.train_percentage, self.test_percentage)
+            self.__restore_best_from_journal()
+
+            if self.max_parallel_trials > 1:
+                self.__start_executor()
+
+            # Для Hyperband нужно хотя бы две ступени бюджета, иначе он вырождается в одну случайную конфигурацию
+            if self.search_strategy == 'hyperband' and len(self.epochs) > 1:
+                self.__hyperband_search()
+            elif self.search_strategy == 'hyperband':
+                message = 'Hyperband needs at least two epochs values, grid search is used instead'
+                log_message(message)
+                job_progress.report(0, message)
+                self.__grid_search()
+            elif self.search_strategy == 'random':
+                self.__random_search()
+            elif self.search_strategy == 'bayesian':
+                self.__bayesian_search()
+            else:
+                self.__grid_search()
 
-                num_combo_neurons_activations = 0
-                for combo in full_combinations:
-                    log_message(f'Combo neurons and activations {num_combo_neurons_activations}/{len(full_combinations)}')
-                    self.__iteration_for_optimizers(list(combo['neurons']), list(combo['activations']))
-                    num_combo_neurons_activations += 1
-                num_layers += 1
-                
         except Exception as ex:
             log_message(ex)
         finally:
+            self.__stop_executor()
             log_message(f'Total count {self.total_count}')
-            return self.trainer.save_model(trained_model_name, self.best_trained_model, self.history, is_create_app)
-
-    def __iteration_for_optimizers(self, neurons_in_layers, activations):
-        for optimizer in self.optimizers:
-            self.__iteration_for_batch_size(neurons_in_layers, activations, optimizer)
-
-    def __iteration_for_batch_size(self, neurons_in_layers, activations, optimizer):
-        for batch_size in self.batch_sizes:
-            self.__iteration_for_epochs(neurons_in_layers, activations, optimizer, batch_size)
-
-
-    def __iteration_for_epochs(self, neurons_in_layers, activations, optimizer, batch_size):
-        for epoch in self.epochs:
-            trainer = LNN_Trainer(
-                self.ai_model,
-                epoch,
-                batch_size,
-                neurons_in_layers,
-                activations,
-                optimizer,
-                self.user_name,
-                self.dataset_name,
-                50,
-                25)
-            trained_model, history, test_loss, test_acc = trainer.train()
-
-            if (self.test_loss > test_loss and self.test_acc < test_acc):
-                self.trainer = trainer
-                self.test_loss = test_loss
-                self.test_acc = test_acc
-                self.best_trained_model = trained_model
-                self.history = history
-            
-            self.total_count += 1
-            log_message(f'Values acc - {test_acc} Values loss - {test_loss}; Configuration: epoch - {epoch}; batch_size - {batch_size}; neurons_in_layers - {neurons_in_layers}; activations - {activations}; optimizer - {optimizer}')
+            return self.__save_best_model(trained_model_name, is_create_app)
+
+    def __grid_search(self):
+        configurations = iter(self.search_space)
+        configurations_count = len(self.search_space)
+        if self.max_trials is not None:
+            configurations = itertools.islice(configurations, self.max_trials)
+            configurations_count = min(configurations_count, self.max_trials)
+
+        self.expected_count = configurations_count * len(self.epochs)
+        for trial, snapshots in self.__run_trials(self.__get_trials(configurations)):
+            self.__record_trial(trial, snapshots)
+
+    def __random_search(self):
+        indices = self.search_space.sample_indices(self.__get_trials_budget(), random.Random())
+        self.expected_count = len(indices) * len(self.epochs)
+
+        configurations = (self.search_space.get(index) for index in indices)
+        for trial, snapshots in self.__run_trials(self.__get_trials(configurations)):
+            self.__record_trial(trial, snapshots)
+
+    def __bayesian_search(self):
+        rng = random.Random()
+        budget = self.__get_trials_budget()
+        self.expected_count = budget * len(self.epochs)
+
+        # Лучшая точность каждой обученной конфигурации (по всем значениям эпох)
+        evaluated = {}
+
+        # Начинаем со случайных конфигураций, затем суррогатная модель выбирает наиболее перспективные
+        indices = self.search_space.sample_indices(min(self.__bayesian_initial_trials, budget), rng)
+        while indices:
+            indexed_trials = [(index, self.__get_trainer_kwargs(self.search_space.get(index), self.epochs)) for index in indices]
+            trial_indices = {id(trial): index for index, trial in indexed_trials}
+            for trial, snapshots in self.__run_trials(trial for _, trial in indexed_trials):
+                self.__record_trial(trial, snapshots)
+                evaluated[trial_indices[id(trial)]] = max(snapshot['test_acc'] for snapshot in snapshots)
+
+            # Порция равна числу процессов, чтобы пул не простаивал
+            batch_size = min(self.max_parallel_trials, budget - len(evaluated))
+            indices = self.__suggest_indices(evaluated, batch_size, rng) if batch_size > 0 else []
+
+    def __suggest_indices(self, evaluated, count, rng):
+        candidates = self.search_space.sample_indices(self.__bayesian_candidates, rng, exclude=evaluated)
+        if not candidates:
+            return []
+
+        surrogate = GaussianProcessSurrogate()
+        surrogate.fit(
+            [self.search_space.encode(self.search_space.get(index)) for index in evaluated],
+            list(evaluated.values()))
+
+        mean, std = surrogate.predict([self.search_space.encode(self.search_space.get(index)) for index in candidates])
+        scores = expected_improvement(mean, std, max(evaluated.values()))
+
+        ranked = sorted(zip(scores, candidates), reverse=True)
+        return [index for _, index in ranked[:count]]
+
+    def __hyperband_search(self):
+        # Ступени бюджета - различные значения эпох по возрастанию
+        rungs = self.epochs
+        max_bracket = len(rungs) - 1
+
+        # Каждая группа (bracket) начинает со своей ступени: чем ниже ступень, тем больше конфигураций.
+        # На каждой ступени дальше проходит лучшая 1/eta часть конфигураций
+        bracket_sizes = [
+            (bracket, math.ceil((max_bracket + 1) / (bracket + 1) * self.eta ** bracket))
+            for bracket in range(max_bracket, -1, -1)
+        ]
+        indices = self.search_space.sample_indices(sum(size for _, size in bracket_sizes), random.Random())
+
+        brackets = []
+        for bracket, size in bracket_sizes:
+            brackets.append((bracket, [self.search_space.get(index) for index in indices[:size]]))
+            indices = indices[size:]
+
+        self.expected_count = sum(
+            self.__get_rung_size(len(bracket_configurations), step)
+            for bracket, bracket_configurations in brackets
+            for step in range(bracket + 1))
+
+        for bracket, bracket_configurations in brackets:
+            # Продвинутая конфигурация продолжает обучение с весов предыдущей ступени, а не обучается заново.
+            # Состояния хранятся по номеру конфигурации в bracket_configurations
+            initial_states = {}
+            for step in range(bracket + 1):
+                if not bracket_configurations:
+                    break
+
+                rung = rungs[max_bracket - bracket + step]
+                trials = [
+                    self.__get_hyperband_trial(configuration, rung, initial_states.get(index), step < bracket)
+                    for index, configuration in enumerate(bracket_configurations)
+                ]
+                log_message(f'Hyperband bracket {bracket}: {len(trials)} configurations for {rung} epochs')
+
+                # В режиме ensemble результаты приходят не в порядке trials
+                trial_indices = {id(trial): index for index, trial in enumerate(trials)}
+                ranked = []
+                rung_states = {}
+                for trial, snapshots in self.__run_trials(trials):
+                    self.__record_trial(trial, snapshots)
+                    index = trial_indices[id(trial)]
+                    ranked.append((snapshots[0]['test_acc'], -snapshots[0]['test_loss'], index))
+
+                    # Результат из журнала без весов продвигается без состояния и обучается с первой эпохи
+                    if 'weights' in snapshots[0]:
+                        rung_states[index] = {'weights': snapshots[0]['weights'], 'epochs': rung, 'history': snapshots[0]['history']}
+
+                # Продвигаем лучшие по точности (при равенстве - по ошибке) конфигурации
+                ranked.sort(reverse=True)
+                promoted = [index for _, _, index in ranked[:self.__get_rung_size(len(trials), 1)]]
+                bracket_configurations = [bracket_configurations[index] for index in promoted]
+                initial_states = {position: rung_states[index] for position, index in enumerate(promoted) if index in rung_states}
+
+    def __get_hyperband_trial(self, configuration, rung, initial_state, is_promotable):
+        trial = self.__get_trainer_kwargs(configuration, [rung])
+        if initial_state is not None:
+            trial['initial_state'] = initial_state
+
+        # Для продолжения на следующей ступени нужны итоговые веса каждой конфигурации, а не только лучшей
+        if is_promotable:
+            trial['weights_threshold'] = None
+        return trial
+
+    def __get_rung_size(self, configurations_count, step):
+        size = configurations_count
+        for _ in range(step):
+            size = max(1, size // self.eta)
+        return size
+
+    def __get_trials_budget(self):
+        if self.max_trials is None:
+            return len(self.search_space)
+
+        return min(self.max_trials, len(self.search_space))
+
+    def __get_trials(self, configurations):
+        # Каждая конфигурация оценивается для всех значений эпох за одно обучение
+        for configuration in configurations:
+            yield self.__get_trainer_kwargs(configuration, self.epochs)
+
+    def __run_trials(self, trials):
+        # Уже записанные в журнал значения эпох не обучаются повторно: конфигурация обучается только на недостающие
+        journaled = deque()
+        originals = {}
+
+        def get_missing_trials():
+            for trial in trials:
+                results = self.journal.get_results(trial)
+                journaled_snapshots = [results[epochs] for epochs in trial['epochs_snapshots'] if epochs in results]
+                missing_epochs = [epochs for epochs in trial['epochs_snapshots'] if epochs not in results]
+                if not missing_epochs:
+                    journaled.append((trial, journaled_snapshots))
+                    continue
+
+                missing_trial = dict(trial, epochs=max(missing_epochs), epochs_snapshots=missing_epochs)
+                originals[id(missing_trial)] = (trial, journaled_snapshots)
+                yield missing_trial
+
+        for missing_trial, snapshots in self.__train_trials(get_missing_trials()):
+            while journaled:
+                yield journaled.popleft()
+
+            trial, journaled_snapshots = originals.pop(id(missing_trial))
+            yield trial, sorted([*journaled_snapshots, *snapshots], key=lambda snapshot: snapshot['epochs'])
+
+        while journaled:
+            yield journaled.popleft()
+
+    def __train_trials(self, trials):
+        # В режиме single результаты возвращаются в порядке перебора, поэтому лучшая модель совпадает с последовательным режимом
+        if self.executor is None:
+            for group in self.__group_trials(trials):
+                self.__set_weights_threshold(group)
+                yield from zip(group, run_trials_group(group, self.dataset))
+            return
+
+        # Конфигурации ставятся в пул небольшими порциями, чтобы не материализовать все пространство поиска
+        pending = deque()
+        for group in self.__group_trials(trials):
+            self.__set_weights_threshold(group)
+            pending.append((group, self.executor.submit(run_trials_group, group)))
+            if len(pending) >= 2 * self.max_parallel_trials:
+                group, future = pending.popleft()
+                yield from zip(group, future.result())
+
+        while pending:
+            group, future = pending.popleft()
+            yield from zip(group, future.result())
+
+    def __set_weights_threshold(self, group):
+        # Веса возвращаются только для снимков лучше текущего лучшего результата: остальные не станут лучшими
+        # и не попадут в журнал, а копировать их из процесса пула дорого
+        for trial in group:
+            trial.setdefault('weights_threshold', (self.test_loss, self.test_acc))
+
+    def __group_trials(self, trials):
+        if self.execution_mode != 'ensemble':
+            for trial in trials:
+                yield [trial]
+            return
+
+        # Одной моделью можно обучать только конфигурации с одинаковыми оптимизатором, размером батча и эпохами,
+        # в том числе эпохами, с которых продолжается обучение
+        groups = {}
+        for trial in trials:
+            initial_state = trial.get('initial_state')
+            key = (
+                trial['optimizer'], trial['batch_size'], tuple(trial['epochs_snapshots']),
+                initial_state['epochs'] if initial_state is not None else 0)
+            groups.setdefault(key, []).append(trial)
+            if len(groups[key]) >= self.ensemble_size:
+                yield groups.pop(key)
+
+        yield from groups.values()
+
+    def __start_executor(self):
+        # Делим ядра (или заданное в настройках количество потоков TensorFlow) поровну между процессами
+        threads_count = config.get_threads_configuration_tensorflow_intra_op_threads() or os.cpu_count() or 1
+        intra_op_threads = max(1, threads_count // self.max_parallel_trials)
+
+        # Процессы пула читают выборку из разделяемой памяти, не копируя и не перечитывая её
+        self.shared_dataset = SharedLnnDataset(self.dataset)
+        self.executor = ProcessPoolExecutor(
+            max_workers=self.max_parallel_trials,
+            mp_context=multiprocessing.get_context('spawn'),
+            initializer=init_trial_worker,
+            initargs=(intra_op_threads, 1, self.shared_dataset))
+
+    def __stop_executor(self):
+        if self.executor is None:
+            return
+
+        self.executor.shutdown(wait=True, cancel_futures=True)
+        self.shared_dataset.release()
+        self.executor = None
+
+    def __get_trainer_kwargs(self, configuration, epochs_snapshots):
+        return {
+            'ai_model': self.ai_model,
+            'epochs': max(epochs_snapshots),
+            'epochs_snapshots': epochs_snapshots,
+            'batch_size': configuration['batch_size'],
+            'neurons_in_layers': configuration['neurons_in_layers'],
+            'activations': configuration['activations'],
+            'optimizer': configuration['optimizer'],
+            'user_name': self.user_name,
+            'dataset_name': self.dataset_name,
+            'train_percentage': self.train_percentage,
+            'test_percentage': self.test_percentage
+        }
+
+    def __record_trial(self, trial, snapshots):
+        # Каждая пара (конфигурация, количество эпох) сравнивается и журналируется отдельно
+        for snapshot in snapshots:
+            epochs_trial = get_trainer_kwargs(trial)
+            epochs_trial['epochs'] = snapshot['epochs']
+
+            # Результат из журнала уже участвовал в сравнении при восстановлении лучшей модели
+            if snapshot.get('journaled'):
+                self.__report_progress()
+                continue
+
+            is_best = self.__compare_with_best(epochs_trial, snapshot)
+            self.journal.add_result(epochs_trial, snapshot, is_best)
+            self.__report_progress()
+            log_message(f'Values acc - {snapshot["test_acc"]} Values loss - {snapshot["test_loss"]}; Configuration: epoch - {epochs_trial["epochs"]}; batch_size - {epochs_trial["batch_size"]}; neurons_in_layers - {epochs_trial["neurons_in_layers"]}; activations - {epochs_trial["activations"]}; optimizer - {epochs_trial["optimizer"]}')
+
+    def __restore_best_from_journal(self):
+        # Сравнение повторяется в порядке записи. Лучшими могли стать только результаты, сохраненные с весами.
+        # Результаты прежних запусков с другим пространством поиска или другими эпохами не учитываются
+        restored_count = 0
+        for configuration, result in self.journal.get_all_results():
+            if 'weights' not in result:
+                continue
+            if result['epochs'] not in self.epochs or not self.search_space.contains(configuration):
+                continue
+
+            trial = get_trainer_kwargs(self.__get_trainer_kwargs(configuration, [result['epochs']]))
+            self.__compare_with_best(trial, result)
+            restored_count += 1
+
+        if self.best_trial is not None:
+            log_message(f'Restored from journal ({restored_count} results): best acc - {self.test_acc} loss - {self.test_loss}')
+
+    def __report_progress(self):
+        self.total_count += 1
+        job_progress.report(self.total_count / self.expected_count, f'Trial {self.total_count}/{self.expected_count}')
+
+    def __compare_with_best(self, trial, result):
+        test_loss = result['test_loss']
+        test_acc = result['test_acc']
+
+        if not (self.test_loss > test_loss and self.test_acc < test_acc):
+            return False
+
+        self.test_loss = test_loss
+        self.test_acc = test_acc
+        self.best_trial = trial
+        self.best_result = result
+        return True
+
+    def __get_journal_path(self):
+        # Журнал хранится рядом с моделями пользователя
+        _, ai_model_type_string = AI_Model_Type.convert_to_string_try_get(AI_Model_Type.LNN)
+        models_folder_path = config_paths.get_models_folder_path(self.user_name, ai_model_type_string)
+        if not os.path.exists(models_folder_path):
+            os.makedirs(models_folder_path)
+
+        return f'{models_folder_path}/optimize_trials.sqlite'
+
+    def __save_best_model(self, trained_model_name, is_create_app):
+        if self.best_trial is None:
+            return Result(None, 'Error: No trial has finished with a result better than the initial one')
+
+        # Восстанавливаем лучшую модель по весам, полученным из испытания
+        trainer = LNN_Trainer(**self.best_trial, dataset=self.dataset, tflite_quantization=self.tflite_quantization)
+        best_trained_model = trainer.create_model()
+        best_trained_model.set_weights(self.best_result['weights'])
+
+        return trainer.save_model(trained_model_name, best_trained_model, TrialHistory(self.best_result['history']), is_create_app)
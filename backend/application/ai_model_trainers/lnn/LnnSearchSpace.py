@@ -0,0 +1,106 @@
+import math
+
+import numpy as np
+
+class LnnSearchSpace:
+    # Пространство конфигураций сети. Конфигурации не хранятся, а вычисляются по номеру,
+    # поэтому пространство может быть сколь угодно большим
+    def __init__(self, hidden_layers, neurons_per_layer, activation_functions, optimizers, batch_sizes):
+        self.hidden_layers = hidden_layers
+        self.neurons_per_layer = neurons_per_layer
+        self.activation_functions = activation_functions
+        self.optimizers = optimizers
+        self.batch_sizes = batch_sizes
+
+        # Количество конфигураций для каждого числа скрытых слоев
+        self.layer_sizes = [
+            (len(neurons_per_layer) * len(activation_functions)) ** layers * len(optimizers) * len(batch_sizes)
+            for layers in hidden_layers
+        ]
+
+    def __len__(self):
+        return sum(self.layer_sizes)
+
+    def __iter__(self):
+        # Порядок совпадает с полным перебором: слои, нейроны, функции активации, оптимизатор, размер батча
+        for index in range(len(self)):
+            yield self.get(index)
+
+    def get(self, index):
+        for layers, layer_size in zip(self.hidden_layers, self.layer_sizes):
+            if index < layer_size:
+                return self.__decode(layers, index)
+            index -= layer_size
+
+        raise IndexError('Configuration index out of range')
+
+    def contains(self, configuration):
+        # Конфигурация входит в пространство, если каждое её значение есть среди перебираемых
+        layers = len(configuration['neurons_in_layers'])
+        return (
+            layers in self.hidden_layers
+            and len(configuration['activations']) == layers
+            and all(neurons in self.neurons_per_layer for neurons in configuration['neurons_in_layers'])
+            and all(activation in self.activation_functions for activation in configuration['activations'])
+            and configuration['optimizer'] in self.optimizers
+            and configuration['batch_size'] in self.batch_sizes)
+
+    def sample_indices(self, count, rng, exclude=()):
+        # Случайные номера без повторений; range не материализуется
+        available = len(self) - len(exclude)
+        if not exclude:
+            return rng.sample(range(len(self)), min(count, available))
+
+        indices = set()
+        while len(indices) < min(count, available):
+            index = rng.randrange(len(self))
+            if index not in exclude:
+                indices.add(index)
+        return list(indices)
+
+    def encode(self, configuration):
+        """
+        Числовое представление конфигурации фиксированной длины для суррогатной модели.
+
+        :param configuration: Конфигурация, полученная из get
+        :return: Вектор признаков
+        """
+        max_layers = max(self.hidden_layers)
+        max_neurons = math.log2(max(self.neurons_per_layer) + 1)
+        max_batch_size = math.log2(max(self.batch_sizes) + 1)
+
+        features = [len(configuration['neurons_in_layers']) / max(max_layers, 1)]
+        for layer in range(max_layers):
+            layer_features = [0.0] * (1 + len(self.activation_functions))
+            if layer < len(configuration['neurons_in_layers']):
+                layer_features[0] = math.log2(configuration['neurons_in_layers'][layer] + 1) / max_neurons
+                layer_features[1 + self.activation_functions.index(configuration['activations'][layer])] = 1.0
+            features.extend(layer_features)
+
+        optimizer_features = [0.0] * len(self.optimizers)
+        optimizer_features[self.optimizers.index(configuration['optimizer'])] = 1.0
+        features.extend(optimizer_features)
+
+        features.append(math.log2(configuration['batch_size'] + 1) / max_batch_size)
+        return np.array(features)
+
+    def __decode(self, layers, index):
+        # index = ((номер комбинации нейронов * A^layers + номер комбинации активаций) * O + оптимизатор) * B + батч
+        index, batch_size_index = divmod(index, len(self.batch_sizes))
+        index, optimizer_index = divmod(index, len(self.optimizers))
+        neurons_index, activations_index = divmod(index, len(self.activation_functions) ** layers)
+
+        return {
+            'neurons_in_layers': self.__decode_combination(self.neurons_per_layer, layers, neurons_index),
+            'activations': self.__decode_combination(self.activation_functions, layers, activations_index),
+            'optimizer': self.optimizers[optimizer_index],
+            'batch_size': self.batch_sizes[batch_size_index]
+        }
+
+    def __decode_combination(self, values, length, index):
+        # Аналог itertools.product(values, repeat=length): первый элемент - старший разряд
+        combination = []
+        for _ in range(length):
+            index, value_index = divmod(index, len(values))
+            combination.append(values[value_index])
+        return combination[::-1]
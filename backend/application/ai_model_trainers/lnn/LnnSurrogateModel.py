@@ -0,0 +1,53 @@
+import math
+
+import numpy as np
+
+class GaussianProcessSurrogate:
+    # Гауссовский процесс с RBF ядром: по уже обученным конфигурациям предсказывает точность
+    # и неопределенность для еще не обученных
+    def __init__(self, length_scale=1.0, noise=1e-3):
+        self.length_scale = length_scale
+        self.noise = noise
+
+    def fit(self, features, targets):
+        self.features = np.asarray(features, dtype=np.float64)
+        targets = np.asarray(targets, dtype=np.float64)
+
+        # Нормализация целевых значений
+        self.targets_mean = targets.mean()
+        self.targets_std = targets.std() if targets.std() > 0 else 1.0
+        normalized_targets = (targets - self.targets_mean) / self.targets_std
+
+        kernel = self.__kernel(self.features, self.features) + self.noise * np.eye(len(self.features))
+        self.cholesky = np.linalg.cholesky(kernel)
+        self.alpha = np.linalg.solve(self.cholesky.T, np.linalg.solve(self.cholesky, normalized_targets))
+
+    def predict(self, features):
+        features = np.asarray(features, dtype=np.float64)
+        cross_kernel = self.__kernel(features, self.features)
+
+        mean = cross_kernel @ self.alpha
+        v = np.linalg.solve(self.cholesky, cross_kernel.T)
+        variance = np.clip(1.0 - np.sum(v ** 2, axis=0), 1e-12, None)
+
+        return mean * self.targets_std + self.targets_mean, np.sqrt(variance) * self.targets_std
+
+    def __kernel(self, a, b):
+        squared_distances = np.sum(a ** 2, axis=1)[:, None] + np.sum(b ** 2, axis=1)[None, :] - 2 * a @ b.T
+        return np.exp(-0.5 * np.clip(squared_distances, 0, None) / self.length_scale ** 2)
+
+def expected_improvement(mean, std, best_value, xi=0.01):
+    """
+    Ожидаемое улучшение относительно лучшего найденного значения (задача максимизации).
+
+    :param mean: Предсказанные значения
+    :param std: Неопределенность предсказаний
+    :param best_value: Лучшее найденное значение
+    :param xi: Запас, поощряющий исследование
+    :return: Значение критерия для каждой конфигурации
+    """
+    improvement = mean - best_value - xi
+    z = improvement / std
+    cdf = 0.5 * (1 + np.vectorize(math.erf)(z / math.sqrt(2)))
+    pdf = np.exp(-0.5 * z ** 2) / math.sqrt(2 * math.pi)
+    return improvement * cdf + std * pdf
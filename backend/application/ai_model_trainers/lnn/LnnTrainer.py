@@ -1,19 +1,26 @@
+import logging
 import os
-import random
-from matplotlib import pyplot as plt
 from tensorflow import keras
 from tensorflow.keras import layers
 from tensorflow.keras.callbacks import EarlyStopping
 
-import numpy as np
-from application.create_app.create_app import build_exe_with_class_names
+from application.create_app.create_app import build_app_with_model
 from application import config_paths
 from application.results.Result import Result
-from application.ai_model_trainers.get_last_version import get_last_version_model
+from application.ai_model_trainers.training_plots import create_training_plots
+from application.ai_model_trainers.class_names import save_class_names
 from application.services import data_storage_services
 from application.services.zip_archive_service import create_zip_archive
 from application.ai_models.ai_models import Model_Classification_Type, AI_Model_Type
+from application.ai_model_trainers.lnn.LnnDataset import load_lnn_dataset
+from application.ai_model_trainers.lnn.EpochSnapshotsCallback import EpochSnapshotsCallback
 from application.create_app import AppLnn
+from application.jobs.job_progress import JobProgressCallback
+from application.services.lnn_dataset_cache_service import get_dataset_fingerprint
+from application.ai_model_trainers import training_checkpoints
+from application.ai_model_trainers.warm_start import resolve_warm_start, load_warm_start_weights
+from application.ai_model_trainers import tflite_export
+from application.jobs import job_progress
 
 class LNN_Trainer:
     def __init__(            
@@ -27,7 +34,10 @@ class LNN_Trainer:
             user_name,
             dataset_name,
             train_percentage,
-            test_percentage):
+            test_percentage,
+            dataset=None,
+            warm_start_version=None,
+            tflite_quantization=tflite_export.QUANTIZATION_NONE):
         self.ai_model = ai_model 
         self.epochs = epochs 
         self.batch_size = batch_size 
@@ -36,32 +46,49 @@ class LNN_Trainer:
         self.optimizer = optimizer 
         self.user_name = user_name
         self.dataset_name = dataset_name
+        self.tflite_quantization = tflite_quantization
 
         # Путь к датасету необходимому для обучения
         self.dataset_folder_path = config_paths.get_dataset_path(self.user_name, self.dataset_name).replace('.zip', '')
 
+        # Сохраненная версия модели, с весов которой начинается обучение. Тренер получает только конкретную версию:
+        # latest разрешается маршрутом по имени обучаемой модели, а здесь отклоняется с ValueError
+        self.warm_start_path = None
+        if warm_start_version is not None:
+            warm_start_result = resolve_warm_start(user_name, AI_Model_Type.LNN, None, warm_start_version)
+            if not warm_start_result.isSuccess:
+                raise ValueError(warm_start_result.errors)
+            _, self.warm_start_path = warm_start_result.result
+
+        # Получение выборки: общей для нескольких обучений, либо прочитанной с диска.
+        # Самостоятельное обучение можно продолжить после прерывания, поэтому выборка делится по зерну из ключа обучения
+        self.training_key = None
+        if dataset is None:
+            self.training_key = training_checkpoints.get_training_key('lnn', {
+                'ai_model': ai_model.name,
+                'epochs': epochs,
+                'batch_size': batch_size,
+                'neurons_in_layers': neurons_in_layers,
+                'activations': activations,
+                'optimizer': optimizer,
+                'user_name': user_name,
+                'dataset_name': dataset_name,
+                'train_percentage': train_percentage,
+                'test_percentage': test_percentage,
+                'warm_start_version': warm_start_version
+            }, get_dataset_fingerprint(self.dataset_folder_path))
+            dataset = load_lnn_dataset(
+                ai_model, self.dataset_folder_path, train_percentage, test_percentage, seed=training_checkpoints.get_split_seed(self.training_key))
+        self.all_classes = dataset.all_classes
+        self.quantity_classes = dataset.quantity_classes
+
         # Донастройка нейронной сети в зависимости от её типа: бинарная, либо многоклассовая
         self.__init_last_element_in_init_activations(ai_model)
         self.__init_last_element_in_neurons_in_layers(ai_model)
         self.loss = self.__init_loss(ai_model)
 
-        # Получение всей выборки данных
-        data, labels = self.__get_data()
-        self.all_classes = list(set(labels))
-
-        # Кодирование labels
-        encoded_labels = self.__get_encode_labels(ai_model, labels)
-
-        # Деление на тренировочную, тестовую и проверочную
-        if train_percentage + test_percentage > 100:
-            raise ValueError("При делении выборки на обучающую и тестовую, сумма значений не должна быть больше 100")  
-
-        total_size = len(data)
-        train_size = int(total_size * train_percentage * 0.01)
-        test_size = int(total_size * test_percentage * 0.01)
-
-        self.train_data, self.test_data, self.valid_data = np.split(data, [train_size, train_size + test_size])
-        self.train_labels, self.test_labels, self.valid_labels = np.split(encoded_labels, [train_size, train_size + test_size])
+        self.train_data, self.test_data, self.valid_data = dataset.train_data, dataset.test_data, dataset.valid_data
+        self.train_labels, self.test_labels, self.valid_labels = dataset.train_labels, dataset.test_labels, dataset.valid_labels
 
     def train(self):
         isSuccess, msg = self.__validate_parameters()
@@ -73,13 +100,37 @@ class LNN_Trainer:
 
         return model, history, test_loss, test_acc
 
+    def train_snapshots(self, epochs_snapshots, weights_threshold=None, initial_state=None):
+        isSuccess, msg = self.__validate_parameters()
+        if not isSuccess:
+            return Result(None, msg)
+
+        # Одно обучение на максимальное число эпох с оценкой после каждого из значений epochs_snapshots.
+        # initial_state - веса, число эпох и история уже проведенного обучения, которое продолжается
+        self.epochs = max(epochs_snapshots)
+        snapshots_callback = EpochSnapshotsCallback(epochs_snapshots, self.test_data, self.test_labels, weights_threshold)
+        _, history, _, _ = self.__train([snapshots_callback], initial_state)
+
+        initial_epoch, initial_history = get_initial_epoch_and_history(initial_state)
+        snapshots = []
+        for epochs, snapshot in sorted(snapshots_callback.snapshots.items()):
+            snapshot['epochs'] = epochs
+            snapshot['history'] = {
+                name: initial_history.get(name, []) + values[:epochs - initial_epoch] for name, values in history.history.items()}
+            snapshots.append(snapshot)
+
+        return snapshots
+
     def train_and_save(self, trained_model_name, is_create_app):
         isSuccess, msg = self.__validate_parameters()
         if not isSuccess:
             return Result(None, msg)
     
-        # Запуск обучения
-        model, history, _, _ = self.__train()
+        # Запуск обучения. При повторном запуске прерванного обучения оно продолжается с последней сохраненной эпохи
+        callbacks = [JobProgressCallback(self.epochs)]
+        if self.training_key is not None:
+            callbacks.append(training_checkpoints.create_backup_callback(self.training_key))
+        model, history, _, _ = self.__train(callbacks)
         
         # Сохранения обученной модели
         return self.save_model(trained_model_name, model, history, is_create_app)
@@ -93,65 +144,69 @@ class LNN_Trainer:
         # Сохранение обученной модели и графиков обучения
         model_path = f'{trained_ai_model_folder_path}/{trained_model_name}.h5'
         model.save(model_path)
-        self.__create_plots(history, trained_ai_model_folder_path)
+        save_class_names(self.all_classes, trained_ai_model_folder_path)
+        create_training_plots(history, trained_ai_model_folder_path)
+
+        # Оптимизированная модель для предсказаний, калибровка - по примерам обучающей выборки
+        tflite_export.export_tflite_or_warn(
+            model, model_path, self.train_data[:tflite_export.representative_samples_count], self.tflite_quantization)
 
-        # Если нужно создать приложение
+        # Если нужно создать приложение: копируется закэшированная сборка, модель и классы кладутся рядом с exe
         if is_create_app:
-            build_exe_with_class_names(
-                self.all_classes,
+            build_app_with_model(
                 base_script_path=AppLnn.current_file_path,
-                model_path=model_path,
-                dist_path=trained_ai_model_folder_path,
+                model_folder_path=trained_ai_model_folder_path,
                 exe_name="App.exe")
 
-        # Из всех обученных моделей со схожим именем выбираем самую новую модель
-        _, latest_version = get_last_version_model(self.user_name, AI_Model_Type.LNN, trained_model_name)
+        # Имя сохраненной версии - имя её папки. Версия регистрируется вместе с итоговыми метриками обучения
+        latest_version = os.path.basename(trained_ai_model_folder_path)
         create_zip_archive(trained_ai_model_folder_path)
+        data_storage_services.store_model_files(
+            self.user_name, AI_Model_Type.LNN, latest_version, {name: float(values[-1]) for name, values in history.history.items()})
 
         return data_storage_services.get_model_by_name(self.user_name, AI_Model_Type.LNN, latest_version)
 
-    def __train(self):
+    def create_model(self):
         model_layers = []
         for i in range(len(self.neurons_in_layers)):
            model_layers.append(layers.Dense(self.neurons_in_layers[i], activation=self.activations[i]))
         model = keras.Sequential(model_layers)
+        model.build((None, self.train_data.shape[1]))
 
         model.compile(
                     optimizer=self.optimizer,
                     loss=self.loss,
                     metrics=["accuracy"])
         
+        return model
+
+    def __train(self, extra_callbacks=(), initial_state=None):
+        model = self.create_model()
+        if self.warm_start_path is not None:
+            self.__load_warm_start(model)
+        if initial_state is not None:
+            model.set_weights(initial_state['weights'])
+        initial_epoch, _ = get_initial_epoch_and_history(initial_state)
+
         early_stopping = EarlyStopping(monitor='val_loss', patience=5, restore_best_weights=True)
         history = model.fit(
                             self.train_data,
                             self.train_labels,
                             epochs=self.epochs,
+                            initial_epoch=initial_epoch,
                             batch_size=self.batch_size,
                             validation_data = (self.valid_data, self.valid_labels),
-                            callbacks=[early_stopping])
+                            callbacks=[early_stopping, *extra_callbacks])
         test_loss, test_acc = model.evaluate(self.test_data, self.test_labels)
 
         return model, history, test_loss, test_acc
     
-    def __create_plots(self, history, save_folder):
-        # Построение графиков обучения
-        plt.figure(figsize=(8, 6))
-        plt.plot(history.history['loss'], label='training loss')
-        plt.plot(history.history['val_loss'], label='validation loss')
-        plt.title('Loss Plot')
-        plt.xlabel('Epochs')
-        plt.ylabel('Loss')
-        plt.legend()
-        plt.savefig(f'{save_folder}/loss_plot.png', dpi=300)
-
-        plt.figure(figsize=(8, 6))
-        plt.plot(history.history['accuracy'], label='training accuracy')
-        plt.plot(history.history['val_accuracy'], label='validation accuracy')
-        plt.title('Accuracy Plot')
-        plt.xlabel('Epochs')
-        plt.ylabel('Accuracy')
-        plt.legend()
-        plt.savefig(f'{save_folder}/accuracy_plot.png', dpi=300)
+    def __load_warm_start(self, model):
+        # Если архитектура изменилась, обучение начинается со случайных весов
+        result = load_warm_start_weights(model, self.warm_start_path)
+        if not result.isSuccess:
+            logging.warning(f'Warm start skipped: {result.errors}')
+            job_progress.report(0, f'Warm start skipped: {result.errors}')
 
     def __init_last_element_in_init_activations(self, ai_model):
         if ai_model == Model_Classification_Type.Binary:
@@ -171,52 +226,7 @@ class LNN_Trainer:
             self.neurons_in_layers.append(1)
             return
         
-        self.neurons_in_layers.append(len(self.__get_quantity_classes()))
-
-    def __get_quantity_classes(self):
-        all_items = os.listdir(self.dataset_folder_path)
-        return [item for item in all_items if os.path.isdir(os.path.join(self.dataset_folder_path, item))]
-
-    def __get_data(self):
-        all_files = self.__get_all_files(self.dataset_folder_path)
-        random.shuffle(all_files)
-
-        data = []
-        labels = []
-
-        # Читаем данные из каждого файла и сохраняем их вместе с меткой
-        for file_path in all_files:
-            with open(file_path, 'r') as f:
-                numbers = [float(line.strip()) for line in f.readlines()]
-                data.append(np.array(numbers))
-                label = os.path.basename(os.path.dirname(file_path))  # Имя папки, где находится файл
-                labels.append(label)
-
-        # Преобразуем списки в numpy массивы
-        return np.array(data), np.array(labels)
-
-    # Функция для получения всех файлов в директории и её подпапках
-    def __get_all_files(self, root_dir):
-        files = []
-        for dir_name, _, file_names in os.walk(root_dir):
-            for file_name in file_names:
-                if file_name.endswith('.txt'):
-                    files.append(os.path.join(dir_name, file_name))
-        return files
-
-    def __get_encode_labels(self, ai_model, labels):
-        _, inverse_indices = np.unique(labels, return_inverse=True)
-        encoded_labels = inverse_indices
-        if ai_model == Model_Classification_Type.Binary:
-            return encoded_labels
-        
-        return self.__to_one_hot(encoded_labels, len(self.__get_quantity_classes()))
-
-    def __to_one_hot(self, labels, dimension):
-        results = np.zeros((len(labels), dimension))
-        for i, label in enumerate(labels):
-          results[i, label] = 1
-        return results
+        self.neurons_in_layers.append(self.quantity_classes)
 
     def __validate_parameters(self):
         # Проверка, что массивы одинаковой длины
@@ -225,3 +235,10 @@ class LNN_Trainer:
 
         # Если все проверки пройдены
         return True, "Валидация прошла успешно"
+
+def get_initial_epoch_and_history(initial_state):
+    # Обучение без initial_state начинается с первой эпохи и пустой истории
+    if initial_state is None:
+        return 0, {}
+
+    return initial_state['epochs'], initial_state['history']
@@ -0,0 +1,82 @@
+import time
+
+import tensorflow as tf
+
+from application.ai_model_trainers.lnn.LnnTrainer import LNN_Trainer
+from application.ai_model_trainers.lnn.LnnEnsembleTrainer import LnnEnsembleTrainer
+
+# Выборка, подключенная к процессу пула из разделяемой памяти
+__worker_dataset = None
+
+# Параметры испытания, которые не передаются в LNN_Trainer
+__trial_keys = ('epochs_snapshots', 'weights_threshold', 'initial_state')
+
+class TrialHistory:
+    # Замена keras History: историю обучения нужно передавать между процессами
+    def __init__(self, history):
+        self.history = history
+
+def init_trial_worker(intra_op_threads, inter_op_threads, shared_dataset):
+    global __worker_dataset
+
+    # Ограничиваем потоки TensorFlow, чтобы параллельные испытания не конкурировали за ядра
+    tf.config.threading.set_intra_op_parallelism_threads(intra_op_threads)
+    tf.config.threading.set_inter_op_parallelism_threads(inter_op_threads)
+
+    __worker_dataset = shared_dataset.attach()
+
+def run_trial(trial, dataset=None):
+    """
+    Обучение одной конфигурации сети. Может выполняться как в текущем процессе, так и в процессе пула.
+    Конфигурация обучается один раз на максимальное число эпох и оценивается после каждого значения epochs_snapshots.
+
+    :param trial: Параметры LNN_Trainer, список epochs_snapshots, необязательные weights_threshold
+                  и initial_state - продолжаемое обучение (веса, число эпох и история)
+    :param dataset: Общая выборка. В процессе пула берется выборка из разделяемой памяти
+    :return: Для каждого значения эпох - метрики на тестовой выборке, история обучения
+             и веса, если снимок превзошел weights_threshold
+    """
+    trainer = LNN_Trainer(**get_trainer_kwargs(trial), dataset=dataset if dataset is not None else __worker_dataset)
+
+    return trainer.train_snapshots(trial['epochs_snapshots'], trial.get('weights_threshold'), trial.get('initial_state'))
+
+def run_ensemble_trial(trials, dataset=None):
+    """
+    Обучение нескольких конфигураций одной моделью. У всех конфигураций должны совпадать
+    оптимизатор, размер батча, список epochs_snapshots и число эпох продолжаемого обучения.
+
+    :param trials: Параметры LNN_Trainer и список epochs_snapshots для каждой конфигурации
+    :param dataset: Общая выборка. В процессе пула берется выборка из разделяемой памяти
+    :return: Для каждой конфигурации - результат в формате run_trial
+    """
+    trainer = LnnEnsembleTrainer(
+        [get_trainer_kwargs(trial) for trial in trials],
+        dataset if dataset is not None else __worker_dataset)
+
+    return trainer.train_snapshots(
+        trials[0]['epochs_snapshots'], trials[0].get('weights_threshold'), [trial.get('initial_state') for trial in trials])
+
+def run_trials_group(trials, dataset=None):
+    """
+    Обучение группы конфигураций: одна конфигурация обучается отдельно, несколько - одной моделью.
+
+    :param trials: Конфигурации, сгруппированные LnnOptimizeTrainer
+    :param dataset: Общая выборка. В процессе пула берется выборка из разделяемой памяти
+    :return: Для каждой конфигурации - результат в формате run_trial с длительностью обучения
+    """
+    start_time = time.perf_counter()
+    if len(trials) == 1:
+        results = [run_trial(trials[0], dataset)]
+    else:
+        results = run_ensemble_trial(trials, dataset)
+
+    # Время обучения группы делится поровну между конфигурациями
+    duration = (time.perf_counter() - start_time) / len(trials)
+    for snapshots in results:
+        for snapshot in snapshots:
+            snapshot['duration'] = duration
+
+    return results
+
+def get_trainer_kwargs(trial):
+    return {key: value for key, value in trial.items() if key not in __trial_keys}
@@ -0,0 +1,120 @@
+import io
+import json
+import sqlite3
+from contextlib import contextmanager
+from datetime import datetime
+
+import numpy as np
+
+class LnnTrialJournal:
+    # Журнал испытаний подбора параметров в SQLite. Каждая пара (конфигурация, количество эпох) записывается сразу
+    # после обучения, поэтому после перезапуска уже проверенные конфигурации не обучаются повторно.
+    # Веса и история хранятся только для результатов, которые на момент записи были лучшими
+    def __init__(self, journal_path, dataset_fingerprint, ai_model, train_percentage, test_percentage):
+        self.journal_path = journal_path
+        self.scope = (dataset_fingerprint, ai_model.name, train_percentage, test_percentage)
+
+        with self.__connect() as connection:
+            connection.execute('''
+                CREATE TABLE IF NOT EXISTS trials (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    dataset_fingerprint TEXT NOT NULL,
+                    ai_model TEXT NOT NULL,
+                    train_percentage INTEGER NOT NULL,
+                    test_percentage INTEGER NOT NULL,
+                    configuration TEXT NOT NULL,
+                    epochs INTEGER NOT NULL,
+                    test_loss REAL NOT NULL,
+                    test_acc REAL NOT NULL,
+                    duration REAL NOT NULL,
+                    created_at TEXT NOT NULL,
+                    weights BLOB,
+                    history TEXT)''')
+            connection.execute('''
+                CREATE UNIQUE INDEX IF NOT EXISTS trials_scope_configuration
+                ON trials (dataset_fingerprint, ai_model, train_percentage, test_percentage, configuration, epochs)''')
+
+    def get_results(self, trial):
+        """
+        Уже записанные результаты конфигурации.
+
+        :param trial: Параметры испытания
+        :return: Словарь {количество эпох: метрики на тестовой выборке}
+        """
+        with self.__connect() as connection:
+            rows = connection.execute(
+                '''SELECT epochs, test_loss, test_acc FROM trials
+                   WHERE dataset_fingerprint = ? AND ai_model = ? AND train_percentage = ? AND test_percentage = ? AND configuration = ?''',
+                (*self.scope, self.__get_configuration_key(trial))).fetchall()
+
+        return {epochs: {'test_loss': test_loss, 'test_acc': test_acc, 'epochs': epochs, 'journaled': True} for epochs, test_loss, test_acc in rows}
+
+    def get_all_results(self):
+        """
+        Все записанные результаты в порядке записи, чтобы сравнение с лучшим повторилось в том же порядке.
+
+        :return: Список пар (конфигурация, результат). У бывших лучшими результатов есть веса и история
+        """
+        with self.__connect() as connection:
+            rows = connection.execute(
+                '''SELECT configuration, epochs, test_loss, test_acc, weights, history FROM trials
+                   WHERE dataset_fingerprint = ? AND ai_model = ? AND train_percentage = ? AND test_percentage = ?
+                   ORDER BY id''',
+                self.scope).fetchall()
+
+        results = []
+        for configuration, epochs, test_loss, test_acc, weights, history in rows:
+            result = {'test_loss': test_loss, 'test_acc': test_acc, 'epochs': epochs}
+            if weights is not None:
+                result['weights'] = self.__load_weights(weights)
+                result['history'] = json.loads(history)
+            results.append((json.loads(configuration), result))
+        return results
+
+    def add_result(self, trial, result, is_best):
+        with self.__connect() as connection:
+            connection.execute(
+                '''INSERT OR IGNORE INTO trials
+                   (dataset_fingerprint, ai_model, train_percentage, test_percentage, configuration, epochs,
+                    test_loss, test_acc, duration, created_at, weights, history)
+                   VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)''',
+                (*self.scope,
+                 self.__get_configuration_key(trial),
+                 trial['epochs'],
+                 float(result['test_loss']),
+                 float(result['test_acc']),
+                 float(result.get('duration', 0)),
+                 datetime.now().isoformat(timespec='seconds'),
+                 self.__dump_weights(result['weights']) if is_best else None,
+                 json.dumps(self.__to_floats(result['history'])) if is_best else None))
+
+    @contextmanager
+    def __connect(self):
+        # Соединение на каждую операцию: журнал могут одновременно дописывать несколько задач
+        connection = sqlite3.connect(self.journal_path, timeout=30)
+        try:
+            with connection:
+                yield connection
+        finally:
+            connection.close()
+
+    def __get_configuration_key(self, trial):
+        # Ключ не зависит от количества эпох: они хранятся в отдельном столбце
+        return json.dumps({
+            'neurons_in_layers': trial['neurons_in_layers'],
+            'activations': trial['activations'],
+            'optimizer': trial['optimizer'],
+            'batch_size': trial['batch_size']
+        }, sort_keys=True)
+
+    def __dump_weights(self, weights):
+        buffer = io.BytesIO()
+        np.savez(buffer, *weights)
+        return buffer.getvalue()
+
+    def __load_weights(self, blob):
+        with np.load(io.BytesIO(blob)) as arrays:
+            return [arrays[f'arr_{i}'] for i in range(len(arrays.files))]
+
+    def __to_floats(self, history):
+        return {name: [float(value) for value in values] for name, values in history.items()}
@@ -0,0 +1,16 @@
+import tensorflow as tf
+
+import configurations.config as config
+
+def configure_tensorflow_threads():
+    # Количество потоков TensorFlow задается до первой операции в процессе. 0 в настройках - значение TensorFlow по умолчанию
+    intra_op_threads = config.get_threads_configuration_tensorflow_intra_op_threads()
+    inter_op_threads = config.get_threads_configuration_tensorflow_inter_op_threads()
+    try:
+        if intra_op_threads:
+            tf.config.threading.set_intra_op_parallelism_threads(intra_op_threads)
+        if inter_op_threads:
+            tf.config.threading.set_inter_op_parallelism_threads(inter_op_threads)
+    except RuntimeError:
+        # TensorFlow в этом процессе уже инициализирован
+        pass
@@ -0,0 +1,107 @@
+import os
+import json
+import time
+import logging
+
+import numpy as np
+import tensorflow as tf
+from tensorflow import keras
+
+from application.results.Result import Result
+from application.inference.TfliteModel import TfliteModel
+
+# Квантование после обучения: none - float32, float16 - веса в float16, int8 - веса и активации в int8
+# с калибровкой по примерам обучающей выборки. Входы и выходы модели остаются float32
+QUANTIZATION_NONE = 'none'
+QUANTIZATION_FLOAT16 = 'float16'
+QUANTIZATION_INT8 = 'int8'
+QUANTIZATIONS = (QUANTIZATION_NONE, QUANTIZATION_FLOAT16, QUANTIZATION_INT8)
+
+export_report_file_name = 'export_report.json'
+
+# Количество примеров обучающей выборки для калибровки int8
+representative_samples_count = 100
+
+__latency_runs = 50
+
+def export_tflite(model, model_path, representative_samples, quantization=QUANTIZATION_NONE):
+    """
+    Экспорт обученной модели в TFLite рядом с .h5 и замер размера, времени загрузки и задержки на одном примере
+    для обоих форматов. Результаты сохраняются в export_report.json.
+
+    :param model: Обученная модель
+    :param model_path: Путь до сохраненной модели .h5
+    :param representative_samples: Примеры обучающей выборки для калибровки int8 и замера задержки
+    :param quantization: none, float16, int8
+    :return: Result с отчетом экспорта
+    """
+    if quantization not in QUANTIZATIONS:
+        return Result(None, f'Error: Unknown quantization {quantization}')
+
+    converter = tf.lite.TFLiteConverter.from_keras_model(model)
+    if quantization != QUANTIZATION_NONE:
+        converter.optimizations = [tf.lite.Optimize.DEFAULT]
+    if quantization == QUANTIZATION_FLOAT16:
+        converter.target_spec.supported_types = [tf.float16]
+    if quantization == QUANTIZATION_INT8:
+        converter.representative_dataset = lambda: ([sample[np.newaxis].astype(np.float32)] for sample in representative_samples)
+
+    try:
+        tflite_model = converter.convert()
+    except Exception as e:
+        return Result(None, f'Error: TFLite conversion failed: {e}')
+
+    # Запись, загрузка и замеры тоже могут завершиться ошибкой (нет места на диске, неподдерживаемая операция),
+    # а модель .h5 к этому моменту уже сохранена
+    tflite_path = f'{os.path.splitext(model_path)[0]}.tflite'
+    try:
+        with open(tflite_path, 'wb') as f:
+            f.write(tflite_model)
+
+        sample = np.asarray(representative_samples[:1], dtype=np.float32)
+        keras_load_ms, keras_model = __measure(lambda: keras.models.load_model(model_path, compile=False))
+        tflite_load_ms, tflite_model = __measure(lambda: TfliteModel(tflite_path))
+
+        report = {
+            'quantization': quantization,
+            'representative_samples': len(representative_samples),
+            'keras': {
+                'file': os.path.basename(model_path),
+                'size_bytes': os.path.getsize(model_path),
+                'load_ms': keras_load_ms,
+                'latency_ms': __measure_latency(lambda: keras_model(sample, training=False))
+            },
+            'tflite': {
+                'file': os.path.basename(tflite_path),
+                'size_bytes': os.path.getsize(tflite_path),
+                'load_ms': tflite_load_ms,
+                'latency_ms': __measure_latency(lambda: tflite_model(sample))
+            }
+        }
+        with open(os.path.join(os.path.dirname(model_path), export_report_file_name), 'w') as f:
+            json.dump(report, f, indent=4)
+    except Exception as e:
+        # Сервер предсказаний предпочитает .tflite: непроверенный файл удаляется, чтобы использовалась модель .h5
+        if os.path.exists(tflite_path):
+            os.remove(tflite_path)
+        return Result(None, f'Error: TFLite export failed: {e}')
+
+    return Result(report, None)
+
+def export_tflite_or_warn(model, model_path, representative_samples, quantization):
+    # Модель .h5 уже сохранена, поэтому ошибка экспорта не прерывает сохранение
+    result = export_tflite(model, model_path, representative_samples, quantization)
+    if not result.isSuccess:
+        logging.warning(f'TFLite export skipped: {result.errors}')
+
+    return result
+
+def __measure(function):
+    start_time = time.perf_counter()
+    value = function()
+    return (time.perf_counter() - start_time) * 1000, value
+
+def __measure_latency(function):
+    # Первый вызов прогревает модель и не учитывается, результат - медиана
+    function()
+    return float(np.median([__measure(function)[0] for _ in range(__latency_runs)]))
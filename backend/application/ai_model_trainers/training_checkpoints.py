@@ -0,0 +1,41 @@
+import json
+import hashlib
+
+from tensorflow import keras
+
+from application import config_paths
+
+# Резервные копии прерванных обучений: Workspaces/checkpoints/<ключ обучения>/
+__checkpoints_workspace_name = 'checkpoints'
+
+def get_training_key(trainer_name, parameters, dataset_fingerprint):
+    """
+    Ключ обучения: совпадает, если то же обучение запущено повторно на тех же данных.
+
+    :param trainer_name: Имя тренера (lnn, cnn)
+    :param parameters: Параметры обучения, влияющие на результат
+    :param dataset_fingerprint: Отпечаток датасета
+    :return: sha256 в шестнадцатеричном виде
+    """
+    payload = json.dumps({
+        'trainer': trainer_name,
+        'parameters': parameters,
+        'dataset_fingerprint': dataset_fingerprint
+    }, sort_keys=True, default=str)
+    return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+def get_split_seed(training_key):
+    # Повторное обучение должно получить те же выборки, что и прерванное
+    return int(training_key[:8], 16)
+
+def create_backup_callback(training_key):
+    """
+    Резервное копирование весов, состояния оптимизатора и номера эпохи после каждой эпохи.
+    Если для ключа уже есть резервная копия, обучение продолжается с сохраненной эпохи.
+    После успешного завершения обучения копия удаляется.
+
+    :param training_key: Ключ обучения
+    :return: keras.callbacks.BackupAndRestore
+    """
+    backup_path = config_paths.get_workspace_path(f'{__checkpoints_workspace_name}/{training_key}')
+    return keras.callbacks.BackupAndRestore(backup_dir=backup_path, save_freq='epoch', delete_checkpoint=True)
@@ -0,0 +1,24 @@
+from matplotlib.figure import Figure
+
+def create_training_plots(history, save_folder):
+    """
+    Построение графиков ошибки и точности по эпохам обучения.
+    Используются отдельные объекты Figure, а не глобальное состояние pyplot, поэтому
+    одновременные обучения не рисуют на чужих графиках, а память освобождается вместе с объектом.
+
+    :param history: История обучения (history.history - словарь метрик по эпохам)
+    :param save_folder: Папка, в которую сохраняются графики
+    """
+    __save_plot(history, 'loss', 'Loss', f'{save_folder}/loss_plot.png')
+    __save_plot(history, 'accuracy', 'Accuracy', f'{save_folder}/accuracy_plot.png')
+
+def __save_plot(history, metric, metric_title, plot_path):
+    figure = Figure(figsize=(8, 6))
+    axes = figure.subplots()
+    axes.plot(history.history[metric], label=f'training {metric}')
+    axes.plot(history.history[f'val_{metric}'], label=f'validation {metric}')
+    axes.set_title(f'{metric_title} Plot')
+    axes.set_xlabel('Epochs')
+    axes.set_ylabel(metric_title)
+    axes.legend()
+    figure.savefig(plot_path, dpi=300)
@@ -0,0 +1,57 @@
+import os
+import glob
+
+from tensorflow import keras
+
+from application import config_paths
+from application.results.Result import Result
+from application.ai_models.ai_models import AI_Model_Type
+from application.ai_model_trainers.get_last_version import get_last_version_model
+
+def resolve_warm_start(user_name, ai_model_type, trained_model_name, warm_start):
+    """
+    Поиск сохраненной версии модели, с весов которой начинается обучение.
+
+    :param user_name: Имя пользователя
+    :param ai_model_type: Тип модели (AI_Model_Type)
+    :param trained_model_name: Имя обучаемой модели. Без него можно указать только конкретную версию
+    :param warm_start: latest - самая новая версия модели с именем trained_model_name, иначе имя версии
+    :return: Result с (именем версии, путем до .h5)
+    """
+    if warm_start == 'latest' and trained_model_name is None:
+        return Result(None, 'Error: Warm start latest requires the trained model name, specify the model version instead')
+    elif warm_start == 'latest':
+        try:
+            _, version = get_last_version_model(user_name, ai_model_type, trained_model_name)
+        except (IndexError, TypeError):
+            return Result(None, f'Error: Model {trained_model_name} has no stored versions')
+    elif os.path.basename(warm_start) != warm_start:
+        return Result(None, f'Error: Invalid model version {warm_start}')
+    else:
+        version = warm_start
+
+    _, ai_model_type_string = AI_Model_Type.convert_to_string_try_get(ai_model_type)
+    weights_paths = glob.glob(os.path.join(config_paths.get_model_path(user_name, ai_model_type_string, version), '*.h5'))
+    if not weights_paths:
+        return Result(None, f'Error: Model version {version} is not exist')
+
+    return Result((version, weights_paths[0]), None)
+
+def load_warm_start_weights(model, weights_path):
+    """
+    Перенос весов сохраненной модели в построенную, если архитектуры совпадают.
+
+    :param model: Построенная модель
+    :param weights_path: Путь до сохраненной модели .h5
+    :return: Ответ с количеством перенесенных массивов весов
+    """
+    stored_weights = keras.models.load_model(weights_path, compile=False).get_weights()
+    model_weights = model.get_weights()
+
+    stored_shapes = [weights.shape for weights in stored_weights]
+    model_shapes = [weights.shape for weights in model_weights]
+    if stored_shapes != model_shapes:
+        return Result(None, f'Error: Architecture of {os.path.basename(weights_path)} does not match: {stored_shapes} != {model_shapes}')
+
+    model.set_weights(stored_weights)
+    return Result(len(stored_weights), None)
@@ -14,4 +14,13 @@ def get_models_folder_path(user_name, ai_model_type):
     return f'{get_root_path()}/{config.get_storage_configuration_models_path()}/{user_name}/{ai_model_type}'
 
 def get_model_path(user_name, ai_model_type, filename):
-    return f'{get_root_path()}/{config.get_storage_configuration_models_path()}/{user_name}/{ai_model_type}/{filename}'
\ No newline at end of file
+    return f'{get_root_path()}/{config.get_storage_configuration_models_path()}/{user_name}/{ai_model_type}/{filename}'
+
+def get_workspace_path(workspace_name):
+    return f'{get_root_path()}/{config.get_storage_configuration_workspaces_path()}/{workspace_name}'
+
+def get_blobs_folder_path():
+    return f'{get_root_path()}/{config.get_storage_configuration_blobs_path()}'
+
+def get_registry_path():
+    return f'{get_root_path()}/{config.get_storage_configuration_registry_path()}'
\ No newline at end of file
@@ -5,15 +5,16 @@ from tkinter import filedialog, messagebox, font
 import numpy as np
 from tensorflow.keras.models import load_model
 from PIL import Image
+from application.services.lnn_samples_reader import read_sample
+from application.ai_model_trainers.class_names import load_class_names
 
 current_file_path = __file__
 
-def resource_path(relative_path):
-    try:
-        base_path = sys._MEIPASS  # путь внутри PyInstaller exe
-    except AttributeError:
-        base_path = os.path.abspath(".")
-    return os.path.join(base_path, relative_path)
+def get_app_dir():
+    # Модель и class_names.json лежат рядом с exe: одна сборка приложения используется для всех моделей
+    if getattr(sys, 'frozen', False):
+        return os.path.dirname(sys.executable)
+    return os.path.abspath(".")
 
 def find_h5_model(directory):
     # ищем любой .h5 файл в директории, возвращаем первый найденный или None
@@ -43,7 +44,7 @@ class AppLnn:
         root.resizable(False, False)
 
         # Получаем директорию, где лежит exe или скрипт
-        script_dir = resource_path(".")
+        script_dir = get_app_dir()
 
         # Ищем .h5 модель в той же директории
         self.model_path = find_h5_model(script_dir)
@@ -98,9 +99,8 @@ class AppLnn:
             self.info_label.config(text=f"Выбран файл:\n{os.path.basename(filename)}")
 
     def read_txt_file(self, filepath):
-        with open(filepath, 'r', encoding='utf-8') as f:
-            numbers = [float(line.strip()) for line in f if line.strip()]
-        return np.array(numbers)
+        # Тот же разбор, что и при обучении модели
+        return read_sample(filepath)
 
     def read_image_file(self, filepath):
         img = Image.open(filepath).convert('L')  # grayscale
@@ -127,8 +127,12 @@ class AppLnn:
                 messagebox.showerror("Ошибка", "Неверный тип файла для текущей настройки")
                 return
 
-            prediction = self.model.predict(input_data)
-            pred_class = int(np.round(prediction)[0][0])
+            prediction = self.model(input_data, training=False).numpy()
+            # Бинарная классификация - один выход sigmoid, иначе - softmax по классам
+            if prediction.shape[-1] == 1:
+                pred_class = int(np.round(prediction)[0][0])
+            else:
+                pred_class = int(np.argmax(prediction[0]))
             if 0 <= pred_class < len(self.class_names):
                 class_name = self.class_names[pred_class]
             else:
@@ -138,7 +142,7 @@ class AppLnn:
             messagebox.showerror("Ошибка", f"Ошибка при распознавании:\n{e}")
 
 if __name__ == "__main__":
-    class_names = []  # заполняйте по необходимости
+    class_names = load_class_names(get_app_dir()) or []
     file_extension = '.txt'
     data_type = 'text'
     root = tk.Tk()
@@ -1,57 +1,153 @@
 import os
+import ast
 import sys
+import shutil
+import hashlib
+import logging
+import platform
 import tempfile
 import subprocess
+from importlib import metadata
 
-def build_exe_with_class_names(class_names, base_script_path, model_path, exe_name, dist_path):
+from application import config_paths
+from application.results.Result import Result
+
+# Собранные приложения-классификаторы: Workspaces/app_launchers/<имя>-<платформа>-<хэш исходников>/.
+# Приложение не содержит ни модели, ни классов: они читаются из файлов рядом с исполняемым файлом,
+# поэтому одна сборка подходит для всех моделей и пересобирается только при изменении исходников
+__launchers_workspace_name = 'app_launchers'
+
+def build_app_with_model(base_script_path, model_folder_path, exe_name):
+    """
+    Создание приложения для обученной модели: копирование закэшированной сборки в папку модели
+    и добавление рядом с исполняемым файлом модели .h5 и class_names.json.
+
+    :param base_script_path: Путь к скрипту приложения
+    :param model_folder_path: Папка сохраненной модели с .h5 и class_names.json
+    :param exe_name: Имя исполняемого файла
+    :return: Result с путем до папки приложения
     """
-    Создает .exe с заданным class_names, генерируя временный скрипт и вызывая PyInstaller.
+    launcher_result = get_or_build_launcher(base_script_path, exe_name)
+    if not launcher_result.isSuccess:
+        logging.warning(f'App was not created: {launcher_result.errors}')
+        return launcher_result
+
+    app_folder_path = os.path.join(model_folder_path, os.path.splitext(exe_name)[0])
+    if os.path.exists(app_folder_path):
+        shutil.rmtree(app_folder_path)
+
+    # Файлы сборки не изменяются, поэтому вместо копирования создаются жесткие ссылки, если это возможно
+    shutil.copytree(launcher_result.result, app_folder_path, copy_function=__link_or_copy)
+
+    for file_name in os.listdir(model_folder_path):
+        if file_name.endswith('.h5') or file_name == 'class_names.json':
+            __link_or_copy(os.path.join(model_folder_path, file_name), os.path.join(app_folder_path, file_name))
+
+    return Result(app_folder_path, None)
 
-    :param class_names: список классов для вставки в скрипт
-    :param base_script_path: путь к исходному скрипту (для копирования остального кода)
-    :param model_path: путь к model.h5
-    :param exe_name: имя итогового .exe
-    :param dist_path: папка для результата
+def get_or_build_launcher(base_script_path, exe_name):
+    """
+    Поиск сборки приложения по хэшу исходников, либо сборка PyInstaller'ом, если её нет.
+
+    :param base_script_path: Путь к скрипту приложения
+    :param exe_name: Имя исполняемого файла
+    :return: Result с путем до папки сборки (исполняемый файл и _internal)
     """
     if not os.path.exists(base_script_path):
-        print(f"Базовый скрипт не найден: {base_script_path}")
-        return
-    if not os.path.exists(model_path):
-        print(f"Модель не найдена: {model_path}")
-        return
-
-    # Считаем исходный скрипт
-    with open(base_script_path, encoding='utf-8') as f:
-        code = f.read()
-
-    # Заменим строку с class_names = [...] на нужный список
-    import re
-    class_names_str = repr(class_names)
-    code_new = re.sub(r"class_names\s*=\s*\[.*?\]", f"class_names = {class_names_str}", code, flags=re.DOTALL)
-
-    # Создадим временный файл
-    with tempfile.TemporaryDirectory() as tmpdir:
-        temp_script = os.path.join(tmpdir, "temp_app.py")
-        with open(temp_script, 'w', encoding='utf-8') as f:
-            f.write(code_new)
-
-        # Формируем параметр --add-data для PyInstaller (Windows)
-        add_data = f"{model_path}:."
-
-        # Запускаем PyInstaller
+        return Result(None, f'Error: Base script not found: {base_script_path}')
+
+    app_name = os.path.splitext(exe_name)[0]
+    launcher_key = get_launcher_key(base_script_path, app_name)
+    launcher_path = config_paths.get_workspace_path(f'{__launchers_workspace_name}/{launcher_key}')
+    if os.path.isdir(launcher_path):
+        return Result(launcher_path, None)
+
+    os.makedirs(os.path.dirname(launcher_path), exist_ok=True)
+
+    # Сборка выполняется во временной папке и переносится одним переименованием: одновременные сборки не пересекаются,
+    # а прерванная сборка не оставляет неполный кэш
+    with tempfile.TemporaryDirectory(dir=os.path.dirname(launcher_path)) as tmpdir:
         cmd = [
             sys.executable, "-m", "PyInstaller",
-            f"--name={os.path.splitext(exe_name)[0]}",
-            f"--add-data={add_data}",
-            "--distpath", dist_path,
-            temp_script
+            f"--name={app_name}",
+            f"--paths={config_paths.get_root_path()}",
+            "--noconfirm",
+            "--distpath", os.path.join(tmpdir, "dist"),
+            "--workpath", os.path.join(tmpdir, "build"),
+            "--specpath", tmpdir,
+            base_script_path
         ]
 
-        print("Запускаем сборку .exe...")
+        logging.info(f'Building app launcher {launcher_key}')
         result = subprocess.run(cmd, capture_output=True, text=True)
-        if result.returncode == 0:
-            print(f"Сборка завершена успешно. Файл: {os.path.join(dist_path, exe_name)}")
-        else:
-            print("Ошибка при сборке:")
-            print(result.stdout)
-            print(result.stderr)
+        if result.returncode != 0:
+            return Result(None, f'Error: PyInstaller failed: {result.stderr[-2000:]}')
+
+        try:
+            os.rename(os.path.join(tmpdir, "dist", app_name), launcher_path)
+        except OSError:
+            # Ту же сборку уже перенесла другая задача
+            if not os.path.isdir(launcher_path):
+                raise
+
+    return Result(launcher_path, None)
+
+def get_launcher_key(base_script_path, app_name):
+    """
+    Ключ сборки: имя приложения, платформа, версии Python и PyInstaller, содержимое скрипта
+    и всех импортируемых им модулей application.
+
+    :return: <имя>-<платформа>-<sha256 исходников (16 символов)>
+    """
+    digest = hashlib.sha256()
+    digest.update(f'{app_name}|{sys.platform}|{platform.machine()}|{sys.version}|{__get_pyinstaller_version()}'.encode('utf-8'))
+
+    for source_path in __get_source_files(base_script_path):
+        digest.update(os.path.relpath(source_path, config_paths.get_root_path()).replace(os.sep, '/').encode('utf-8'))
+        with open(source_path, 'rb') as f:
+            digest.update(f.read())
+
+    return f'{app_name}-{sys.platform}-{digest.hexdigest()[:16]}'
+
+def __get_source_files(script_path):
+    # Скрипт и рекурсивно все модули проекта, которые он импортирует
+    root_path = config_paths.get_root_path()
+    source_files = set()
+    pending = [os.path.abspath(script_path)]
+
+    while pending:
+        source_path = pending.pop()
+        if source_path in source_files:
+            continue
+        source_files.add(source_path)
+
+        with open(source_path, encoding='utf-8') as f:
+            tree = ast.parse(f.read(), filename=source_path)
+
+        for node in ast.walk(tree):
+            if isinstance(node, ast.Import):
+                module_names = [alias.name for alias in node.names]
+            elif isinstance(node, ast.ImportFrom) and node.module and node.level == 0:
+                module_names = [node.module, *[f'{node.module}.{alias.name}' for alias in node.names]]
+            else:
+                continue
+
+            for module_name in module_names:
+                module_path = os.path.join(root_path, *module_name.split('.')) + '.py'
+                if os.path.isfile(module_path):
+                    pending.append(os.path.abspath(module_path))
+
+    return sorted(source_files)
+
+def __get_pyinstaller_version():
+    try:
+        return metadata.version('pyinstaller')
+    except metadata.PackageNotFoundError:
+        return 'unknown'
+
+def __link_or_copy(source_path, destination_path):
+    try:
+        os.link(source_path, destination_path)
+    except OSError:
+        shutil.copy2(source_path, destination_path)
+    return destination_path
@@ -0,0 +1,27 @@
+import numpy as np
+
+from application.inference.MicroBatcher import MicroBatcher
+
+class LoadedModel:
+    # Загруженная модель (Keras или TfliteModel) с именами классов. Вызов модели напрямую, без model.predict,
+    # не создает конвейер tf.data и занимает миллисекунды для небольших батчей
+    def __init__(self, name, model_format, model, class_names, max_batch_size, max_batch_wait_ms):
+        self.name = name
+        self.format = model_format
+        self.model = model
+        self.class_names = class_names
+        self.input_shape = tuple(model.input_shape[1:])
+        self.batcher = MicroBatcher(self.predict, max_batch_size, max_batch_wait_ms, name)
+
+    def predict(self, inputs):
+        return np.asarray(self.model(np.asarray(inputs, dtype=np.float32), training=False))
+
+    def predict_batched(self, inputs):
+        # Одновременные запросы к модели объединяются в один проход сети
+        return self.batcher.predict(np.asarray(inputs, dtype=np.float32))
+
+    def close(self):
+        self.batcher.close()
+
+    def get_metrics(self):
+        return {'model': self.name, 'format': self.format, **self.batcher.get_metrics()}
@@ -0,0 +1,126 @@
+import time
+import queue
+import threading
+from concurrent.futures import Future
+
+import numpy as np
+
+class MicroBatcher:
+    # Объединение одновременных запросов к одной модели в один батч. Запросы ставятся в очередь, поток-обработчик
+    # собирает их, пока батч не заполнится или не истечет время ожидания первого запроса, и выполняет один проход сети
+
+    # Признак закрытия в очереди: поток-обработчик завершается, выполнив поставленные ранее запросы
+    __close_request = object()
+
+    def __init__(self, predict_function, max_batch_size, max_wait_ms, name='model'):
+        self.predict_function = predict_function
+        self.max_batch_size = max_batch_size
+        self.max_wait_seconds = max_wait_ms / 1000
+        self.requests = queue.Queue()
+        self.lock = threading.Lock()
+        self.closed = False
+
+        self.requests_count = 0
+        self.batches_count = 0
+        self.samples_count = 0
+        self.max_batch_samples = 0
+        self.queue_wait_seconds = 0.0
+        self.max_queue_wait_seconds = 0.0
+
+        self.worker = threading.Thread(target=self.__run, name=f'micro-batcher-{name}', daemon=True)
+        self.worker.start()
+
+    def predict(self, inputs):
+        """
+        Предсказание в составе общего батча. Блокирует вызывающий поток до получения результата.
+
+        :param inputs: Массив входов (первое измерение - примеры)
+        :return: Выходы модели для этих примеров
+        """
+        future = Future()
+        with self.lock:
+            # Модель вытеснена из кэша, а запрос уже получил на нее ссылку
+            if self.closed:
+                return self.predict_function(inputs)
+
+            self.requests.put((inputs, future, time.perf_counter()))
+
+        return future.result()
+
+    def close(self):
+        with self.lock:
+            self.closed = True
+            self.requests.put(self.__close_request)
+
+    def get_metrics(self):
+        with self.lock:
+            return {
+                'requests': self.requests_count,
+                'batches': self.batches_count,
+                'samples': self.samples_count,
+                'average_batch_size': self.samples_count / self.batches_count if self.batches_count else 0.0,
+                'max_batch_size': self.max_batch_samples,
+                'average_queue_wait_ms': self.queue_wait_seconds * 1000 / self.requests_count if self.requests_count else 0.0,
+                'max_queue_wait_ms': self.max_queue_wait_seconds * 1000,
+                'queue_size': self.requests.qsize()
+            }
+
+    def __run(self):
+        pending = None
+        while True:
+            first = pending if pending is not None else self.requests.get()
+            pending = None
+            if first is self.__close_request:
+                return
+
+            batch, pending = self.__collect_batch(first)
+            self.__run_batch(batch)
+
+    def __collect_batch(self, first):
+        batch = [first]
+        batch_size = len(first[0])
+        deadline = first[2] + self.max_wait_seconds
+
+        while batch_size < self.max_batch_size:
+            # После истечения времени ожидания забираем только то, что уже стоит в очереди
+            timeout = deadline - time.perf_counter()
+            try:
+                item = self.requests.get(timeout=timeout) if timeout > 0 else self.requests.get_nowait()
+            except queue.Empty:
+                break
+
+            # Закрытие или запрос, не помещающийся в батч, обрабатываются следующей итерацией
+            if item is self.__close_request or batch_size + len(item[0]) > self.max_batch_size:
+                return batch, item
+
+            batch.append(item)
+            batch_size += len(item[0])
+
+        return batch, None
+
+    def __run_batch(self, batch):
+        start_time = time.perf_counter()
+        inputs = np.concatenate([item[0] for item in batch]) if len(batch) > 1 else batch[0][0]
+
+        try:
+            outputs = self.predict_function(inputs)
+        except Exception as e:
+            for _, future, _ in batch:
+                future.set_exception(e)
+            outputs = None
+
+        if outputs is not None:
+            offset = 0
+            for item_inputs, future, _ in batch:
+                future.set_result(outputs[offset:offset + len(item_inputs)])
+                offset += len(item_inputs)
+
+        with self.lock:
+            self.batches_count += 1
+            self.samples_count += len(inputs)
+            self.max_batch_samples = max(self.max_batch_samples, len(inputs))
+            for _, _, enqueue_time in batch:
+                queue_wait = start_time - enqueue_time
+                self.requests_count += 1
+                self.queue_wait_seconds += queue_wait
+                self.max_queue_wait_seconds = max(self.max_queue_wait_seconds, queue_wait)
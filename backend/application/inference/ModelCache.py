@@ -0,0 +1,71 @@
+import threading
+from collections import OrderedDict
+
+class ModelCache:
+    # LRU кэш загруженных моделей с ограничением по занимаемой памяти. Модель загружается только при первом
+    # обращении; при превышении лимита вытесняются давно не использованные модели (последняя остается всегда)
+    def __init__(self, max_bytes, on_evict=None):
+        self.max_bytes = max_bytes
+        self.on_evict = on_evict
+        self.entries = OrderedDict()
+        self.total_bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.lock = threading.Lock()
+        self.loading_locks = {}
+
+    def get(self, key, loader):
+        """
+        Получение модели из кэша, либо загрузка.
+
+        :param key: Ключ модели (путь и время изменения файла)
+        :param loader: Функция загрузки, возвращающая (модель, размер в байтах)
+        :return: Модель
+        """
+        with self.lock:
+            if key in self.entries:
+                self.entries.move_to_end(key)
+                self.hits += 1
+                return self.entries[key][0]
+
+            # Одновременные запросы к одной модели загружают её один раз
+            key_lock = self.loading_locks.setdefault(key, threading.Lock())
+
+        with key_lock:
+            with self.lock:
+                if key in self.entries:
+                    self.entries.move_to_end(key)
+                    self.hits += 1
+                    return self.entries[key][0]
+
+            value, size = loader()
+
+            with self.lock:
+                self.misses += 1
+                self.entries[key] = (value, size)
+                self.total_bytes += size
+                self.loading_locks.pop(key, None)
+                self.__evict()
+
+        return value
+
+    def get_values(self):
+        with self.lock:
+            return [value for value, _ in self.entries.values()]
+
+    def get_stats(self):
+        with self.lock:
+            return {
+                'models': len(self.entries),
+                'bytes': self.total_bytes,
+                'max_bytes': self.max_bytes,
+                'hits': self.hits,
+                'misses': self.misses
+            }
+
+    def __evict(self):
+        while self.total_bytes > self.max_bytes and len(self.entries) > 1:
+            _, (value, size) = self.entries.popitem(last=False)
+            self.total_bytes -= size
+            if self.on_evict is not None:
+                self.on_evict(value)
@@ -0,0 +1,32 @@
+import threading
+
+import numpy as np
+import tensorflow as tf
+
+try:
+    from ai_edge_litert.interpreter import Interpreter
+except ImportError:
+    Interpreter = tf.lite.Interpreter
+
+class TfliteModel:
+    # Модель TFLite с тем же интерфейсом вызова, что и у модели Keras. Интерпретатор не потокобезопасен
+    # и перевыделяет тензоры при смене размера батча, поэтому вызовы выполняются под блокировкой
+    def __init__(self, model_path):
+        self.interpreter = Interpreter(model_path=model_path)
+        self.interpreter.allocate_tensors()
+        self.input_details = self.interpreter.get_input_details()[0]
+        self.output_details = self.interpreter.get_output_details()[0]
+        self.input_shape = (None, *self.input_details['shape'][1:].tolist())
+        self.output_shape = (None, *self.output_details['shape'][1:].tolist())
+        self.lock = threading.Lock()
+
+    def __call__(self, inputs, training=False):
+        inputs = np.asarray(inputs, dtype=self.input_details['dtype'])
+        with self.lock:
+            if tuple(self.interpreter.get_input_details()[0]['shape']) != inputs.shape:
+                self.interpreter.resize_tensor_input(self.input_details['index'], inputs.shape)
+                self.interpreter.allocate_tensors()
+
+            self.interpreter.set_tensor(self.input_details['index'], inputs)
+            self.interpreter.invoke()
+            return self.interpreter.get_tensor(self.output_details['index']).copy()
@@ -0,0 +1,156 @@
+import io
+import os
+import csv
+import json
+import shutil
+import zipfile
+import tempfile
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+import configurations.config as config
+from application.results.Result import Result
+from application.ai_models.ai_models import AI_Model_Type
+from application.inference.inference_service import get_class_names, to_predictions
+from application.services.lnn_samples_reader import parse_sample
+from application.ai_model_trainers.cnn.cnn_input_pipeline import decode_image
+
+FORMAT_NDJSON = 'ndjson'
+FORMAT_CSV = 'csv'
+
+__lnn_extensions = ('.txt',)
+__cnn_extensions = ('.jpg', '.jpeg', '.png')
+
+def get_extensions(ai_model_type):
+    return __cnn_extensions if int(ai_model_type) == AI_Model_Type.CNN else __lnn_extensions
+
+def iter_folder_files(folder_path, extensions):
+    """
+    Обход файлов распакованного датасета в постоянном порядке.
+
+    :param folder_path: Путь до датасета
+    :param extensions: Расширения файлов примеров
+    :return: Генератор пар (относительный путь, содержимое)
+    """
+    for dir_name, dir_names, file_names in os.walk(folder_path):
+        dir_names.sort()
+        for file_name in sorted(file_names):
+            if file_name.lower().endswith(extensions):
+                file_path = os.path.join(dir_name, file_name)
+                yield os.path.relpath(file_path, folder_path).replace(os.sep, '/'), __read_file(file_path)
+
+def open_uploaded_zip(file):
+    """
+    Копирование загруженного архива во временный файл: загрузка запроса закрывается до окончания потокового ответа.
+
+    :param file: Загруженный файл (FileStorage)
+    :return: Result с (временный файл, zipfile.ZipFile)
+    """
+    archive_file = tempfile.TemporaryFile()
+    shutil.copyfileobj(file.stream, archive_file)
+    archive_file.seek(0)
+
+    try:
+        return Result((archive_file, zipfile.ZipFile(archive_file)), None)
+    except zipfile.BadZipFile:
+        archive_file.close()
+        return Result(None, 'Error: Invalid file type. Only ZIP archives are allowed')
+
+def iter_zip_files(archive_file, archive, extensions):
+    """
+    Обход файлов архива без распаковки на диск. После обхода архив и временный файл закрываются.
+
+    :param archive_file: Временный файл архива
+    :param archive: Открытый zipfile.ZipFile
+    :param extensions: Расширения файлов примеров
+    :return: Генератор пар (путь в архиве, содержимое)
+    """
+    with archive_file, archive:
+        for member in archive.infolist():
+            if not member.is_dir() and member.filename.lower().endswith(extensions):
+                yield member.filename, archive.read(member)
+
+def stream_predictions(loaded_model, ai_model_type, files, output_format=FORMAT_NDJSON, chunk_size=256):
+    """
+    Предсказание для множества файлов порциями по chunk_size: в памяти одновременно находится только одна порция,
+    результаты отдаются сразу после её обработки. Ошибки отдельных файлов попадают в строки результата.
+
+    :param loaded_model: LoadedModel
+    :param ai_model_type: Тип модели (AI_Model_Type)
+    :param files: Генератор пар (имя, содержимое)
+    :param output_format: ndjson или csv
+    :param chunk_size: Количество примеров в одном проходе сети
+    :return: Генератор строк ответа
+    """
+    class_names = get_class_names(loaded_model)
+    if output_format == FORMAT_CSV:
+        yield __to_csv([['file', 'class', 'class_index', *class_names, 'error']])
+
+    if int(ai_model_type) == AI_Model_Type.CNN:
+        preprocess = lambda content: __preprocess_image(loaded_model, content)
+    else:
+        preprocess = lambda content: __preprocess_sample(loaded_model, content)
+
+    # Разбор и декодирование файлов порции выполняются параллельно
+    with ThreadPoolExecutor(max_workers=config.get_threads_configuration_io_threads()) as executor:
+        for chunk in __iter_chunks(files, chunk_size):
+            samples = list(executor.map(lambda file: __try_preprocess(preprocess, file[1]), chunk))
+
+            valid_rows = [row for row, (inputs, _) in enumerate(samples) if inputs is not None]
+            predictions = []
+            if valid_rows:
+                predictions = to_predictions(loaded_model, loaded_model.predict(np.stack([samples[row][0] for row in valid_rows])))
+            predictions_by_row = dict(zip(valid_rows, predictions))
+
+            rows = []
+            for row, (name, _) in enumerate(chunk):
+                prediction = predictions_by_row.get(row)
+                rows.append({'file': name, **prediction} if prediction is not None else {'file': name, 'error': samples[row][1]})
+
+            if output_format == FORMAT_CSV:
+                yield __to_csv([__to_csv_row(row, class_names) for row in rows])
+            else:
+                yield ''.join(json.dumps(row, ensure_ascii=False) + '\n' for row in rows)
+
+def __iter_chunks(files, chunk_size):
+    chunk = []
+    for file in files:
+        chunk.append(file)
+        if len(chunk) == chunk_size:
+            yield chunk
+            chunk = []
+
+    if chunk:
+        yield chunk
+
+def __try_preprocess(preprocess, content):
+    try:
+        return preprocess(content), None
+    except Exception as e:
+        return None, str(e)
+
+def __preprocess_sample(loaded_model, content):
+    sample = parse_sample(content.decode('utf-8'))
+    if sample.shape != loaded_model.input_shape:
+        raise ValueError(f'expected {loaded_model.input_shape[0]} values, got {len(sample)}')
+
+    return sample
+
+def __preprocess_image(loaded_model, content):
+    return decode_image(content, loaded_model.input_shape[0], loaded_model.input_shape[1]).numpy()
+
+def __to_csv_row(row, class_names):
+    if 'error' in row:
+        return [row['file'], '', '', *([''] * len(class_names)), row['error']]
+
+    return [row['file'], row['class'], row['class_index'], *[row['probabilities'][name] for name in class_names], '']
+
+def __to_csv(rows):
+    output = io.StringIO()
+    csv.writer(output, lineterminator='\n').writerows(rows)
+    return output.getvalue()
+
+def __read_file(file_path):
+    with open(file_path, 'rb') as f:
+        return f.read()
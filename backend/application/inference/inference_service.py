@@ -0,0 +1,148 @@
+import os
+import glob
+
+import numpy as np
+from tensorflow import keras
+
+from application import config_paths
+import configurations.config as config
+from application.results.Result import Result
+from application.ai_models.ai_models import AI_Model_Type
+from application.inference.ModelCache import ModelCache
+from application.inference.LoadedModel import LoadedModel
+from application.inference.TfliteModel import TfliteModel
+from application.ai_model_trainers.class_names import load_class_names
+from application.ai_model_trainers.cnn.cnn_input_pipeline import decode_image
+from application.ai_model_trainers.tensorflow_threads import configure_tensorflow_threads
+
+# Модели загружаются один раз на процесс сервера и переиспользуются между запросами
+__model_cache = ModelCache(
+    config.get_inference_configuration_model_cache_max_megabytes() * 1024 * 1024,
+    on_evict=lambda loaded_model: loaded_model.close())
+configure_tensorflow_threads()
+
+def get_model(user_name, ai_model_type, model_name):
+    """
+    Получение сохраненной модели из кэша. Если рядом с .h5 экспортирована модель TFLite, используется она:
+    загружается и выполняется быстрее. Перезаписанная модель загружается заново, так как
+    время изменения файла входит в ключ кэша.
+
+    :param user_name: Имя пользователя
+    :param ai_model_type: Тип модели (AI_Model_Type)
+    :param model_name: Имя сохраненной модели (папки с версией)
+    :return: Result с LoadedModel
+    """
+    if os.path.basename(model_name) != model_name:
+        return Result(None, f'Error: Invalid model name {model_name}')
+
+    _, ai_model_type_string = AI_Model_Type.convert_to_string_try_get(ai_model_type)
+    model_folder_path = config_paths.get_model_path(user_name, ai_model_type_string, model_name)
+    model_paths = glob.glob(os.path.join(model_folder_path, '*.tflite')) or glob.glob(os.path.join(model_folder_path, '*.h5'))
+    if not model_paths:
+        return Result(None, f'Error: Model {model_name} is not exist')
+
+    model_path = model_paths[0]
+
+    def load():
+        if model_path.endswith('.tflite'):
+            model, model_format = TfliteModel(model_path), 'tflite'
+            size_bytes = os.path.getsize(model_path)
+        else:
+            model, model_format = keras.models.load_model(model_path, compile=False), 'keras'
+            size_bytes = int(sum(np.prod(weight.shape) * np.dtype(weight.dtype).itemsize for weight in model.weights))
+
+        loaded_model = LoadedModel(
+            model_name,
+            model_format,
+            model,
+            load_class_names(model_folder_path),
+            config.get_inference_configuration_max_batch_size(),
+            config.get_inference_configuration_max_batch_wait_milliseconds())
+        return loaded_model, size_bytes
+
+    try:
+        loaded_model = __model_cache.get((model_path, os.path.getmtime(model_path)), load)
+    except (OSError, ValueError, RuntimeError) as e:
+        return Result(None, f'Error: Failed to load model {model_name}: {e}')
+
+    return Result(loaded_model, None)
+
+def predict_samples(loaded_model, samples):
+    """
+    Предсказание LNN модели.
+
+    :param loaded_model: LoadedModel
+    :param samples: Векторы признаков
+    :return: Result со списком предсказаний
+    """
+    try:
+        inputs = np.asarray(samples, dtype=np.float32)
+    except ValueError:
+        return Result(None, 'Error: Samples must be lists of numbers of the same length')
+
+    if inputs.ndim != 2 or inputs.shape[0] == 0 or inputs.shape[1:] != loaded_model.input_shape:
+        return Result(None, f'Error: Expected samples with {loaded_model.input_shape[0]} values, got shape {list(inputs.shape)}')
+
+    return Result(to_predictions(loaded_model, loaded_model.predict_batched(inputs)), None)
+
+def predict_images(loaded_model, images):
+    """
+    Предсказание CNN модели. Изображения приводятся к размеру входа модели так же, как при обучении.
+
+    :param loaded_model: LoadedModel
+    :param images: Содержимое файлов изображений (bytes)
+    :return: Result со списком предсказаний
+    """
+    if not images:
+        return Result(None, 'Error: No images provided')
+
+    height, width = loaded_model.input_shape[0], loaded_model.input_shape[1]
+    try:
+        inputs = np.stack([decode_image(image, height, width).numpy() for image in images])
+    except Exception as e:
+        return Result(None, f'Error: Failed to decode image: {e}')
+
+    return Result(to_predictions(loaded_model, loaded_model.predict_batched(inputs)), None)
+
+def get_metrics():
+    # Метрики кэша и микро-батчинга по загруженным моделям
+    return {
+        'cache': __model_cache.get_stats(),
+        'models': [loaded_model.get_metrics() for loaded_model in __model_cache.get_values()]
+    }
+
+def get_class_names(loaded_model):
+    # Бинарная классификация - один выход sigmoid, иначе - softmax по классам
+    classes_count = max(loaded_model.model.output_shape[-1], 2)
+
+    class_names = loaded_model.class_names
+    if class_names is None or len(class_names) != classes_count:
+        return [str(index) for index in range(classes_count)]
+
+    return class_names
+
+def to_predictions(loaded_model, outputs):
+    """
+    Преобразование выходов модели в классы с вероятностями.
+
+    :param loaded_model: LoadedModel
+    :param outputs: Выходы модели
+    :return: Список предсказаний
+    """
+    class_names = get_class_names(loaded_model)
+
+    predictions = []
+    for output in outputs:
+        if output.shape[-1] == 1:
+            probabilities = [1.0 - float(output[0]), float(output[0])]
+        else:
+            probabilities = [float(probability) for probability in output]
+
+        class_index = int(np.argmax(probabilities))
+        predictions.append({
+            'class': class_names[class_index],
+            'class_index': class_index,
+            'probabilities': dict(zip(class_names, probabilities))
+        })
+
+    return predictions
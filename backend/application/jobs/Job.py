@@ -0,0 +1,38 @@
+import uuid
+from enum import Enum
+from datetime import datetime
+
+class Job_Status(Enum):
+    Queued = 'queued'
+    Running = 'running'
+    Succeeded = 'succeeded'
+    Failed = 'failed'
+
+class Job:
+    def __init__(self, job_type):
+        self.id = uuid.uuid4().hex
+        self.job_type = job_type
+        self.status = Job_Status.Queued
+        self.progress = 0.0
+        self.message = ''
+        self.created_at = datetime.now()
+        self.finished_at = None
+
+        # Путь к zip-архиву обученной модели, либо текст ошибки
+        self.artifact_path = None
+        self.errors = None
+
+    def is_finished(self):
+        return self.status in (Job_Status.Succeeded, Job_Status.Failed)
+
+    def to_dict(self):
+        return {
+            'job_id': self.id,
+            'job_type': self.job_type,
+            'status': self.status.value,
+            'progress': round(self.progress, 4),
+            'message': self.message,
+            'created_at': self.created_at.strftime('%Y-%m-%d %H:%M:%S'),
+            'finished_at': self.finished_at.strftime('%Y-%m-%d %H:%M:%S') if self.finished_at else None,
+            'errors': self.errors
+        }
@@ -0,0 +1,43 @@
+from tensorflow import keras
+
+from application.jobs.Job import Job_Status
+
+# Задача, которую выполняет текущий процесс-обработчик, и общее хранилище прогресса
+__job_id = None
+__progress_store = None
+
+def bind(job_id, progress_store):
+    """
+    Привязка текущего процесса к задаче. Вызывается в процессе-обработчике перед запуском обучения.
+
+    :param job_id: Идентификатор задачи
+    :param progress_store: Общий (между процессами) словарь прогресса задач
+    """
+    global __job_id, __progress_store
+    __job_id = job_id
+    __progress_store = progress_store
+
+def report(progress, message=''):
+    """
+    Сообщение о прогрессе текущей задачи. Вне фоновой задачи ничего не делает.
+
+    :param progress: Доля выполненной работы от 0 до 1
+    :param message: Описание текущего шага
+    """
+    if __progress_store is None:
+        return
+
+    __progress_store[__job_id] = {
+        'status': Job_Status.Running.value,
+        'progress': min(max(float(progress), 0.0), 1.0),
+        'message': message
+    }
+
+class JobProgressCallback(keras.callbacks.Callback):
+    # Передает прогресс по эпохам обучения в состояние фоновой задачи
+    def __init__(self, epochs):
+        super().__init__()
+        self.epochs = epochs
+
+    def on_epoch_end(self, epoch, logs=None):
+        report((epoch + 1) / self.epochs, f'Epoch {epoch + 1}/{self.epochs}')
@@ -0,0 +1,136 @@
+import os
+import logging
+import threading
+import multiprocessing
+from datetime import datetime, timedelta
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+import configurations.config as config
+from application.jobs import job_progress, job_workspace
+from application.ai_model_trainers.tensorflow_threads import configure_tensorflow_threads
+from application.jobs.Job import Job, Job_Status
+from application.results.Result import Result
+
+# Все задачи живут в памяти процесса веб-сервера и не переживают его перезапуск: после перезапуска
+# задача не найдена, а обученная модель остается в хранилище моделей пользователя.
+# Завершенные задачи забываются через FinishedJobsTtlMinutes минут, а сверх MaxFinishedJobs - начиная с самых старых
+__lock = threading.Lock()
+__jobs = {}
+__executor = None
+__progress_store = None
+
+def submit_job(job_type, task, **task_kwargs):
+    """
+    Постановка задачи обучения в очередь фоновых процессов.
+
+    :param job_type: Тип задачи (для отображения пользователю)
+    :param task: Функция верхнего уровня модуля, возвращающая Result с путем до zip-архива
+    :param task_kwargs: Аргументы функции task
+    :return: Созданная задача
+    """
+    job = Job(job_type)
+
+    with __lock:
+        __evict_finished_jobs()
+        __jobs[job.id] = job
+        executor = __get_executor()
+        future = executor.submit(run_job, job.id, __progress_store, task, task_kwargs)
+
+    future.add_done_callback(lambda done_future: __on_job_done(job.id, done_future))
+    return job
+
+def get_job(job_id):
+    with __lock:
+        job = __jobs.get(job_id)
+        if job is None:
+            return Result(None, f'Error: Job {job_id} is not exist')
+
+        # Подтягиваем прогресс, который сообщил процесс-обработчик
+        if not job.is_finished():
+            state = __progress_store.get(job_id)
+            if state is not None:
+                job.status = Job_Status(state['status'])
+                job.progress = state['progress']
+                job.message = state['message']
+
+        return Result(job, None)
+
+def run_job(job_id, progress_store, task, task_kwargs):
+    # Выполняется в процессе-обработчике
+    job_progress.bind(job_id, progress_store)
+    job_progress.report(0)
+
+    # Журнал задачи пишется в её рабочую папку. После успешного обучения папка удаляется,
+    # после ошибки - остается для разбора вместе с чекпоинтами
+    workspace_path = job_workspace.create(job_id)
+    log_handler = logging.FileHandler(os.path.join(workspace_path, 'job.log'), encoding='utf-8')
+    log_handler.setFormatter(logging.Formatter('%(asctime)s %(levelname)-8s %(message)s'))
+    logging.getLogger().addHandler(log_handler)
+
+    try:
+        result = task(**task_kwargs)
+    finally:
+        logging.getLogger().removeHandler(log_handler)
+        log_handler.close()
+
+    if result.isSuccess:
+        job_workspace.remove()
+
+    return result
+
+def __on_job_done(job_id, future):
+    global __executor
+
+    with __lock:
+        job = __jobs[job_id]
+        job.finished_at = datetime.now()
+        __progress_store.pop(job_id, None)
+
+        exception = future.exception()
+        if exception is not None:
+            # Процесс-обработчик упал (например, из-за нехватки памяти) - следующая задача получит новый пул
+            if isinstance(exception, BrokenProcessPool):
+                __executor = None
+
+            job.status = Job_Status.Failed
+            job.errors = f'{exception}'
+            return
+
+        result = future.result()
+        if not result.isSuccess:
+            job.status = Job_Status.Failed
+            job.errors = f'{result.errors}'
+            return
+
+        job.status = Job_Status.Succeeded
+        job.progress = 1.0
+        job.artifact_path = result.result
+
+def __evict_finished_jobs():
+    # Вызывается под __lock. Незавершенные задачи не удаляются
+    finished_jobs = sorted((job for job in __jobs.values() if job.is_finished()), key=lambda job: job.finished_at)
+
+    expired_before = datetime.now() - timedelta(minutes=config.get_jobs_configuration_finished_jobs_ttl_minutes())
+    excess_count = len(finished_jobs) - config.get_jobs_configuration_max_finished_jobs()
+    for index, job in enumerate(finished_jobs):
+        if index < excess_count or job.finished_at < expired_before:
+            del __jobs[job.id]
+
+def __get_executor():
+    global __executor, __progress_store
+
+    # TensorFlow не переносит fork, поэтому процессы-обработчики запускаются через spawn.
+    # Каждый процесс выполняет одну задачу, чтобы память TensorFlow освобождалась после обучения
+    context = multiprocessing.get_context('spawn')
+    if __progress_store is None:
+        __progress_store = context.Manager().dict()
+
+    if __executor is None:
+        __executor = ProcessPoolExecutor(
+            max_workers=config.get_jobs_configuration_max_workers(),
+            mp_context=context,
+            initializer=configure_tensorflow_threads,
+            max_tasks_per_child=1)
+
+    return __executor
@@ -0,0 +1,36 @@
+import os
+import uuid
+import shutil
+
+from application import config_paths
+
+# Рабочая папка задачи, которую выполняет текущий процесс: чекпоинты, временные конфигурации, кэш и журнал.
+# Одновременные обучения не пересекаются по файлам
+__workspace_path = None
+
+def create(workspace_name):
+    """
+    Создание рабочей папки и привязка к ней текущего процесса. Вызывается в процессе-обработчике перед запуском обучения.
+
+    :param workspace_name: Имя папки (идентификатор задачи)
+    :return: Путь до рабочей папки
+    """
+    global __workspace_path
+    __workspace_path = config_paths.get_workspace_path(workspace_name)
+    os.makedirs(__workspace_path, exist_ok=True)
+    return __workspace_path
+
+def get_workspace_path():
+    # Вне фоновой задачи (например, при прямом вызове тренера) создается папка с уникальным именем
+    if __workspace_path is None:
+        return create(uuid.uuid4().hex)
+
+    return __workspace_path
+
+def remove():
+    global __workspace_path
+    if __workspace_path is None:
+        return
+
+    shutil.rmtree(__workspace_path, ignore_errors=True)
+    __workspace_path = None
@@ -0,0 +1,22 @@
+from application.ai_model_trainers.cnn.CnnTrainer import CNN_Trainer
+from application.ai_model_trainers.cnn.CnnTrainerYolov5 import CnnTrainerYolov5
+from application.ai_model_trainers.lnn.LnnTrainer import LNN_Trainer
+from application.ai_model_trainers.lnn.LnnOptimizeTrainer import LnnOptimizeTrainer
+
+# Функции выполняются в процессах-обработчиках очереди задач и возвращают Result с путем до zip-архива модели
+
+def train_lnn_model(trainer_kwargs, trained_model_name, is_create_app):
+    trainer = LNN_Trainer(**trainer_kwargs)
+    return trainer.train_and_save(trained_model_name, is_create_app)
+
+def optimize_train_lnn_model(trainer_kwargs, trained_model_name, is_create_app):
+    trainer = LnnOptimizeTrainer(**trainer_kwargs)
+    return trainer.optimize_train(trained_model_name, is_create_app)
+
+def train_cnn_model(trainer_kwargs, trained_model_name):
+    trainer = CNN_Trainer(**trainer_kwargs)
+    return trainer.train_and_save(trained_model_name)
+
+def train_cnn_model_yolo5(trainer_kwargs, trained_model_name):
+    trainer = CnnTrainerYolov5(**trainer_kwargs)
+    return trainer.train(trained_model_name)
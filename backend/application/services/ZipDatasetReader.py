@@ -0,0 +1,63 @@
+import zipfile
+import threading
+from collections import OrderedDict
+
+class ZipDatasetReader:
+    # Чтение файлов датасета прямо из архива без распаковки. У каждого потока свой дескриптор архива,
+    # прочитанные файлы хранятся в ограниченном LRU кэше: следующие эпохи не распаковывают их заново
+    def __init__(self, zip_file_path, cache_max_bytes=0):
+        self.zip_file_path = zip_file_path
+        self.cache_max_bytes = cache_max_bytes
+        self.cache = OrderedDict()
+        self.cache_bytes = 0
+        self.lock = threading.Lock()
+        self.thread_archives = threading.local()
+        self.opened_archives = []
+
+    def read(self, member_name):
+        """
+        Чтение содержимого файла архива.
+
+        :param member_name: Путь файла в архиве
+        :return: bytes
+        """
+        with self.lock:
+            if member_name in self.cache:
+                self.cache.move_to_end(member_name)
+                return self.cache[member_name]
+
+        content = self.__get_archive().read(member_name)
+
+        if len(content) <= self.cache_max_bytes:
+            with self.lock:
+                if member_name not in self.cache:
+                    self.cache[member_name] = content
+                    self.cache_bytes += len(content)
+                    while self.cache_bytes > self.cache_max_bytes:
+                        _, evicted = self.cache.popitem(last=False)
+                        self.cache_bytes -= len(evicted)
+
+        return content
+
+    def read_text(self, member_name):
+        return self.read(member_name).decode('utf-8')
+
+    def close(self):
+        # После закрытия чтение возможно: дескрипторы архива открываются заново
+        with self.lock:
+            for archive in self.opened_archives:
+                archive.close()
+            self.opened_archives = []
+            self.cache.clear()
+            self.cache_bytes = 0
+        self.thread_archives = threading.local()
+
+    def __get_archive(self):
+        archive = getattr(self.thread_archives, 'archive', None)
+        if archive is None:
+            archive = zipfile.ZipFile(self.zip_file_path)
+            self.thread_archives.archive = archive
+            with self.lock:
+                self.opened_archives.append(archive)
+
+        return archive
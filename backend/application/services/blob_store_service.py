@@ -0,0 +1,271 @@
+import os
+import sqlite3
+import hashlib
+import threading
+from contextlib import contextmanager
+from concurrent.futures import ThreadPoolExecutor
+
+from application import config_paths
+import configurations.config as config
+
+# Хранилище файлов по содержимому: Storage/Blobs/<первые 2 символа sha256>/<sha256>.
+# Файлы датасетов и моделей (архив <name>.zip и распакованная папка <name>) заменяются жесткими ссылками на блобы,
+# поэтому одинаковые файлы разных датасетов, пользователей и версий моделей хранятся на диске один раз.
+# В SQLite для каждого элемента записаны ссылки (путь файла -> sha256), у блоба - количество ссылок.
+# Блоб без ссылок удаляется сразу при удалении последнего элемента, который на него ссылался
+__database_file_name = 'blobs.sqlite3'
+__hash_chunk_size = 1024 * 1024
+__schema_lock = threading.Lock()
+__schema_paths = set()
+
+def hash_file(file_path):
+    digest = hashlib.sha256()
+    with open(file_path, 'rb') as f:
+        while True:
+            chunk = f.read(__hash_chunk_size)
+            if not chunk:
+                break
+            digest.update(chunk)
+
+    return digest.hexdigest()
+
+def store_item(folder_path, name, known_hashes=None, max_workers=None):
+    """
+    Перенос файлов элемента в хранилище: каждый файл <name>.zip и папки <name> заменяется ссылкой на блоб.
+    Прежние ссылки элемента (например, при повторной загрузке под тем же именем) освобождаются.
+
+    :param folder_path: Папка, в которой лежат <name>.zip и <name>
+    :param name: Имя датасета или модели
+    :param known_hashes: Уже посчитанные sha256 {путь относительно folder_path: sha256}, например хэш загруженного архива
+    :param max_workers: Количество потоков подсчета хэшей (по умолчанию - из настроек)
+    :return: Количество файлов, содержимое которых уже было в хранилище
+    """
+    relative_paths = __get_item_files(folder_path, name)
+    known_hashes = known_hashes or {}
+
+    # Хэши считаются вне транзакции: это самая долгая часть
+    def get_hash(relative_path):
+        return known_hashes.get(relative_path) or hash_file(os.path.join(folder_path, relative_path))
+
+    with ThreadPoolExecutor(max_workers=max_workers or config.get_threads_configuration_io_threads()) as executor:
+        hashes = list(executor.map(get_hash, relative_paths))
+
+    deduplicated_count = 0
+    with __connect() as connection:
+        owner = __get_owner(folder_path, name)
+        released_hashes = __delete_refs(connection, owner)
+
+        for relative_path, sha256 in zip(relative_paths, hashes):
+            is_linked, is_duplicate = __link_to_blob(connection, os.path.join(folder_path, relative_path), sha256)
+            if not is_linked:
+                continue
+
+            deduplicated_count += is_duplicate
+            __add_ref(connection, owner, relative_path, sha256)
+
+        __collect_garbage(connection, released_hashes)
+
+    return deduplicated_count
+
+def clone_item(folder_path, name, zip_sha256):
+    """
+    Создание распакованной папки <name> из ссылок на блобы другого элемента с тем же архивом, без распаковки и хэширования.
+
+    :param folder_path: Папка, в которой лежит <name>.zip
+    :param name: Имя датасета или модели
+    :param zip_sha256: sha256 архива
+    :return: True, если найден элемент с таким же архивом и папка создана
+    """
+    with __connect() as connection:
+        source = __find_extracted_item(connection, zip_sha256)
+        if source is None:
+            return False
+
+        source_owner, source_name = source
+        rows = connection.execute(
+            "SELECT path, hash FROM refs WHERE owner = ? AND path LIKE ? ESCAPE '\\'",
+            (source_owner, f'{__escape_like(source_name)}/%')).fetchall()
+
+        extract_folder = os.path.join(folder_path, name)
+        for path, sha256 in rows:
+            target_path = os.path.join(extract_folder, *path.split('/')[1:])
+            os.makedirs(os.path.dirname(target_path), exist_ok=True)
+            __replace_with_link(__get_blob_path(sha256), target_path)
+
+    store_item(folder_path, name, {f'{name}.zip': zip_sha256, **{f'{name}/{path.split("/", 1)[1]}': sha256 for path, sha256 in rows}})
+    return True
+
+def link_blob(zip_sha256, target_path):
+    """
+    Создание файла из уже сохраненного блоба. Так повторная загрузка архива не передает и не пишет его содержимое.
+
+    :param zip_sha256: sha256 содержимого
+    :param target_path: Путь создаваемого файла
+    :return: True, если блоб есть в хранилище
+    """
+    with __connect() as connection:
+        row = connection.execute('SELECT 1 FROM blobs WHERE hash = ?', (zip_sha256.lower(),)).fetchone()
+        if row is None or not os.path.isfile(__get_blob_path(zip_sha256.lower())):
+            return False
+
+        __replace_with_link(__get_blob_path(zip_sha256.lower()), target_path)
+        return True
+
+def release_item(folder_path, name):
+    """
+    Освобождение ссылок удаленного элемента и удаление блобов, на которые больше никто не ссылается.
+
+    :param folder_path: Папка, в которой лежали <name>.zip и <name>
+    :param name: Имя датасета или модели
+    :return: Количество освобожденных байт
+    """
+    with __connect() as connection:
+        released_hashes = __delete_refs(connection, __get_owner(folder_path, name))
+        return __collect_garbage(connection, released_hashes)
+
+def get_stats():
+    with __connect() as connection:
+        blobs_count, blobs_bytes = connection.execute('SELECT COUNT(*), COALESCE(SUM(size), 0) FROM blobs').fetchone()
+        refs_count, refs_bytes = connection.execute(
+            'SELECT COUNT(*), COALESCE(SUM(blobs.size), 0) FROM refs JOIN blobs ON blobs.hash = refs.hash').fetchone()
+
+    return {
+        'blobs': blobs_count,
+        'blobs_bytes': blobs_bytes,
+        'files': refs_count,
+        'files_bytes': refs_bytes,
+        'saved_bytes': refs_bytes - blobs_bytes
+    }
+
+def __get_item_files(folder_path, name):
+    relative_paths = []
+    if os.path.isfile(os.path.join(folder_path, f'{name}.zip')):
+        relative_paths.append(f'{name}.zip')
+
+    item_folder_path = os.path.join(folder_path, name)
+    for dir_name, _, file_names in os.walk(item_folder_path):
+        for file_name in file_names:
+            relative_path = os.path.relpath(os.path.join(dir_name, file_name), folder_path)
+            relative_paths.append(relative_path.replace(os.sep, '/'))
+
+    return sorted(relative_paths)
+
+def __link_to_blob(connection, file_path, sha256):
+    # Возвращает (файл стал ссылкой на блоб, блоб уже существовал)
+    blob_path = __get_blob_path(sha256)
+    row = connection.execute('SELECT 1 FROM blobs WHERE hash = ?', (sha256,)).fetchone()
+
+    try:
+        if row is not None and os.path.isfile(blob_path):
+            if not os.path.samefile(blob_path, file_path):
+                __replace_with_link(blob_path, file_path)
+            return True, True
+
+        os.makedirs(os.path.dirname(blob_path), exist_ok=True)
+        if os.path.exists(blob_path):
+            os.remove(blob_path)
+        os.link(file_path, blob_path)
+    except OSError:
+        # Хранилище на другом диске либо файловая система без жестких ссылок: файл остается как есть
+        return False, False
+
+    connection.execute('INSERT OR IGNORE INTO blobs (hash, size, ref_count) VALUES (?, ?, 0)', (sha256, os.path.getsize(blob_path)))
+    return True, False
+
+def __replace_with_link(blob_path, file_path):
+    # Ссылка создается под временным именем и заменяет файл одним переименованием
+    partial_path = f'{file_path}.link'
+    if os.path.exists(partial_path):
+        os.remove(partial_path)
+    os.link(blob_path, partial_path)
+    os.replace(partial_path, file_path)
+
+def __add_ref(connection, owner, path, sha256):
+    connection.execute('INSERT INTO refs (owner, path, hash) VALUES (?, ?, ?)', (owner, path, sha256))
+    connection.execute('UPDATE blobs SET ref_count = ref_count + 1 WHERE hash = ?', (sha256,))
+
+def __delete_refs(connection, owner):
+    hashes = [sha256 for sha256, in connection.execute('SELECT hash FROM refs WHERE owner = ?', (owner,))]
+    connection.execute('DELETE FROM refs WHERE owner = ?', (owner,))
+    for sha256 in hashes:
+        connection.execute('UPDATE blobs SET ref_count = ref_count - 1 WHERE hash = ?', (sha256,))
+
+    return set(hashes)
+
+def __collect_garbage(connection, hashes):
+    freed_bytes = 0
+    for sha256 in hashes:
+        row = connection.execute('SELECT size FROM blobs WHERE hash = ? AND ref_count <= 0', (sha256,)).fetchone()
+        if row is None:
+            continue
+
+        connection.execute('DELETE FROM blobs WHERE hash = ?', (sha256,))
+        blob_path = __get_blob_path(sha256)
+        try:
+            os.remove(blob_path)
+            os.rmdir(os.path.dirname(blob_path))
+        except OSError:
+            # Блоба уже нет либо в папке остались другие блобы
+            pass
+        freed_bytes += row[0]
+
+    return freed_bytes
+
+def __find_extracted_item(connection, zip_sha256):
+    # Элемент с тем же архивом, у которого есть распакованные файлы
+    rows = connection.execute('SELECT owner, path FROM refs WHERE hash = ? AND path LIKE ?', (zip_sha256, '%.zip')).fetchall()
+    for owner, path in rows:
+        name = path[:-len('.zip')]
+        has_files = connection.execute(
+            "SELECT 1 FROM refs WHERE owner = ? AND path LIKE ? ESCAPE '\\' LIMIT 1", (owner, f'{__escape_like(name)}/%')).fetchone()
+        if has_files is not None:
+            return owner, name
+
+    return None
+
+def __escape_like(value):
+    return value.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_')
+
+def __get_owner(folder_path, name):
+    # Элемент хранилища - путь <name> относительно корня приложения
+    return os.path.relpath(os.path.join(folder_path, name), config_paths.get_root_path()).replace(os.sep, '/')
+
+def __get_blob_path(sha256):
+    return os.path.join(config_paths.get_blobs_folder_path(), sha256[:2], sha256)
+
+@contextmanager
+def __connect():
+    # Изменения выполняются в одной транзакции с блокировкой записи: одновременные загрузки и удаления
+    # не удалят блоб, на который в этот момент создается новая ссылка
+    blobs_folder_path = config_paths.get_blobs_folder_path()
+    os.makedirs(blobs_folder_path, exist_ok=True)
+    database_path = os.path.join(blobs_folder_path, __database_file_name)
+
+    connection = sqlite3.connect(database_path, timeout=60)
+    try:
+        __create_schema(connection, database_path)
+        with connection:
+            connection.execute('BEGIN IMMEDIATE')
+            yield connection
+    finally:
+        connection.close()
+
+def __create_schema(connection, database_path):
+    with __schema_lock:
+        if database_path in __schema_paths:
+            return
+
+        with connection:
+            connection.execute('''
+                CREATE TABLE IF NOT EXISTS blobs (
+                    hash TEXT PRIMARY KEY,
+                    size INTEGER NOT NULL,
+                    ref_count INTEGER NOT NULL)''')
+            connection.execute('''
+                CREATE TABLE IF NOT EXISTS refs (
+                    owner TEXT NOT NULL,
+                    path TEXT NOT NULL,
+                    hash TEXT NOT NULL,
+                    PRIMARY KEY (owner, path))''')
+            connection.execute('CREATE INDEX IF NOT EXISTS refs_hash ON refs (hash)')
+        __schema_paths.add(database_path)
@@ -0,0 +1,143 @@
+import os
+import json
+
+import numpy as np
+import tensorflow as tf
+from application.results.Result import Result
+from application.services import dataset_files_service
+from application.services.dataset_files_service import get_cache_folder_path
+
+# Хранилище уже декодированных и уменьшенных изображений: <dataset>.cache/cnn_tfrecords/<img_size>/
+__tfrecords_folder_name = 'cnn_tfrecords'
+__manifest_file_name = 'manifest.json'
+__images_per_shard = 1024
+
+def get_tfrecords_folder_path(dataset_folder_path, img_size):
+    return os.path.join(get_cache_folder_path(dataset_folder_path), __tfrecords_folder_name, str(img_size))
+
+def build_cnn_tfrecords(dataset_folder_path, img_size=180):
+    """
+    Конвертация CNN датасета в шарды TFRecord: изображения uint8 размера img_size x img_size, номер класса и номер записи.
+
+    :param dataset_folder_path: Путь до датасета (распакованного, либо хранящегося только архивом)
+    :param img_size: Размер, к которому приводятся изображения
+    :return: Ответ сервера
+    """
+    all_files = dataset_files_service.get_dataset_files(dataset_folder_path, '.jpg')
+    if not all_files:
+        return Result(None, 'Error: Dataset does not contain .jpg files')
+
+    labels = [os.path.basename(os.path.dirname(file_path)) for file_path in all_files]
+    classes, label_indices = np.unique(labels, return_inverse=True)
+
+    tfrecords_folder_path = get_tfrecords_folder_path(dataset_folder_path, img_size)
+    if not os.path.exists(tfrecords_folder_path):
+        os.makedirs(tfrecords_folder_path)
+
+    # Манифест удаляется первым: до записи нового хранилище считается отсутствующим
+    manifest_path = os.path.join(tfrecords_folder_path, __manifest_file_name)
+    if os.path.exists(manifest_path):
+        os.remove(manifest_path)
+    for file_name in os.listdir(tfrecords_folder_path):
+        os.remove(os.path.join(tfrecords_folder_path, file_name))
+
+    # Изображения декодируются параллельно конвейером tf.data, запись шардов - последовательная
+    reader = dataset_files_service.open_dataset_reader(dataset_folder_path, cache_members=False)
+    images = tf.data.Dataset.from_tensor_slices(all_files).map(
+        lambda file_path: __load_image(file_path, img_size, reader),
+        num_parallel_calls=tf.data.AUTOTUNE)
+
+    shards_count = (len(all_files) + __images_per_shard - 1) // __images_per_shard
+    shards = [
+        {
+            'file': f'shard-{shard:05d}-of-{shards_count:05d}.tfrecord',
+            'count': min(__images_per_shard, len(all_files) - shard * __images_per_shard)
+        }
+        for shard in range(shards_count)
+    ]
+
+    writer = None
+    try:
+        for index, image in enumerate(images.as_numpy_iterator()):
+            if index % __images_per_shard == 0:
+                if writer is not None:
+                    writer.close()
+                writer = tf.io.TFRecordWriter(os.path.join(tfrecords_folder_path, shards[index // __images_per_shard]['file']))
+
+            writer.write(__serialize_example(image, label_indices[index], index))
+    except tf.errors.OpError as e:
+        return Result(None, f'Error: Failed to decode image: {e.message}')
+    finally:
+        if writer is not None:
+            writer.close()
+        if reader is not None:
+            reader.close()
+
+    manifest = {
+        'img_size': img_size,
+        'classes': classes.tolist(),
+        'total': len(all_files),
+        'shards': shards
+    }
+    with open(f'{manifest_path}.tmp', 'w', encoding='utf-8') as f:
+        json.dump(manifest, f, ensure_ascii=False, indent=4)
+    os.replace(f'{manifest_path}.tmp', manifest_path)
+
+    return Result(tfrecords_folder_path, None)
+
+def load_cnn_tfrecords_manifest(dataset_folder_path, img_size):
+    """
+    Чтение манифеста шардов, если они собраны для img_size и новее исходных изображений.
+
+    :param dataset_folder_path: Путь до датасета
+    :param img_size: Размер изображений
+    :return: Манифест с абсолютными путями шардов, либо None
+    """
+    tfrecords_folder_path = get_tfrecords_folder_path(dataset_folder_path, img_size)
+    manifest_path = os.path.join(tfrecords_folder_path, __manifest_file_name)
+    if not os.path.isfile(manifest_path):
+        return None
+
+    if dataset_files_service.is_modified_after(dataset_folder_path, '.jpg', os.path.getmtime(manifest_path)):
+        return None
+
+    with open(manifest_path, 'r', encoding='utf-8') as f:
+        manifest = json.load(f)
+
+    manifest['shard_paths'] = [os.path.join(tfrecords_folder_path, shard['file']) for shard in manifest['shards']]
+    return manifest
+
+def parse_example(serialized_example, img_size):
+    """
+    Разбор записи шарда.
+
+    :return: (изображение uint8, номер класса, номер записи)
+    """
+    features = tf.io.parse_single_example(serialized_example, {
+        'image': tf.io.FixedLenFeature([], tf.string),
+        'label': tf.io.FixedLenFeature([], tf.int64),
+        'index': tf.io.FixedLenFeature([], tf.int64)
+    })
+    image = tf.reshape(tf.io.decode_raw(features['image'], tf.uint8), [img_size, img_size, 3])
+    return image, features['label'], features['index']
+
+def __load_image(file_path, img_size, reader):
+    img = __read_file(file_path, reader)
+    img = tf.image.decode_image(img, channels=3, expand_animations=False)
+    img = tf.image.resize(img, [img_size, img_size])
+    return tf.cast(tf.round(tf.clip_by_value(img, 0, 255)), tf.uint8)
+
+def __serialize_example(image, label, index):
+    return tf.train.Example(features=tf.train.Features(feature={
+        'image': tf.train.Feature(bytes_list=tf.train.BytesList(value=[image.tobytes()])),
+        'label': tf.train.Feature(int64_list=tf.train.Int64List(value=[int(label)])),
+        'index': tf.train.Feature(int64_list=tf.train.Int64List(value=[index]))
+    })).SerializeToString()
+
+def __read_file(file_path, reader):
+    if reader is None:
+        return tf.io.read_file(file_path)
+
+    content = tf.numpy_function(lambda member_name: reader.read(member_name.decode('utf-8')), [file_path], tf.string)
+    content.set_shape([])
+    return content
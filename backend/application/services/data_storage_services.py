@@ -1,33 +1,66 @@
 import os
 import shutil
+import logging
+import hashlib
 import zipfile
+import threading
+from concurrent.futures import ThreadPoolExecutor
 
 from application.ai_models.ai_models import AI_Model_Type
 from application.results.Result import Result
+from application.services import lnn_dataset_cache_service, cnn_tfrecords_service, dataset_files_service, blob_store_service, storage_registry_service
 from application import config_paths
+import configurations.config as config
 
-def create_dataset_zip(user_name, filename, file):
+# Загрузка пишется на диск порциями, поэтому память не зависит от размера архива
+__upload_chunk_size = 1024 * 1024
+
+def create_dataset_zip(user_name, filename, file, build_lnn_cache=False, cnn_tfrecords_img_size=None, extract=True, sha256=None):
     """
     Метод для создания zip-файла набора данных.
     
     :param user_name: Имя пользователя
-    :param file: Путь до файла
+    :param file: Поток загружаемого архива
+    :param build_lnn_cache: Собрать бинарный кэш признаков для обучения LNN
+    :param cnn_tfrecords_img_size: Размер изображений, для которого собираются шарды TFRecord для обучения CNN. None - не собирать
+    :param extract: Распаковать архив. Иначе датасет хранится только архивом и обучение читает файлы прямо из него
+    :param sha256: Хэш архива, известный клиенту. Если такой архив уже есть в хранилище, поток не читается
     :return: Ответ сервера
     """
-    # Распаковываем архив
     try:
-        return __save_zip_and_extracted_file(config_paths.get_datasets_folder_path(user_name), filename, file)
+        datasets_folder_path = config_paths.get_datasets_folder_path(user_name)
+        if extract:
+            result = __save_zip_and_extracted_file(datasets_folder_path, filename, file, sha256)
+        else:
+            result = __save_zip_only(datasets_folder_path, filename, file, sha256)
+        if not result.isSuccess:
+            return result
+        storage_registry_service.add_dataset(user_name, filename, extract)
+
+        # Датасет уже сохранен, поэтому ошибка сборки кэша не отменяет загрузку
+        message = result.result
+        if build_lnn_cache:
+            cache_result = lnn_dataset_cache_service.build_lnn_cache(os.path.join(datasets_folder_path, filename))
+            message += '. LNN cache was built' if cache_result.isSuccess else f'. LNN cache was not built: {cache_result.errors}'
+
+        if cnn_tfrecords_img_size is not None:
+            tfrecords_result = cnn_tfrecords_service.build_cnn_tfrecords(os.path.join(datasets_folder_path, filename), cnn_tfrecords_img_size)
+            message += '. CNN TFRecords were built' if tfrecords_result.isSuccess else f'. CNN TFRecords were not built: {tfrecords_result.errors}'
+
+        return Result(message, None)
     
-    except zipfile.BadZipFile:
+    except zipfile.BadZipFile as e:
         return Result(None, f'Error: The uploaded file is not a valid ZIP archive: {str(e)}')
     except Exception as e:
         return Result(None, f'Error: An unexpected error occurred while extracting the archive: {str(e)}')
 
-def get_dataset_names(user_name):
+def get_dataset_names(user_name, offset=0, limit=None):
     """
     Получение списка имен наборов данных для указанного пользователя.
     
     :param user_name: Имя пользователя
+    :param offset: Количество пропускаемых имен
+    :param limit: Размер страницы. None - все имена
     :return: Ответ сервера
     """
     # Указываем путь к папке
@@ -35,13 +68,9 @@ def get_dataset_names(user_name):
 
     if not os.path.isdir(datasets_folder_path):
         return Result(None, "Datasets for User is not exist")
-    
-    contents = os.listdir(datasets_folder_path)
 
-    # Отбираем только те элементы, которые являются директориями
-    directories = [item for item in contents if os.path.isdir(os.path.join(datasets_folder_path, item))]
-    
-    return Result(directories, None)
+    # Имена берутся из реестра, в том числе датасетов, загруженных без распаковки
+    return Result(storage_registry_service.get_dataset_names(user_name, offset, limit), None)
 
 def get_dataset_by_name(user_name, dataset_name):
     zip_filename = f'{dataset_name}.zip'
@@ -54,32 +83,63 @@ def get_dataset_by_name(user_name, dataset_name):
     return Result(path_to_zip, None)
 
 def delete_dataset_by_name(user_name, dataset_name):
-    return __delete_zip_and_extract_folder(config_paths.get_models_folder_path(user_name), dataset_name)
+    datasets_folder_path = config_paths.get_datasets_folder_path(user_name)
+
+    # Удаление кэша датасета
+    cache_folder_path = lnn_dataset_cache_service.get_cache_folder_path(os.path.join(datasets_folder_path, dataset_name))
+    if os.path.isdir(cache_folder_path):
+        try:
+            shutil.rmtree(cache_folder_path)
+        except OSError as e:
+            return Result(None, f"Error: '{dataset_name}': {e.strerror}")
+
+    result = __delete_zip_and_extract_folder(datasets_folder_path, dataset_name)
+    if result.isSuccess:
+        storage_registry_service.delete_dataset(user_name, dataset_name)
+
+    return result
 
-def create_model_zip(user_name, ai_model_type, filename, file):
+def create_model_zip(user_name, ai_model_type, filename, file, sha256=None):
     try:
         _, ai_model_type_string = AI_Model_Type.convert_to_string_try_get(ai_model_type)
-        return __save_zip_and_extracted_file(config_paths.get_models_folder_path(user_name, ai_model_type_string), filename, file)
+        result = __save_zip_and_extracted_file(config_paths.get_models_folder_path(user_name, ai_model_type_string), filename, file, sha256)
+        if result.isSuccess:
+            storage_registry_service.add_model(user_name, ai_model_type_string, filename)
+
+        return result
     
-    except zipfile.BadZipFile:
+    except zipfile.BadZipFile as e:
         return Result(None, f'Error: The created file is not a valid ZIP archive: {str(e)}')
     except Exception as e:
         return Result(None, f'Error: An unexpected error occurred while extracting the archive: {str(e)}')
 
-def get_model_names(user_name, ai_model_type):
+def store_model_files(user_name, ai_model_type, model_name, metrics=None):
+    """
+    Регистрация обученной версии модели и перенос её файлов (архив и папка) в хранилище блобов.
+    Ошибка хранилища не отменяет обучение: файлы модели остаются на месте.
+
+    :param user_name: Имя пользователя
+    :param ai_model_type: Тип модели
+    :param model_name: Имя версии модели
+    :param metrics: Итоговые метрики обучения
+    """
+    _, ai_model_type_string = AI_Model_Type.convert_to_string_try_get(ai_model_type)
+    try:
+        blob_store_service.store_item(config_paths.get_models_folder_path(user_name, ai_model_type_string), model_name)
+    except Exception as e:
+        logging.warning(f'Model files were not deduplicated: {e}')
+
+    storage_registry_service.add_model(user_name, ai_model_type_string, model_name, metrics)
+
+def get_model_names(user_name, ai_model_type, offset=0, limit=None):
     # Указываем путь к папке
     _, ai_model_type_string = AI_Model_Type.convert_to_string_try_get(ai_model_type)
     models_folder_path = config_paths.get_models_folder_path(user_name, ai_model_type_string)
 
     if not os.path.isdir(models_folder_path):
         return Result(None, "Models for User is not exist")
-    
-    contents = os.listdir(models_folder_path)
 
-    # Отбираем только те элементы, которые являются директориями
-    directories = [item for item in contents if os.path.isdir(os.path.join(models_folder_path, item))]
-    
-    return Result(directories, None)
+    return Result(storage_registry_service.get_model_names(user_name, ai_model_type_string, offset, limit), None)
 
 def get_model_by_name(user_name, ai_model_type, model_name):
     zip_filename = f'{model_name}.zip'
@@ -94,25 +154,150 @@ def get_model_by_name(user_name, ai_model_type, model_name):
 
 def delete_model_by_name(user_name, ai_model_type, model_name):
     _, ai_model_type_string = AI_Model_Type.convert_to_string_try_get(ai_model_type)
-    return __delete_zip_and_extract_folder(config_paths.get_models_folder_path(user_name, ai_model_type_string), model_name)
-
-def __save_zip_and_extracted_file(file_folder, filename, file):
-    with zipfile.ZipFile(file) as archive:
-        # Указываем директорию для распаковки
-        if not os.path.exists(file_folder):
-            os.makedirs(file_folder)
-        
-        # Сохраняем исходный ZIP-архив в ту же директорию
-        zip_file_path = os.path.join(file_folder, filename + '.zip')
-        with open(zip_file_path, 'wb') as f:
-            f.write(file.read()) 
-
-        # Распаковываем архив в указанную директорию
-        extract_folder = os.path.join(file_folder, filename)
-        with zipfile.ZipFile(file) as archive:
-            archive.extractall(extract_folder)
-
-        return Result('Success: Archive was successfully extracted', None)
+    result = __delete_zip_and_extract_folder(config_paths.get_models_folder_path(user_name, ai_model_type_string), model_name)
+    if result.isSuccess:
+        storage_registry_service.delete_model(user_name, ai_model_type_string, model_name)
+
+    return result
+
+def extract_dataset_copy(dataset_folder_path, extract_folder):
+    """
+    Распаковка архива датасета в отдельную папку, например в рабочую папку задачи для датасета, загруженного без распаковки.
+
+    :param dataset_folder_path: Путь до датасета без расширения .zip
+    :param extract_folder: Папка, в которую распаковывается архив
+    :return: Путь до распакованного датасета
+    """
+    __extract_zip(f'{os.path.normpath(dataset_folder_path)}.zip', extract_folder)
+    return extract_folder
+
+def __save_zip_and_extracted_file(file_folder, filename, file, sha256=None):
+    result = __save_zip_file(file_folder, filename, file, sha256)
+    if not result.isSuccess:
+        return result
+
+    # Прежняя распаковка удаляется: её файлы - ссылки на общие блобы, и перезаписывать их нельзя
+    zip_file_path, sha256 = result.result
+    extract_folder = os.path.join(file_folder, filename)
+    if os.path.isdir(extract_folder):
+        shutil.rmtree(extract_folder)
+
+    # Такой же архив уже распакован другим элементом хранилища: папка собирается из ссылок на его файлы
+    if blob_store_service.clone_item(file_folder, filename, sha256):
+        return Result(f'Success: Archive is already stored, extracted files were linked (sha256: {sha256})', None)
+
+    # Распаковываем архив с диска в указанную директорию
+    __extract_zip(zip_file_path, extract_folder)
+    deduplicated_count = blob_store_service.store_item(file_folder, filename, {f'{filename}.zip': sha256})
+
+    return Result(f'Success: Archive was successfully extracted, {deduplicated_count} files were already stored (sha256: {sha256})', None)
+
+def __save_zip_only(file_folder, filename, file, sha256=None):
+    result = __save_zip_file(file_folder, filename, file, sha256)
+    if not result.isSuccess:
+        return result
+
+    # Прежняя распаковка приоритетнее архива, поэтому удаляется: иначе обучение читало бы устаревшие файлы
+    zip_file_path, sha256 = result.result
+    extract_folder = os.path.join(file_folder, filename)
+    if os.path.isdir(extract_folder):
+        shutil.rmtree(extract_folder)
+
+    # Индекс строится после переноса в хранилище: он проверяет время изменения архива
+    blob_store_service.store_item(file_folder, filename, {f'{filename}.zip': sha256})
+    index = dataset_files_service.build_zip_index(extract_folder)
+
+    return Result(f'Success: Archive was saved without extraction, {len(index["members"])} files (sha256: {sha256})', None)
+
+def __save_zip_file(file_folder, filename, file, sha256=None):
+    # Указываем директорию для сохранения
+    if not os.path.exists(file_folder):
+        os.makedirs(file_folder)
+
+    # Кэши датасета собраны из прежнего содержимого. У файлов-ссылок на старые блобы время изменения старое,
+    # поэтому проверка по времени изменения не заметила бы замену
+    cache_folder_path = dataset_files_service.get_cache_folder_path(os.path.join(file_folder, filename))
+    zip_file_path = os.path.join(file_folder, filename + '.zip')
+
+    # Архив с известным хэшем уже есть в хранилище: содержимое не передается и не пишется заново
+    if sha256 and blob_store_service.link_blob(sha256, zip_file_path):
+        shutil.rmtree(cache_folder_path, ignore_errors=True)
+        return Result((zip_file_path, sha256.lower()), None)
+
+    if file is None:
+        return Result(None, f'Error: Archive with sha256 {sha256} is not stored, upload the file')
+
+    # Сохраняем исходный ZIP-архив в ту же директорию, одновременно считая его хэш.
+    # До проверки архив пишется во временный файл, чтобы не заменить прежний архив поврежденным
+    partial_zip_file_path = f'{zip_file_path}.part'
+    try:
+        file_sha256 = __save_stream(file, partial_zip_file_path)
+        if sha256 and file_sha256 != sha256.lower():
+            return Result(None, f'Error: The uploaded file sha256 {file_sha256} does not match {sha256}')
+        if not zipfile.is_zipfile(partial_zip_file_path):
+            return Result(None, 'Error: The uploaded file is not a valid ZIP archive')
+        os.replace(partial_zip_file_path, zip_file_path)
+    finally:
+        if os.path.exists(partial_zip_file_path):
+            os.remove(partial_zip_file_path)
+
+    shutil.rmtree(cache_folder_path, ignore_errors=True)
+    return Result((zip_file_path, file_sha256), None)
+
+def __save_stream(stream, file_path):
+    digest = hashlib.sha256()
+    with open(file_path, 'wb') as f:
+        while True:
+            chunk = stream.read(__upload_chunk_size)
+            if not chunk:
+                break
+            digest.update(chunk)
+            f.write(chunk)
+
+    return digest.hexdigest()
+
+def __extract_zip(zip_file_path, extract_folder, max_workers=None):
+    # Файлы распаковываются пулом потоков: zlib освобождает GIL. У каждого потока свой дескриптор архива,
+    # чтобы чтение и распаковка разных файлов не выполнялись по очереди
+    with zipfile.ZipFile(zip_file_path) as archive:
+        members = archive.infolist()
+    max_workers = max_workers or config.get_threads_configuration_io_threads()
+
+    # Папки создаются заранее в одном потоке, чтобы потоки не создавали одну и ту же папку одновременно
+    target_paths = [__get_member_path(extract_folder, member.filename) for member in members]
+    folders = {target_path if member.is_dir() else os.path.dirname(target_path) for member, target_path in zip(members, target_paths)}
+    for folder in sorted(folders):
+        os.makedirs(folder, exist_ok=True)
+
+    thread_archives = threading.local()
+    opened_archives = []
+    opened_archives_lock = threading.Lock()
+
+    def extract_member(member, target_path):
+        if member.is_dir():
+            return
+
+        if not hasattr(thread_archives, 'archive'):
+            thread_archives.archive = zipfile.ZipFile(zip_file_path)
+            with opened_archives_lock:
+                opened_archives.append(thread_archives.archive)
+
+        with thread_archives.archive.open(member) as source, open(target_path, 'wb') as target:
+            shutil.copyfileobj(source, target, __upload_chunk_size)
+
+    try:
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            # list() пробрасывает первую ошибку распаковки
+            list(executor.map(extract_member, members, target_paths))
+    finally:
+        for archive in opened_archives:
+            archive.close()
+
+def __get_member_path(extract_folder, member_name):
+    # Как в ZipFile.extract: пути из архива не выходят за папку распаковки
+    parts = os.path.splitdrive(member_name.replace('\\', '/'))[1].split('/')
+    safe_parts = [part for part in parts if part not in ('', os.path.curdir, os.path.pardir)]
+    return os.path.join(extract_folder, *safe_parts)
     
 def __delete_zip_and_extract_folder(file_folder, filename):
     # Удаление директории
@@ -130,5 +315,8 @@ def __delete_zip_and_extract_folder(file_folder, filename):
             os.remove(zip_file_path)
         except OSError as e:
             return Result(None, f"Error: '{filename}': {e.strerror}")
+
+    # Блобы, на которые больше никто не ссылается, удаляются
+    blob_store_service.release_item(file_folder, filename)
     
     return Result(f'Success: File {filename} is deleted', None)
\ No newline at end of file
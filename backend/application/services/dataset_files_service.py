@@ -0,0 +1,116 @@
+import os
+import json
+import zipfile
+
+import configurations.config as config
+from application.services.ZipDatasetReader import ZipDatasetReader
+
+# Датасет хранится либо распакованной папкой рядом с <dataset>.zip, либо только архивом (ленивый режим).
+# Для архива в <dataset>.cache/ хранится индекс файлов, поэтому список файлов и классов известен без чтения архива
+__zip_index_file_name = 'zip_index.json'
+
+def get_cache_folder_path(dataset_folder_path):
+    return f'{os.path.normpath(dataset_folder_path)}.cache'
+
+def get_zip_file_path(dataset_folder_path):
+    return f'{os.path.normpath(dataset_folder_path)}.zip'
+
+def is_zip_only(dataset_folder_path):
+    # Распакованная папка приоритетнее архива
+    return not os.path.isdir(dataset_folder_path) and os.path.isfile(get_zip_file_path(dataset_folder_path))
+
+def build_zip_index(dataset_folder_path):
+    """
+    Индекс файлов архива датасета: путь, размер и CRC каждого файла. Пишется при загрузке архива без распаковки.
+
+    :param dataset_folder_path: Путь до датасета без расширения .zip
+    :return: Индекс
+    """
+    zip_file_path = get_zip_file_path(dataset_folder_path)
+    with zipfile.ZipFile(zip_file_path) as archive:
+        members = [
+            {'name': member.filename, 'size': member.file_size, 'crc': member.CRC}
+            for member in archive.infolist()
+            if not member.is_dir()
+        ]
+
+    stat = os.stat(zip_file_path)
+    index = {
+        'zip_size': stat.st_size,
+        'zip_mtime_ns': stat.st_mtime_ns,
+        'members': members
+    }
+
+    cache_folder_path = get_cache_folder_path(dataset_folder_path)
+    os.makedirs(cache_folder_path, exist_ok=True)
+    index_path = os.path.join(cache_folder_path, __zip_index_file_name)
+    with open(f'{index_path}.tmp', 'w', encoding='utf-8') as f:
+        json.dump(index, f, ensure_ascii=False)
+    os.replace(f'{index_path}.tmp', index_path)
+
+    return index
+
+def load_zip_index(dataset_folder_path):
+    """
+    Чтение индекса архива. Если индекса нет или архив изменился, индекс строится заново.
+
+    :param dataset_folder_path: Путь до датасета без расширения .zip
+    :return: Индекс
+    """
+    index_path = os.path.join(get_cache_folder_path(dataset_folder_path), __zip_index_file_name)
+    if os.path.isfile(index_path):
+        with open(index_path, 'r', encoding='utf-8') as f:
+            index = json.load(f)
+
+        stat = os.stat(get_zip_file_path(dataset_folder_path))
+        if index['zip_size'] == stat.st_size and index['zip_mtime_ns'] == stat.st_mtime_ns:
+            return index
+
+    return build_zip_index(dataset_folder_path)
+
+def get_dataset_files(dataset_folder_path, extension):
+    """
+    Файлы датасета с заданным расширением в постоянном порядке.
+
+    :param dataset_folder_path: Путь до датасета
+    :param extension: Расширение файлов (.txt - LNN, .jpg - CNN)
+    :return: Абсолютные пути для папки, либо пути внутри архива. Метка файла в обоих случаях - имя его папки
+    """
+    if is_zip_only(dataset_folder_path):
+        return sorted(member['name'] for member in load_zip_index(dataset_folder_path)['members'] if member['name'].endswith(extension))
+
+    files = []
+    for dir_name, _, file_names in os.walk(dataset_folder_path):
+        for file_name in file_names:
+            if file_name.endswith(extension):
+                files.append(os.path.join(dir_name, file_name))
+    return sorted(files)
+
+def get_class_folders(dataset_folder_path):
+    # Классы - папки верхнего уровня датасета
+    if is_zip_only(dataset_folder_path):
+        return sorted({member['name'].split('/')[0] for member in load_zip_index(dataset_folder_path)['members'] if '/' in member['name']})
+
+    all_items = os.listdir(dataset_folder_path)
+    return [item for item in all_items if os.path.isdir(os.path.join(dataset_folder_path, item))]
+
+def is_modified_after(dataset_folder_path, extension, time):
+    # Проверка актуальности кэшей, собранных из датасета: для архива достаточно времени изменения самого архива
+    if is_zip_only(dataset_folder_path):
+        return os.path.getmtime(get_zip_file_path(dataset_folder_path)) > time
+
+    return any(os.path.getmtime(file_path) > time for file_path in get_dataset_files(dataset_folder_path, extension))
+
+def open_dataset_reader(dataset_folder_path, cache_members=True):
+    """
+    Чтение файлов датасета, хранящегося только архивом.
+
+    :param dataset_folder_path: Путь до датасета
+    :param cache_members: Хранить ли прочитанные файлы в кэше (нужно, если файлы читаются повторно, например каждую эпоху)
+    :return: ZipDatasetReader, либо None, если датасет распакован и файлы читаются с диска
+    """
+    if not is_zip_only(dataset_folder_path):
+        return None
+
+    cache_max_bytes = config.get_datasets_configuration_zip_member_cache_megabytes() * 1024 * 1024 if cache_members else 0
+    return ZipDatasetReader(get_zip_file_path(dataset_folder_path), cache_max_bytes)
@@ -0,0 +1,118 @@
+import os
+import json
+import hashlib
+
+import numpy as np
+import configurations.config as config
+from application.results.Result import Result
+from application.services.lnn_samples_reader import SamplesFormatError, parse_sample, read_sample, read_samples
+from application.services import dataset_files_service
+from application.services.dataset_files_service import get_cache_folder_path
+
+# Бинарный кэш LNN датасета хранится рядом с распакованной папкой (или архивом): <dataset>.cache/
+__features_file_name = 'lnn_features.npy'
+__labels_file_name = 'lnn_labels.npy'
+__classes_file_name = 'lnn_classes.json'
+
+def build_lnn_cache(dataset_folder_path):
+    """
+    Компиляция LNN датасета в бинарный кэш: матрица признаков float32 (.npy), индексы меток и список классов.
+
+    :param dataset_folder_path: Путь до датасета (распакованного, либо хранящегося только архивом)
+    :return: Ответ сервера
+    """
+    all_files = dataset_files_service.get_dataset_files(dataset_folder_path, '.txt')
+    if not all_files:
+        return Result(None, 'Error: Dataset does not contain .txt files')
+
+    reader = dataset_files_service.open_dataset_reader(dataset_folder_path, cache_members=False)
+    try:
+        features = read_samples(all_files, config.get_threads_configuration_io_threads(), read_function=__get_read_function(reader))
+    except SamplesFormatError as e:
+        return Result(None, f'Error: {e}')
+    finally:
+        if reader is not None:
+            reader.close()
+
+    labels = [os.path.basename(os.path.dirname(file_path)) for file_path in all_files]
+    classes, label_indices = np.unique(labels, return_inverse=True)
+
+    cache_folder_path = get_cache_folder_path(dataset_folder_path)
+    if not os.path.exists(cache_folder_path):
+        os.makedirs(cache_folder_path)
+
+    # Файл классов пишется последним: по нему определяется актуальность кэша
+    __save_npy(os.path.join(cache_folder_path, __features_file_name), features)
+    __save_npy(os.path.join(cache_folder_path, __labels_file_name), label_indices.astype(np.int32))
+
+    classes_path = os.path.join(cache_folder_path, __classes_file_name)
+    with open(f'{classes_path}.tmp', 'w', encoding='utf-8') as f:
+        json.dump(classes.tolist(), f, ensure_ascii=False)
+    os.replace(f'{classes_path}.tmp', classes_path)
+
+    return Result(cache_folder_path, None)
+
+def load_lnn_cache(dataset_folder_path):
+    """
+    Чтение бинарного кэша LNN датасета, если он есть и новее исходных файлов.
+
+    :param dataset_folder_path: Путь до распакованного датасета
+    :return: (матрица признаков в режиме memory-map, индексы меток, список классов), либо None
+    """
+    cache_folder_path = get_cache_folder_path(dataset_folder_path)
+    classes_path = os.path.join(cache_folder_path, __classes_file_name)
+    if not os.path.isfile(classes_path):
+        return None
+
+    if dataset_files_service.is_modified_after(dataset_folder_path, '.txt', os.path.getmtime(classes_path)):
+        return None
+
+    features = np.load(os.path.join(cache_folder_path, __features_file_name), mmap_mode='r')
+    label_indices = np.load(os.path.join(cache_folder_path, __labels_file_name))
+    with open(classes_path, 'r', encoding='utf-8') as f:
+        classes = json.load(f)
+
+    return features, label_indices, classes
+
+def get_dataset_fingerprint(dataset_folder_path, extension='.txt'):
+    """
+    Отпечаток датасета по именам, размерам и времени изменения файлов (для архива - по именам, размерам и CRC
+    из индекса). Файлы не читаются, поэтому отпечаток вычисляется быстро даже для больших датасетов.
+
+    :param dataset_folder_path: Путь до распакованного датасета
+    :param extension: Расширение файлов датасета (.txt - LNN, .jpg - CNN)
+    :return: sha256 в шестнадцатеричном виде
+    """
+    fingerprint = hashlib.sha256()
+    if dataset_files_service.is_zip_only(dataset_folder_path):
+        members = dataset_files_service.load_zip_index(dataset_folder_path)['members']
+        for member in sorted(members, key=lambda member: member['name']):
+            if member['name'].endswith(extension):
+                fingerprint.update(f"{member['name']}:{member['size']}:{member['crc']}\n".encode('utf-8'))
+        return fingerprint.hexdigest()
+
+    for file_path in sorted(__get_all_files(dataset_folder_path, extension)):
+        stat = os.stat(file_path)
+        relative_path = os.path.relpath(file_path, dataset_folder_path).replace(os.sep, '/')
+        fingerprint.update(f'{relative_path}:{stat.st_size}:{stat.st_mtime_ns}\n'.encode('utf-8'))
+    return fingerprint.hexdigest()
+
+def __get_read_function(reader):
+    if reader is None:
+        return read_sample
+
+    return lambda member_name: parse_sample(reader.read_text(member_name))
+
+def __save_npy(path, array):
+    # Запись через временный файл, чтобы читатели не увидели недописанный кэш
+    with open(f'{path}.tmp', 'wb') as f:
+        np.save(f, array)
+    os.replace(f'{path}.tmp', path)
+
+def __get_all_files(root_dir, extension='.txt'):
+    files = []
+    for dir_name, _, file_names in os.walk(root_dir):
+        for file_name in file_names:
+            if file_name.endswith(extension):
+                files.append(os.path.join(dir_name, file_name))
+    return files
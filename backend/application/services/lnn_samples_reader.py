@@ -0,0 +1,72 @@
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+class SamplesFormatError(ValueError):
+    # Ошибка разбора LNN файлов. errors - список пар (путь до файла, причина)
+    def __init__(self, errors):
+        self.errors = errors
+
+        shown_errors = '; '.join(f'{path}: {reason}' for path, reason in errors[:20])
+        hidden_count = len(errors) - 20
+        super().__init__(f'Invalid LNN samples: {shown_errors}' + (f'; and {hidden_count} more' if hidden_count > 0 else ''))
+
+    def __reduce__(self):
+        # Исключение передается из процессов-обработчиков задач: восстанавливается из списка ошибок, а не из текста
+        return (type(self), (self.errors,))
+
+def parse_sample(text):
+    # Каждая строка файла - одно число. Строка разбирается одним векторным вызовом numpy
+    return np.array(text.split(), dtype=np.float32)
+
+def read_sample(file_path):
+    """
+    Чтение одного LNN файла. Используется и при обучении, и в приложении-классификаторе.
+
+    :param file_path: Путь до .txt файла
+    :return: Вектор признаков float32
+    """
+    with open(file_path, 'r', encoding='utf-8') as f:
+        return parse_sample(f.read())
+
+def read_samples(file_paths, max_workers=None, read_function=read_sample):
+    """
+    Чтение множества LNN файлов пулом потоков сразу в заранее выделенную матрицу float32.
+
+    :param file_paths: Пути до .txt файлов
+    :param max_workers: Количество потоков чтения (по умолчанию - решает ThreadPoolExecutor)
+    :param read_function: Чтение одного файла (например, из архива датасета)
+    :return: Матрица признаков (количество файлов x количество значений в файле)
+    """
+    if not file_paths:
+        return np.empty((0, 0), dtype=np.float32)
+
+    # Размер вектора признаков определяется по первому файлу
+    try:
+        first_sample = read_function(file_paths[0])
+    except ValueError as e:
+        raise SamplesFormatError([(file_paths[0], str(e))])
+
+    samples = np.empty((len(file_paths), len(first_sample)), dtype=np.float32)
+    samples[0] = first_sample
+
+    def read_into_row(row):
+        file_path = file_paths[row]
+        try:
+            sample = read_function(file_path)
+        except (OSError, ValueError) as e:
+            return file_path, str(e)
+
+        if len(sample) != samples.shape[1]:
+            return file_path, f'expected {samples.shape[1]} values, got {len(sample)}'
+
+        samples[row] = sample
+        return None
+
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        errors = [error for error in executor.map(read_into_row, range(1, len(file_paths))) if error is not None]
+
+    if errors:
+        raise SamplesFormatError(errors)
+
+    return samples
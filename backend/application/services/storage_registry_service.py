@@ -0,0 +1,195 @@
+import os
+import json
+import sqlite3
+import threading
+from datetime import datetime
+from contextlib import contextmanager
+
+from application import config_paths
+from application.services import dataset_files_service
+
+# Реестр датасетов и версий моделей в SQLite: списки и поиск последней версии выполняются запросами по индексам,
+# без обхода папок хранилища. Реестр обновляется при загрузке, обучении и удалении.
+# Папка пользователя, которой еще нет в реестре (хранилище до появления реестра), один раз сканируется при первом обращении
+__version_time_format = '%Y-%m-%d-%H-%M-%S'
+__schema_lock = threading.Lock()
+__schema_paths = set()
+
+def add_dataset(user_name, name, is_extracted):
+    dataset_path = os.path.join(config_paths.get_datasets_folder_path(user_name), name)
+    with __connect() as connection:
+        __add_dataset(connection, user_name, name, dataset_path, is_extracted)
+
+def delete_dataset(user_name, name):
+    with __connect() as connection:
+        connection.execute('DELETE FROM datasets WHERE user_name = ? AND name = ?', (user_name, name))
+
+def get_dataset_names(user_name, offset=0, limit=None):
+    """
+    Имена датасетов пользователя по алфавиту.
+
+    :param user_name: Имя пользователя
+    :param offset: Количество пропускаемых имен
+    :param limit: Размер страницы. None - все имена
+    :return: Список имен
+    """
+    with __connect() as connection:
+        __scan_datasets(connection, user_name)
+        rows = connection.execute(
+            'SELECT name FROM datasets WHERE user_name = ? ORDER BY name LIMIT ? OFFSET ?',
+            (user_name, -1 if limit is None else limit, offset)).fetchall()
+
+    return [name for name, in rows]
+
+def add_model(user_name, ai_model_type_string, name, metrics=None):
+    model_path = os.path.join(config_paths.get_models_folder_path(user_name, ai_model_type_string), name)
+    with __connect() as connection:
+        __add_model(connection, user_name, ai_model_type_string, name, model_path, metrics)
+
+def delete_model(user_name, ai_model_type_string, name):
+    with __connect() as connection:
+        connection.execute('DELETE FROM models WHERE user_name = ? AND model_type = ? AND name = ?', (user_name, ai_model_type_string, name))
+
+def get_model_names(user_name, ai_model_type_string, offset=0, limit=None):
+    """
+    Имена версий моделей пользователя по алфавиту.
+
+    :param user_name: Имя пользователя
+    :param ai_model_type_string: Тип модели (имя папки типа)
+    :param offset: Количество пропускаемых имен
+    :param limit: Размер страницы. None - все имена
+    :return: Список имен
+    """
+    with __connect() as connection:
+        __scan_models(connection, user_name, ai_model_type_string)
+        rows = connection.execute(
+            'SELECT name FROM models WHERE user_name = ? AND model_type = ? ORDER BY name LIMIT ? OFFSET ?',
+            (user_name, ai_model_type_string, -1 if limit is None else limit, offset)).fetchall()
+
+    return [name for name, in rows]
+
+def get_latest_model_version(user_name, ai_model_type_string, base_name):
+    """
+    Самая новая версия модели: имя версии - <base_name>_<дата-время обучения>, имя сравнивается целиком.
+
+    :return: Словарь с именем, путем, размером, временем создания и метриками версии, либо None
+    """
+    with __connect() as connection:
+        __scan_models(connection, user_name, ai_model_type_string)
+        row = connection.execute(
+            '''SELECT name, path, size, created_at, metrics FROM models
+               WHERE user_name = ? AND model_type = ? AND base_name = ? AND version_time IS NOT NULL
+               ORDER BY version_time DESC LIMIT 1''',
+            (user_name, ai_model_type_string, base_name)).fetchone()
+
+    if row is None:
+        return None
+
+    name, path, size, created_at, metrics = row
+    return {'name': name, 'path': path, 'size': size, 'created_at': created_at, 'metrics': json.loads(metrics) if metrics else None}
+
+def __add_dataset(connection, user_name, name, dataset_path, is_extracted):
+    zip_file_path = dataset_files_service.get_zip_file_path(dataset_path)
+    connection.execute(
+        '''INSERT OR REPLACE INTO datasets (user_name, name, path, size, is_extracted, created_at)
+           VALUES (?, ?, ?, ?, ?, ?)''',
+        (user_name, name, dataset_path, __get_size(zip_file_path), int(is_extracted), __get_created_at(zip_file_path)))
+
+def __add_model(connection, user_name, ai_model_type_string, name, model_path, metrics):
+    base_name, version_time = __split_version(name)
+    zip_file_path = f'{model_path}.zip'
+    connection.execute(
+        '''INSERT OR REPLACE INTO models (user_name, model_type, name, base_name, version_time, path, size, created_at, metrics)
+           VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)''',
+        (user_name, ai_model_type_string, name, base_name, version_time, model_path,
+         __get_size(zip_file_path), __get_created_at(zip_file_path), json.dumps(metrics) if metrics else None))
+
+def __scan_datasets(connection, user_name):
+    datasets_folder_path = config_paths.get_datasets_folder_path(user_name)
+    if not __mark_scanned(connection, datasets_folder_path):
+        return
+
+    for item in os.listdir(datasets_folder_path) if os.path.isdir(datasets_folder_path) else []:
+        item_path = os.path.join(datasets_folder_path, item)
+        if os.path.isdir(item_path) and not item.endswith('.cache'):
+            __add_dataset(connection, user_name, item, item_path, True)
+        elif item.endswith('.zip') and dataset_files_service.is_zip_only(item_path[:-len('.zip')]):
+            __add_dataset(connection, user_name, item[:-len('.zip')], item_path[:-len('.zip')], False)
+
+def __scan_models(connection, user_name, ai_model_type_string):
+    models_folder_path = config_paths.get_models_folder_path(user_name, ai_model_type_string)
+    if not __mark_scanned(connection, models_folder_path):
+        return
+
+    for item in os.listdir(models_folder_path) if os.path.isdir(models_folder_path) else []:
+        item_path = os.path.join(models_folder_path, item)
+        if os.path.isdir(item_path):
+            __add_model(connection, user_name, ai_model_type_string, item, item_path, None)
+
+def __mark_scanned(connection, folder_path):
+    # Возвращает True, если папка еще не сканировалась
+    cursor = connection.execute('INSERT OR IGNORE INTO scanned_folders (path) VALUES (?)', (os.path.normpath(folder_path),))
+    return cursor.rowcount > 0
+
+def __split_version(name):
+    # Версия без корректного времени обучения (например, загруженная архивом модель) не участвует в поиске последней версии
+    base_name, _, version_time = name.rpartition('_')
+    try:
+        datetime.strptime(version_time, __version_time_format)
+    except ValueError:
+        return name, None
+
+    return base_name, version_time
+
+def __get_size(file_path):
+    return os.path.getsize(file_path) if os.path.isfile(file_path) else None
+
+def __get_created_at(file_path):
+    time = os.path.getmtime(file_path) if os.path.isfile(file_path) else datetime.now().timestamp()
+    return datetime.fromtimestamp(time).isoformat(timespec='seconds')
+
+@contextmanager
+def __connect():
+    registry_path = config_paths.get_registry_path()
+    os.makedirs(os.path.dirname(registry_path), exist_ok=True)
+
+    connection = sqlite3.connect(registry_path, timeout=30)
+    try:
+        __create_schema(connection, registry_path)
+        with connection:
+            yield connection
+    finally:
+        connection.close()
+
+def __create_schema(connection, registry_path):
+    with __schema_lock:
+        if registry_path in __schema_paths:
+            return
+
+        with connection:
+            connection.execute('''
+                CREATE TABLE IF NOT EXISTS datasets (
+                    user_name TEXT NOT NULL,
+                    name TEXT NOT NULL,
+                    path TEXT NOT NULL,
+                    size INTEGER,
+                    is_extracted INTEGER NOT NULL,
+                    created_at TEXT NOT NULL,
+                    PRIMARY KEY (user_name, name))''')
+            connection.execute('''
+                CREATE TABLE IF NOT EXISTS models (
+                    user_name TEXT NOT NULL,
+                    model_type TEXT NOT NULL,
+                    name TEXT NOT NULL,
+                    base_name TEXT NOT NULL,
+                    version_time TEXT,
+                    path TEXT NOT NULL,
+                    size INTEGER,
+                    created_at TEXT NOT NULL,
+                    metrics TEXT,
+                    PRIMARY KEY (user_name, model_type, name))''')
+            connection.execute('''
+                CREATE INDEX IF NOT EXISTS models_latest_version
+                ON models (user_name, model_type, base_name, version_time)''')
+            connection.execute('CREATE TABLE IF NOT EXISTS scanned_folders (path TEXT PRIMARY KEY)')
+        __schema_paths.add(registry_path)
@@ -1,25 +1,168 @@
 import os
 import json
+import time
+import threading
+from dataclasses import dataclass, fields
 from application import config_paths
 
+# Настройки читаются из appsettings.<ENVIRONMENT>.json один раз в неизменяемый объект Settings.
+# Файл перечитывается, только если изменилось время его изменения (проверяется не чаще раза в секунду).
+# Любое значение переопределяется переменной окружения AI_SERVER__<Секция>__<Ключ>,
+# например AI_SERVER__JobsConfiguration__MaxWorkers=4. Для потоков 0 означает значение по умолчанию
+__environment_prefix = 'AI_SERVER__'
+__reload_check_interval = 1.0
+
+@dataclass(frozen=True)
+class StorageConfiguration:
+    datasets_path: str
+    models_path: str
+    workspaces_path: str
+    blobs_path: str
+    registry_path: str
+
+@dataclass(frozen=True)
+class DatasetsConfiguration:
+    zip_member_cache_megabytes: int = 256
+
+@dataclass(frozen=True)
+class JobsConfiguration:
+    max_workers: int = 2
+    finished_jobs_ttl_minutes: int = 1440
+    max_finished_jobs: int = 1000
+
+@dataclass(frozen=True)
+class InferenceConfiguration:
+    model_cache_max_megabytes: int = 2048
+    max_batch_size: int = 64
+    max_batch_wait_milliseconds: int = 5
+
+@dataclass(frozen=True)
+class ThreadsConfiguration:
+    io_threads: int = 0
+    tensorflow_intra_op_threads: int = 0
+    tensorflow_inter_op_threads: int = 0
+
+@dataclass(frozen=True)
+class Settings:
+    storage: StorageConfiguration
+    datasets: DatasetsConfiguration
+    jobs: JobsConfiguration
+    inference: InferenceConfiguration
+    threads: ThreadsConfiguration
+
+__lock = threading.Lock()
+__cache = {}
+
+def get_settings():
+    """
+    Текущие настройки среды выполнения.
+
+    :return: Settings
+    """
+    config_file_name, config_path = __get_config_path()
+    now = time.monotonic()
+
+    cached = __cache.get(config_path)
+    if cached is not None and now - cached[0] < __reload_check_interval:
+        return cached[2]
+
+    with __lock:
+        try:
+            mtime_ns = os.stat(config_path).st_mtime_ns
+        except FileNotFoundError:
+            raise Exception(f'Не найден файл конфигурации {config_file_name}: {config_path}')
+
+        cached = __cache.get(config_path)
+        if cached is None or cached[1] != mtime_ns:
+            cached = (now, mtime_ns, __load_settings(config_path))
+        else:
+            cached = (now, mtime_ns, cached[2])
+        __cache[config_path] = cached
+
+    return cached[2]
+
 def get_storage_configuration_datasets_path():
-    config = __get_config()
-    return config['StorageConfiguration']['DatasetsPath']
+    return get_settings().storage.datasets_path
 
 def get_storage_configuration_models_path():
-    config = __get_config()
-    return config['StorageConfiguration']['ModelsPath']
+    return get_settings().storage.models_path
+
+def get_storage_configuration_workspaces_path():
+    return get_settings().storage.workspaces_path
+
+def get_storage_configuration_blobs_path():
+    return get_settings().storage.blobs_path
+
+def get_storage_configuration_registry_path():
+    return get_settings().storage.registry_path
+
+def get_datasets_configuration_zip_member_cache_megabytes():
+    return get_settings().datasets.zip_member_cache_megabytes
 
-def __get_config():
+def get_jobs_configuration_max_workers():
+    return get_settings().jobs.max_workers
+
+def get_jobs_configuration_finished_jobs_ttl_minutes():
+    return get_settings().jobs.finished_jobs_ttl_minutes
+
+def get_jobs_configuration_max_finished_jobs():
+    return get_settings().jobs.max_finished_jobs
+
+def get_inference_configuration_model_cache_max_megabytes():
+    return get_settings().inference.model_cache_max_megabytes
+
+def get_inference_configuration_max_batch_size():
+    return get_settings().inference.max_batch_size
+
+def get_inference_configuration_max_batch_wait_milliseconds():
+    return get_settings().inference.max_batch_wait_milliseconds
+
+def get_threads_configuration_io_threads():
+    # None - количество потоков выбирает ThreadPoolExecutor
+    return get_settings().threads.io_threads or None
+
+def get_threads_configuration_tensorflow_intra_op_threads():
+    return get_settings().threads.tensorflow_intra_op_threads
+
+def get_threads_configuration_tensorflow_inter_op_threads():
+    return get_settings().threads.tensorflow_inter_op_threads
+
+def __get_config_path():
     # Определяем переменную окружения, которая содержит среду выполнения
     environment = os.getenv('ENVIRONMENT', 'Development')
-    
+
     # Формируем путь до нужного конфигурационного файла
     config_file_name = f'configurations/appsettings.{environment}.json'
-    config_path = f'{config_paths.get_root_path()}/{config_file_name}'
-    
-    try:
-        with open(config_path, 'r') as file:
-            return json.load(file)
-    except FileNotFoundError:
-        raise Exception(f'Не найден файл конфигурации {config_file_name}: {config_path}')
\ No newline at end of file
+    return config_file_name, f'{config_paths.get_root_path()}/{config_file_name}'
+
+def __load_settings(config_path):
+    with open(config_path, 'r') as file:
+        config = json.load(file)
+
+    sections = {}
+    for settings_field in fields(Settings):
+        section_type = settings_field.type
+        section_name = section_type.__name__
+        section = config.get(section_name, {})
+
+        values = {}
+        for field in fields(section_type):
+            key = __to_camel_case(field.name)
+            value = os.getenv(f'{__environment_prefix}{section_name}__{key}', section.get(key))
+            if value is None:
+                continue
+
+            try:
+                values[field.name] = field.type(value)
+            except ValueError:
+                raise Exception(f'Некорректное значение настройки {section_name}.{key}: {value}')
+
+        try:
+            sections[settings_field.name] = section_type(**values)
+        except TypeError as e:
+            raise Exception(f'Не заданы обязательные настройки секции {section_name}: {e}')
+
+    return Settings(**sections)
+
+def __to_camel_case(name):
+    return ''.join(part.capitalize() for part in name.split('_'))
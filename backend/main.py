@@ -23,6 +23,8 @@ def create_app():
             {"name": "2.2 Обучение сверточной модели нейронной сети (CNN)"},
             {"name": "3. Дополнительные действия с dataset'ами"},
             {"name": "4. Дополнительные действия с моделями"},
+            {"name": "5. Задачи обучения"},
+            {"name": "6. Предсказание"},
         ]
     }
 
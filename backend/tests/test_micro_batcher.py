@@ -0,0 +1,117 @@
+import time
+import threading
+import unittest
+
+import numpy as np
+
+from application.inference.MicroBatcher import MicroBatcher
+
+class FakeModel:
+    # Удваивает входы и запоминает размеры батчей. Пока gate закрыт, первый батч не завершается,
+    # и следующие запросы гарантированно успевают встать в очередь
+    def __init__(self):
+        self.batch_sizes = []
+        self.started = threading.Event()
+        self.gate = threading.Event()
+
+    def predict(self, inputs):
+        self.started.set()
+        self.gate.wait(timeout=5)
+        self.batch_sizes.append(len(inputs))
+        return inputs * 2
+
+class MicroBatcherTests(unittest.TestCase):
+    def setUp(self):
+        self.model = FakeModel()
+
+    def test_slices_results_of_merged_requests(self):
+        batcher = self.__create_batcher(max_batch_size=10)
+        blocker = self.__predict_async(batcher, self.__inputs(1, start=100))
+        self.__wait_for_batch_start()
+
+        requests = [self.__inputs(size, start=size * 10) for size in (1, 2, 3)]
+        results = [self.__predict_async(batcher, inputs) for inputs in requests]
+        self.__wait_for_queue(batcher, len(requests))
+        self.model.gate.set()
+
+        for inputs, result in zip(requests, results):
+            np.testing.assert_array_equal(result(), inputs * 2)
+        blocker()
+
+        self.assertEqual(self.model.batch_sizes, [1, 6])
+        batcher.close()
+
+    def test_carries_oversized_request_to_next_batch(self):
+        batcher = self.__create_batcher(max_batch_size=4)
+        blocker = self.__predict_async(batcher, self.__inputs(1))
+        self.__wait_for_batch_start()
+
+        first = self.__predict_async(batcher, self.__inputs(3, start=10))
+        self.__wait_for_queue(batcher, 1)
+        second = self.__predict_async(batcher, self.__inputs(2, start=20))
+        self.__wait_for_queue(batcher, 2)
+        self.model.gate.set()
+
+        np.testing.assert_array_equal(first(), self.__inputs(3, start=10) * 2)
+        np.testing.assert_array_equal(second(), self.__inputs(2, start=20) * 2)
+        blocker()
+
+        self.assertEqual(self.model.batch_sizes, [1, 3, 2])
+        batcher.close()
+
+    def test_close_drains_queued_requests(self):
+        batcher = self.__create_batcher(max_batch_size=2)
+        blocker = self.__predict_async(batcher, self.__inputs(2))
+        self.__wait_for_batch_start()
+
+        results = [self.__predict_async(batcher, self.__inputs(2, start=start)) for start in (10, 20)]
+        self.__wait_for_queue(batcher, 2)
+        batcher.close()
+        self.model.gate.set()
+
+        blocker()
+        for start, result in zip((10, 20), results):
+            np.testing.assert_array_equal(result(), self.__inputs(2, start=start) * 2)
+
+        batcher.worker.join(timeout=5)
+        self.assertFalse(batcher.worker.is_alive())
+        self.assertEqual(batcher.get_metrics()['requests'], 3)
+
+        # После закрытия запрос выполняется сразу, без очереди
+        np.testing.assert_array_equal(batcher.predict(self.__inputs(1)), self.__inputs(1) * 2)
+
+    def __create_batcher(self, max_batch_size):
+        # Следующие батчи собираются из того, что уже стоит в очереди: время ожидания их запросов истекло
+        return MicroBatcher(self.model.predict, max_batch_size=max_batch_size, max_wait_ms=200, name='test')
+
+    def __predict_async(self, batcher, inputs):
+        result = {}
+
+        def predict():
+            result['outputs'] = batcher.predict(inputs)
+
+        thread = threading.Thread(target=predict, daemon=True)
+        thread.start()
+
+        def get_result():
+            thread.join(timeout=5)
+            self.assertFalse(thread.is_alive(), 'Prediction did not finish')
+            return result['outputs']
+
+        return get_result
+
+    def __wait_for_batch_start(self):
+        # Поток-обработчик собрал первый батч и ждет FakeModel
+        self.assertTrue(self.model.started.wait(timeout=5), 'Batch was not started')
+
+    def __wait_for_queue(self, batcher, size):
+        deadline = time.perf_counter() + 5
+        while batcher.requests.qsize() != size:
+            self.assertLess(time.perf_counter(), deadline, 'Requests were not queued')
+            time.sleep(0.005)
+
+    def __inputs(self, size, start=0):
+        return np.arange(start, start + size, dtype=np.float32).reshape(size, 1)
+
+if __name__ == '__main__':
+    unittest.main()
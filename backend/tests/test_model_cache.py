@@ -0,0 +1,59 @@
+import time
+import threading
+import unittest
+from concurrent.futures import ThreadPoolExecutor
+
+from application.inference.ModelCache import ModelCache
+
+class ModelCacheTests(unittest.TestCase):
+    def test_evicts_least_recently_used(self):
+        evicted = []
+        cache = ModelCache(max_bytes=3, on_evict=evicted.append)
+
+        for key in ('a', 'b', 'c'):
+            cache.get(key, lambda key=key: (key, 1))
+
+        # Обращение к a делает её последней использованной, поэтому первой вытесняется b
+        cache.get('a', self.__fail_loader)
+        cache.get('d', lambda: ('d', 1))
+        cache.get('e', lambda: ('e', 1))
+
+        self.assertEqual(evicted, ['b', 'c'])
+        self.assertEqual(cache.get_values(), ['a', 'd', 'e'])
+        self.assertEqual(cache.get_stats()['bytes'], 3)
+
+    def test_keeps_last_model_larger_than_limit(self):
+        evicted = []
+        cache = ModelCache(max_bytes=10, on_evict=evicted.append)
+
+        cache.get('small', lambda: ('small', 5))
+        cache.get('large', lambda: ('large', 50))
+
+        self.assertEqual(evicted, ['small'])
+        self.assertEqual(cache.get_values(), ['large'])
+
+    def test_loads_each_key_once_under_concurrency(self):
+        loads = []
+        loads_lock = threading.Lock()
+
+        def loader():
+            with loads_lock:
+                loads.append(1)
+            time.sleep(0.05)
+            return object(), 1
+
+        cache = ModelCache(max_bytes=100)
+        with ThreadPoolExecutor(max_workers=8) as executor:
+            values = list(executor.map(lambda _: cache.get('model', loader), range(8)))
+
+        self.assertEqual(len(loads), 1)
+        self.assertTrue(all(value is values[0] for value in values))
+
+        stats = cache.get_stats()
+        self.assertEqual((stats['misses'], stats['hits']), (1, 7))
+
+    def __fail_loader(self):
+        raise AssertionError('Model must be taken from the cache')
+
+if __name__ == '__main__':
+    unittest.main()
@@ -57,26 +57,73 @@ def save_and_extract_dataset():
         type: string
         required: true
         description: Имя пользователя.
+      - name: build_lnn_cache
+        in: query
+        type: string
+        enum: ['no', 'yes']
+        default: 'no'
+        required: false
+        description: Собрать бинарный кэш признаков LNN датасета, чтобы обучение не разбирало .txt файлы заново
+      - name: cnn_tfrecords_img_size
+        in: query
+        type: integer
+        minimum: 1
+        required: false
+        description: Собрать шарды TFRecord с изображениями, уже приведенными к этому размеру. Обучение CNN с тем же img_size не будет декодировать .jpg файлы заново
+      - name: extract
+        in: query
+        type: string
+        enum: ['yes', 'no']
+        default: 'yes'
+        required: false
+        description: Распаковать архив. При 'no' датасет хранится только архивом, обучение читает файлы прямо из него без распакованной копии на диске (обучение YOLOv5 распаковывает архив во временную рабочую папку задачи)
       - name: file
         in: formData
         type: file
-        required: true
+        required: false
         description: Файл для загрузки.
+      - name: filename
+        in: query
+        type: string
+        required: false
+        description: Имя архива, если он передается телом запроса (Content-Type application/zip) без multipart. Так архив сразу пишется на диск без промежуточной копии
+      - name: sha256
+        in: query
+        type: string
+        required: false
+        description: sha256 архива. Если такой архив уже хранится на сервере (у любого пользователя), он не передается повторно - достаточно указать filename без тела запроса. Иначе хэш загруженного архива сверяется с этим значением
     """
     user_name = request.args.get('user_name')
     if not user_name:
         return jsonify({'message': 'user_name is required'}), 400
     
-    if 'file' not in request.files:
+    # Архив в теле запроса читается из потока напрямую, multipart-файл - из временного файла Flask
+    if request.mimetype in ('application/zip', 'application/octet-stream'):
+      zip_stream = request.stream
+      filename = request.args.get('filename', '')
+    elif 'file' in request.files:
+      zip_stream = request.files['file'].stream
+      filename = request.files['file'].filename
+    elif request.args.get('sha256'):
+      # Архив уже хранится на сервере и передается только хэшем
+      zip_stream = None
+      filename = request.args.get('filename', '')
+    else:
       return jsonify({'error': 'No zip file provided'}), 400
 
-    zip_file = request.files['file']
-    filename = zip_file.filename
-
     if not filename.endswith('.zip'):
         return jsonify({'error': 'Invalid file type. Only ZIP archives are allowed'}), 400
+
+    if os.path.basename(filename) != filename:
+        return jsonify({'error': 'Invalid file name'}), 400
     
-    result = data_storage_services.create_dataset_zip(user_name, filename.replace('.zip', ''), zip_file)
+    build_lnn_cache = request.args.get('build_lnn_cache') == 'yes'
+    cnn_tfrecords_img_size = request.args.get('cnn_tfrecords_img_size', type=int)
+    extract = request.args.get('extract') != 'no'
+    sha256 = request.args.get('sha256')
+
+    result = data_storage_services.create_dataset_zip(
+        user_name, filename.replace('.zip', ''), zip_stream, build_lnn_cache, cnn_tfrecords_img_size, extract, sha256)
     if result.isSuccess:
       return jsonify({'message': f'{result.result}'}), 200
     
@@ -100,11 +147,26 @@ def get_names(user_name):
         type: string
         required: true
         description: Имя датасета.
+      - name: offset
+        in: query
+        type: integer
+        minimum: 0
+        default: 0
+        required: false
+        description: Количество пропускаемых имен (имена отсортированы по алфавиту).
+      - name: limit
+        in: query
+        type: integer
+        minimum: 1
+        required: false
+        description: Размер страницы. Без параметра возвращаются все имена.
     """
     if not user_name:
         return jsonify({'message': 'user_name is required'}), 404
 
-    result = data_storage_services.get_dataset_names(user_name)
+    offset = max(request.args.get('offset', 0, type=int), 0)
+    limit = request.args.get('limit', type=int)
+    result = data_storage_services.get_dataset_names(user_name, offset, limit)
     if result.isSuccess:
       return jsonify({'message': f'{result.result}'}), 200
     
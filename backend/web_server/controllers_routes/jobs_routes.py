@@ -0,0 +1,91 @@
+import os
+from flask import Blueprint, jsonify, send_file
+
+from application.jobs import job_queue
+from application.jobs.Job import Job_Status
+
+jobs_bp = Blueprint(
+    'jobs',
+    __name__,
+    url_prefix='/api/jobs'
+)
+
+@jobs_bp.route('/<string:job_id>', methods=['GET'])
+def get_job(job_id):
+    """
+    Получение статуса и прогресса задачи обучения.
+    ---
+    tags:
+      - 5. Задачи обучения
+    parameters:
+      - name: job_id
+        in: path
+        type: string
+        required: true
+        description: Идентификатор задачи, полученный при запуске обучения.
+    responses:
+      200:
+        description: Состояние задачи.
+        schema:
+          type: object
+          properties:
+            job_id:
+              type: string
+            job_type:
+              type: string
+            status:
+              type: string
+              enum: ['queued', 'running', 'succeeded', 'failed']
+            progress:
+              type: number
+              description: Доля выполненной работы от 0 до 1
+            message:
+              type: string
+            errors:
+              type: string
+      404:
+        description: Задача не найдена. Задачи хранятся в памяти сервера - после его перезапуска, а также через FinishedJobsTtlMinutes после завершения они забываются
+    """
+    result = job_queue.get_job(job_id)
+    if not result.isSuccess:
+      return jsonify({'message': f'{result.errors}'}), 404
+
+    return jsonify(result.result.to_dict()), 200
+
+@jobs_bp.route('/<string:job_id>/artifact', methods=['GET'])
+def get_job_artifact(job_id):
+    """
+    Скачивание zip-архива модели, обученной в рамках задачи.
+    ---
+    tags:
+      - 5. Задачи обучения
+    parameters:
+      - name: job_id
+        in: path
+        type: string
+        required: true
+        description: Идентификатор задачи, полученный при запуске обучения.
+    responses:
+      200:
+        description: Zip-архив обученной модели.
+      404:
+        description: Задача не найдена. Задачи хранятся в памяти сервера - после его перезапуска, а также через FinishedJobsTtlMinutes после завершения они забываются
+      409:
+        description: Задача еще не завершена или завершилась с ошибкой.
+    """
+    result = job_queue.get_job(job_id)
+    if not result.isSuccess:
+      return jsonify({'message': f'{result.errors}'}), 404
+
+    job = result.result
+    if job.status == Job_Status.Failed:
+      return jsonify({'message': f'Job failed: {job.errors}'}), 409
+
+    if job.status != Job_Status.Succeeded:
+      return jsonify({'message': f'Job is {job.status.value}'}), 409
+
+    return send_file(
+      job.artifact_path,
+      mimetype='application/zip',
+      as_attachment=True,
+      download_name=os.path.basename(job.artifact_path))
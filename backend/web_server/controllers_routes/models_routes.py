@@ -74,7 +74,7 @@ def save_and_extract_model():
     if not filename.endswith('.zip'):
         return jsonify({'error': 'Invalid file type. Only ZIP archives are allowed'}), 400
     
-    result = data_storage_services.create_model_zip(user_name, model_type, filename.replace('.zip', ''), zip_file)
+    result = data_storage_services.create_model_zip(user_name, model_type, filename.replace('.zip', ''), zip_file.stream)
     if result.isSuccess:
       return jsonify({'message': f'{result.result}'}), 200
     
@@ -100,6 +100,19 @@ def get_names(user_name, model_type):
         default: 0
         required: true
         description: Тип обученной модели. 0 - CNN, 1 - LNN
+      - name: offset
+        in: query
+        type: integer
+        minimum: 0
+        default: 0
+        required: false
+        description: Количество пропускаемых имен (имена отсортированы по алфавиту).
+      - name: limit
+        in: query
+        type: integer
+        minimum: 1
+        required: false
+        description: Размер страницы. Без параметра возвращаются все имена.
     """
     if not user_name:
         return jsonify({'message': 'user_name is required'}), 404
@@ -111,7 +124,9 @@ def get_names(user_name, model_type):
     if not is_valid:
        return jsonify({'message': 'Model type is not valid'}), 404
 
-    result = data_storage_services.get_model_names(user_name, model_type)
+    offset = max(request.args.get('offset', 0, type=int), 0)
+    limit = request.args.get('limit', type=int)
+    result = data_storage_services.get_model_names(user_name, model_type, offset, limit)
     if result.isSuccess:
       return jsonify({'message': f'{result.result}'}), 200
     
@@ -0,0 +1,282 @@
+import os
+import zipfile
+import time
+from flask import Blueprint, request, jsonify, Response, stream_with_context
+
+from application.ai_models.ai_models import AI_Model_Type
+from application.results.Result import Result
+from application.services.lnn_samples_reader import parse_sample
+from application import config_paths
+import application.inference.inference_service as inference_service
+import application.inference.bulk_inference_service as bulk_inference_service
+from application.services import dataset_files_service
+
+predict_bp = Blueprint(
+    'predict',
+    __name__,
+    url_prefix='/api/predict'
+)
+
+@predict_bp.route('/<string:user_name>/<int:model_type>/<string:model_name>', methods=['POST'])
+def predict(user_name, model_type, model_name):
+    """
+    Предсказание сохраненной модели. Модель загружается при первом запросе и хранится в памяти сервера.
+    ---
+    tags:
+      - 6. Предсказание
+    consumes:
+      - multipart/form-data
+      - application/json
+    parameters:
+      - name: user_name
+        in: path
+        type: string
+        required: true
+        description: Имя пользователя.
+      - name: model_type
+        in: path
+        type: integer
+        enum: [0, 1]
+        required: true
+        description: Тип обученной модели. 0 - CNN, 1 - linear
+      - name: model_name
+        in: path
+        type: string
+        required: true
+        description: Имя сохраненной модели (версии), например Model_2024-01-01-00-00-00.
+      - name: files
+        in: formData
+        type: file
+        required: false
+        description: Изображения для CNN, либо .txt файлы для LNN (одно число в строке). Можно передать несколько файлов.
+      - name: body
+        in: body
+        required: false
+        description: Для LNN вместо файлов можно передать JSON с векторами признаков.
+        schema:
+          type: object
+          properties:
+            samples:
+              type: array
+              items:
+                type: array
+                items:
+                  type: number
+              example: [[0.1, 0.5, 0.3]]
+    responses:
+      200:
+        description: Предсказания в порядке переданных примеров.
+        schema:
+          type: object
+          properties:
+            model:
+              type: string
+            predictions:
+              type: array
+              items:
+                type: object
+                properties:
+                  class:
+                    type: string
+                  class_index:
+                    type: integer
+                  probabilities:
+                    type: object
+            inference_ms:
+              type: number
+              description: Время предобработки и предсказания в миллисекундах.
+      400:
+        description: Ошибка валидации.
+      404:
+        description: Модель не найдена.
+    """
+    is_valid, _ = AI_Model_Type.convert_to_string_try_get(model_type)
+    if not is_valid:
+        return jsonify({'message': 'Model type is not valid'}), 404
+
+    start_time = time.perf_counter()
+
+    model_result = inference_service.get_model(user_name, model_type, model_name)
+    if not model_result.isSuccess:
+        return jsonify({'error': model_result.errors}), 404
+
+    files = request.files.getlist('files')
+    if model_type == AI_Model_Type.CNN:
+        result = inference_service.predict_images(model_result.result, [file.read() for file in files])
+    else:
+        samples_result = __get_lnn_samples(files)
+        if not samples_result.isSuccess:
+            return jsonify({'error': samples_result.errors}), 400
+
+        result = inference_service.predict_samples(model_result.result, samples_result.result)
+
+    if not result.isSuccess:
+        return jsonify({'error': result.errors}), 400
+
+    return jsonify({
+        'model': model_name,
+        'predictions': result.result,
+        'inference_ms': round((time.perf_counter() - start_time) * 1000, 3)
+    }), 200
+
+@predict_bp.route('/<string:user_name>/<int:model_type>/<string:model_name>/bulk', methods=['POST'])
+def predict_bulk(user_name, model_type, model_name):
+    """
+    Предсказание для всего датасета: ZIP-архива или уже загруженного dataset'а пользователя.
+    Результаты отдаются потоком по мере вычисления, память сервера не зависит от размера датасета.
+    ---
+    tags:
+      - 6. Предсказание
+    consumes:
+      - multipart/form-data
+    parameters:
+      - name: user_name
+        in: path
+        type: string
+        required: true
+        description: Имя пользователя.
+      - name: model_type
+        in: path
+        type: integer
+        enum: [0, 1]
+        required: true
+        description: Тип обученной модели. 0 - CNN, 1 - linear
+      - name: model_name
+        in: path
+        type: string
+        required: true
+        description: Имя сохраненной модели (версии).
+      - name: file
+        in: formData
+        type: file
+        required: false
+        description: ZIP-архив с изображениями (CNN) или .txt файлами (LNN).
+      - name: dataset_name
+        in: formData
+        type: string
+        required: false
+        description: Имя загруженного dataset'а, если архив не передан.
+      - name: format
+        in: formData
+        type: string
+        enum: [ndjson, csv]
+        default: ndjson
+        required: false
+        description: Формат ответа. ndjson - одна JSON строка на файл, csv - таблица с вероятностями классов.
+      - name: chunk_size
+        in: formData
+        type: integer
+        default: 256
+        required: false
+        description: Количество примеров в одном проходе сети.
+    responses:
+      200:
+        description: Поток предсказаний. Для файлов, которые не удалось прочитать, заполняется поле error.
+      400:
+        description: Ошибка валидации.
+      404:
+        description: Модель или dataset не найдены.
+    """
+    is_valid, _ = AI_Model_Type.convert_to_string_try_get(model_type)
+    if not is_valid:
+        return jsonify({'message': 'Model type is not valid'}), 404
+
+    output_format = request.form.get('format', bulk_inference_service.FORMAT_NDJSON)
+    if output_format not in (bulk_inference_service.FORMAT_NDJSON, bulk_inference_service.FORMAT_CSV):
+        return jsonify({'error': 'Invalid format. Use ndjson or csv'}), 400
+
+    try:
+        chunk_size = int(request.form.get('chunk_size', 256))
+    except ValueError:
+        return jsonify({'error': 'chunk_size must be an integer'}), 400
+    if chunk_size <= 0:
+        return jsonify({'error': 'chunk_size must be positive'}), 400
+
+    model_result = inference_service.get_model(user_name, model_type, model_name)
+    if not model_result.isSuccess:
+        return jsonify({'error': model_result.errors}), 404
+
+    extensions = bulk_inference_service.get_extensions(model_type)
+    if 'file' in request.files:
+        archive_result = bulk_inference_service.open_uploaded_zip(request.files['file'])
+        if not archive_result.isSuccess:
+            return jsonify({'error': archive_result.errors}), 400
+
+        archive_file, archive = archive_result.result
+        files = bulk_inference_service.iter_zip_files(archive_file, archive, extensions)
+    else:
+        dataset_name = request.form.get('dataset_name')
+        if not dataset_name:
+            return jsonify({'error': 'Provide a ZIP file or dataset_name'}), 400
+
+        dataset_path = config_paths.get_dataset_path(user_name, dataset_name)
+        if os.path.basename(dataset_name) != dataset_name:
+            return jsonify({'error': f'Dataset {dataset_name} is not exist'}), 404
+
+        if os.path.isdir(dataset_path):
+            files = bulk_inference_service.iter_folder_files(dataset_path, extensions)
+        elif dataset_files_service.is_zip_only(dataset_path):
+            # Датасет, загруженный без распаковки, читается прямо из архива
+            archive_file = open(dataset_files_service.get_zip_file_path(dataset_path), 'rb')
+            files = bulk_inference_service.iter_zip_files(archive_file, zipfile.ZipFile(archive_file), extensions)
+        else:
+            return jsonify({'error': f'Dataset {dataset_name} is not exist'}), 404
+
+    predictions = bulk_inference_service.stream_predictions(model_result.result, model_type, files, output_format, chunk_size)
+    mimetype = 'text/csv' if output_format == bulk_inference_service.FORMAT_CSV else 'application/x-ndjson'
+    return Response(stream_with_context(predictions), mimetype=mimetype)
+
+@predict_bp.route('/metrics', methods=['GET'])
+def get_metrics():
+    """
+    Метрики предсказаний: заполнение кэша моделей и микро-батчинг по каждой загруженной модели.
+    ---
+    tags:
+      - 6. Предсказание
+    responses:
+      200:
+        description: Успешная операция.
+        schema:
+          type: object
+          properties:
+            cache:
+              type: object
+              description: Количество и размер загруженных моделей, попадания и промахи кэша.
+            models:
+              type: array
+              items:
+                type: object
+                properties:
+                  model:
+                    type: string
+                  requests:
+                    type: integer
+                  batches:
+                    type: integer
+                  average_batch_size:
+                    type: number
+                    description: Среднее количество примеров в одном проходе сети.
+                  max_batch_size:
+                    type: integer
+                  average_queue_wait_ms:
+                    type: number
+                    description: Среднее время ожидания запроса в очереди.
+                  max_queue_wait_ms:
+                    type: number
+                  queue_size:
+                    type: integer
+    """
+    return jsonify(inference_service.get_metrics()), 200
+
+def __get_lnn_samples(files):
+    if files:
+        try:
+            return Result([parse_sample(file.read().decode('utf-8')) for file in files], None)
+        except (UnicodeDecodeError, ValueError) as e:
+            return Result(None, f'Error: Invalid LNN file: {e}')
+
+    body = request.get_json(silent=True)
+    if not isinstance(body, dict) or 'samples' not in body:
+        return Result(None, 'Error: Provide .txt files or JSON {"samples": [[...]]}')
+
+    return Result(body['samples'], None)
\ No newline at end of file
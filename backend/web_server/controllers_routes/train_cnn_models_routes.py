@@ -1,10 +1,10 @@
-import os
-from flask import Blueprint, abort, request, jsonify, send_file
+from flask import Blueprint, request, jsonify
 
 from application.ai_models.AiModelNameConverter import AiModelNameConverter
-from application.ai_model_trainers.cnn.CnnTrainerYolov5 import CnnTrainerYolov5
-from application.ai_models.AiModelNameConverter import AiModelNameConverter
-from application.ai_model_trainers.cnn.CnnTrainer import CNN_Trainer
+from application.jobs import job_queue, training_tasks
+from application.ai_models.ai_models import AI_Model_Type
+from application.ai_model_trainers.warm_start import resolve_warm_start
+from application.ai_model_trainers import tflite_export
 
 train_cnn_models_bp = Blueprint(
     'train-cnn-model',
@@ -88,6 +88,13 @@ def train_model():
         maximum: 100
         required: true
         description: Процентное соотношение проверочной выборки от общего набора данных
+      - name: cache
+        in: formData
+        type: string
+        enum: ['none', 'memory', 'disk']
+        default: 'none'
+        required: false
+        description: Кэш декодированных изображений между эпохами. memory - в оперативной памяти, disk - во временных файлах рядом с датасетом. Скорость конвейера и обучения (изображений в секунду) сохраняется в input_pipeline.json модели
       - name: user_name
         in: formData
         type: string
@@ -103,9 +110,21 @@ def train_model():
         type: string
         required: true
         description: Имя для обучаемой модели
+      - name: warm_start
+        in: formData
+        type: string
+        required: false
+        description: Начать обучение с весов сохраненной модели. latest - самая новая версия модели с именем trained_model_name, либо имя версии (например, model_2024-01-01-12-00-00). Если архитектура не совпадает, обучение начинается со случайных весов
+      - name: tflite_quantization
+        in: formData
+        type: string
+        enum: ['none', 'float16', 'int8']
+        default: 'none'
+        required: false
+        description: Квантование TFLite модели, которая сохраняется рядом с .h5 и используется сервером для предсказаний. int8 калибруется по примерам обучающей выборки. Размер, время загрузки и задержка обоих форматов сохраняются в export_report.json модели
     responses:
-      200:
-        description: Model training parameters received
+      202:
+        description: Задача обучения поставлена в очередь. Статус - GET /api/jobs/{job_id}, модель - GET /api/jobs/{job_id}/artifact
     """
     if request.method != 'POST':
       return jsonify({'error': 'Invalid request method'}), 400
@@ -124,37 +143,49 @@ def train_model():
     trained_model_name = request.form.get('trained_model_name')
     train_percentage = int(request.form.get('train_percentage'))
     test_percentage = int(request.form.get('test_percentage'))
+    cache = request.form.get('cache', 'none')
+
+    if cache not in ('none', 'memory', 'disk'):
+       return jsonify({'error': 'cache must be one of: none, memory, disk'}), 400
+
+    tflite_quantization = request.form.get('tflite_quantization', tflite_export.QUANTIZATION_NONE)
+    if tflite_quantization not in tflite_export.QUANTIZATIONS:
+        return jsonify({'error': 'tflite_quantization must be one of: none, float16, int8'}), 400
 
     if (len(filters) != len(kernel_sizes) != len(pool_sizes)):
        return jsonify({'error': 'The length of "filters", "kernel_sizes" and "pool_sizes" must be the same.'}), 400 
 
-    try:
-      trainer = CNN_Trainer(
-         AiModelNameConverter.convert(ai_model.lower()),
-         img_size,
-         epochs,
-         batch_size,
-         filters,
-         kernel_sizes,
-         pool_sizes,
-         activations,
-         optimizer,
-         user_name,
-         dataset_name,
-         train_percentage,
-         test_percentage)
-      trained_model = trainer.train_and_save(trained_model_name)
+    # Версия для дообучения определяется сразу, чтобы задача не падала из-за несуществующей модели
+    warm_start_version = None
+    if request.form.get('warm_start'):
+        warm_start_result = resolve_warm_start(user_name, AI_Model_Type.CNN, trained_model_name, request.form.get('warm_start'))
+        if not warm_start_result.isSuccess:
+            return jsonify({'error': warm_start_result.errors}), 400
+        warm_start_version, _ = warm_start_result.result
 
-      if not trained_model.isSuccess:
-         return jsonify({'error': f'{trained_model.errors}'}), 400
+    job = job_queue.submit_job(
+      'train-cnn-model',
+      training_tasks.train_cnn_model,
+      trainer_kwargs={
+         'ai_model': AiModelNameConverter.convert(ai_model.lower()),
+         'img_size': img_size,
+         'epochs': epochs,
+         'batch_size': batch_size,
+         'filters': filters,
+         'kernel_sizes': kernel_sizes,
+         'pool_sizes': pool_sizes,
+         'activations': activations,
+         'optimizer': optimizer,
+         'user_name': user_name,
+         'dataset_name': dataset_name,
+         'train_percentage': train_percentage,
+         'test_percentage': test_percentage,
+         'cache': cache,
+         'warm_start_version': warm_start_version,
+         'tflite_quantization': tflite_quantization},
+      trained_model_name=trained_model_name)
 
-      return send_file(
-        trained_model.result,
-        mimetype='application/zip',
-        as_attachment=True,
-        download_name=os.path.basename(trained_model.result))
-    except Exception as ex:
-        abort(500, ex)
+    return jsonify({'job_id': job.id}), 202
 
 @train_cnn_models_bp.route('/train/yolo5', methods=['POST'])
 def train_model_yolo5():
@@ -207,21 +238,17 @@ def train_model_yolo5():
         description: Имя обученной модели
         example: "custom_trained_yolov5"
     responses:
-      200:
-        description: Модель успешно обучена
+      202:
+        description: Задача обучения поставлена в очередь
         content:
           application/json:
             schema:
               type: object
               properties:
-                status:
+                job_id:
                   type: string
-                  description: Статус операции
-                  example: "Success"
-                message:
-                  type: string
-                  description: Сообщение
-                  example: "Model trained successfully!"
+                  description: Идентификатор задачи. Статус - GET /api/jobs/{job_id}, модель - GET /api/jobs/{job_id}/artifact
+                  example: "3f1c2b7e9a5d4c0e8b6a1d2f3e4c5b6a"
     """
     if request.method != 'POST':
         return jsonify({'error': 'Invalid request method'}), 400
@@ -233,23 +260,16 @@ def train_model_yolo5():
     dataset_name = request.form.get('dataset_name')
     user_name = request.form.get('user_name').replace(" ", "_")
     trained_model_name = request.form.get('trained_model_name')
-    try:
-      trainer = CnnTrainerYolov5(
-          AiModelNameConverter.convert(ai_model.lower()),
-          img_size, 
-          batch_size, 
-          epochs, 
-          dataset_name, 
-          user_name)
-      trained_model = trainer.train(trained_model_name)
-
-      if not trained_model.isSuccess:
-         return jsonify({'error': f'{trained_model.errors}'}), 400
+    job = job_queue.submit_job(
+      'train-cnn-model-yolo5',
+      training_tasks.train_cnn_model_yolo5,
+      trainer_kwargs={
+          'ai_model': AiModelNameConverter.convert(ai_model.lower()),
+          'img_size': img_size,
+          'batch_size': batch_size,
+          'epochs_num': epochs,
+          'dataset_name': dataset_name,
+          'user_name': user_name},
+      trained_model_name=trained_model_name)
 
-      return send_file(
-        trained_model.result,
-        mimetype='application/zip',
-        as_attachment=True,
-        download_name=os.path.basename(trained_model.result))
-    except Exception as ex:
-        abort(500, ex)
\ No newline at end of file
+    return jsonify({'job_id': job.id}), 202
\ No newline at end of file
@@ -1,9 +1,10 @@
-import os
-from flask import Blueprint, abort, request, jsonify, send_file
+from flask import Blueprint, request, jsonify
 
-from application.ai_model_trainers.lnn.LnnOptimizeTrainer import LnnOptimizeTrainer
 from application.ai_models.AiModelNameConverter import AiModelNameConverter
-from application.ai_model_trainers.lnn.LnnTrainer import LNN_Trainer
+from application.jobs import job_queue, training_tasks
+from application.ai_models.ai_models import AI_Model_Type
+from application.ai_model_trainers.warm_start import resolve_warm_start
+from application.ai_model_trainers import tflite_export
 
 train_lnn_models_bp = Blueprint(
     'train-lnn-model',
@@ -92,9 +93,21 @@ def train_model():
         enum: ['no', 'yes']
         required: true
         description: Стоит ли создавать приложение по обученной модели
+      - name: warm_start
+        in: formData
+        type: string
+        required: false
+        description: Начать обучение с весов сохраненной модели. latest - самая новая версия модели с именем trained_model_name, либо имя версии (например, model_2024-01-01-12-00-00). Если архитектура не совпадает, обучение начинается со случайных весов
+      - name: tflite_quantization
+        in: formData
+        type: string
+        enum: ['none', 'float16', 'int8']
+        default: 'none'
+        required: false
+        description: Квантование TFLite модели, которая сохраняется рядом с .h5 и используется сервером для предсказаний. int8 калибруется по примерам обучающей выборки. Размер, время загрузки и задержка обоих форматов сохраняются в export_report.json модели
     responses:
-      200:
-        description: Model training parameters received
+      202:
+        description: Задача обучения поставлена в очередь. Статус - GET /api/jobs/{job_id}, модель - GET /api/jobs/{job_id}/artifact
     """
     if request.method != 'POST':
       return jsonify({'error': 'Invalid request method'}), 400
@@ -111,32 +124,40 @@ def train_model():
     train_percentage = int(request.form.get('train_percentage'))
     test_percentage = int(request.form.get('test_percentage'))
 
+    tflite_quantization = request.form.get('tflite_quantization', tflite_export.QUANTIZATION_NONE)
+    if tflite_quantization not in tflite_export.QUANTIZATIONS:
+        return jsonify({'error': 'tflite_quantization must be one of: none, float16, int8'}), 400
+
+    # Версия для дообучения определяется сразу, чтобы задача не падала из-за несуществующей модели
+    warm_start_version = None
+    if request.form.get('warm_start'):
+        warm_start_result = resolve_warm_start(user_name, AI_Model_Type.LNN, trained_model_name, request.form.get('warm_start'))
+        if not warm_start_result.isSuccess:
+            return jsonify({'error': warm_start_result.errors}), 400
+        warm_start_version, _ = warm_start_result.result
+
     is_create_app = convert_param_is_create_app_to_bool(request.form.get('is_create_app'))
     
-    try:
-      trainer = LNN_Trainer(
-         AiModelNameConverter.convert(ai_model.lower()),
-         epochs,
-         batch_size,
-         neurons_in_layers,
-         activations,
-         optimizer,
-         user_name,
-         dataset_name,
-         train_percentage,
-         test_percentage)
-      trained_model = trainer.train_and_save(trained_model_name, is_create_app)
-
-      if not trained_model.isSuccess:
-         return jsonify({'error': f'{trained_model.errors}'}), 400
+    job = job_queue.submit_job(
+      'train-lnn-model',
+      training_tasks.train_lnn_model,
+      trainer_kwargs={
+         'ai_model': AiModelNameConverter.convert(ai_model.lower()),
+         'epochs': epochs,
+         'batch_size': batch_size,
+         'neurons_in_layers': neurons_in_layers,
+         'activations': activations,
+         'optimizer': optimizer,
+         'user_name': user_name,
+         'dataset_name': dataset_name,
+         'train_percentage': train_percentage,
+         'test_percentage': test_percentage,
+         'warm_start_version': warm_start_version,
+         'tflite_quantization': tflite_quantization},
+      trained_model_name=trained_model_name,
+      is_create_app=is_create_app)
 
-      return send_file(
-        trained_model.result,
-        mimetype='application/zip',
-        as_attachment=True,
-        download_name=os.path.basename(trained_model.result))
-    except Exception as ex:
-        abort(500, ex)
+    return jsonify({'job_id': job.id}), 202
 
 
 @train_lnn_models_bp.route('/optimize-train', methods=['POST'])
@@ -197,6 +218,47 @@ def optimize_train_model():
           type: string
         enum: ['sgd', 'rmsprop', 'adam', 'adadelta', 'adamax', 'nadam', 'ftrl']
         description: Возможные функции оптимизации ['sgd', 'rmsprop', 'adam', 'adadelta', 'adamax', 'nadam', 'ftrl']
+      - name: max_parallel_trials
+        in: formData
+        type: integer
+        minimum: 1
+        default: 1
+        required: false
+        description: Количество процессов, в которых одновременно обучаются конфигурации. 1 - последовательный перебор
+      - name: search_strategy
+        in: formData
+        type: string
+        enum: ['grid', 'hyperband', 'random', 'bayesian']
+        default: 'grid'
+        required: false
+        description: Стратегия поиска. grid - полный перебор, hyperband - конфигурации сначала обучаются на меньшем числе эпох, и на большее число эпох переходят только лучшие (значения epochs используются как ступени бюджета, нужно хотя бы два различных значения; продвинутая конфигурация продолжает обучение с весов предыдущей ступени), random - случайные конфигурации, bayesian - следующая конфигурация выбирается суррогатной моделью по результатам предыдущих
+      - name: eta
+        in: formData
+        type: integer
+        minimum: 2
+        default: 3
+        required: false
+        description: Для hyperband - во сколько раз сокращается число конфигураций при переходе к следующему значению эпох
+      - name: max_trials
+        in: formData
+        type: integer
+        minimum: 1
+        required: false
+        description: Максимальное количество проверяемых конфигураций для grid, random и bayesian. Каждая конфигурация обучается для всех значений epochs. По умолчанию - все пространство поиска
+      - name: execution_mode
+        in: formData
+        type: string
+        enum: ['single', 'ensemble']
+        default: 'single'
+        required: false
+        description: Режим обучения. single - каждая конфигурация обучается отдельной моделью, ensemble - конфигурации с одинаковыми оптимизатором и размером батча обучаются одной моделью с независимыми ветвями (быстрее для небольших сетей)
+      - name: ensemble_size
+        in: formData
+        type: integer
+        minimum: 1
+        default: 8
+        required: false
+        description: Для ensemble - максимальное количество конфигураций в одной модели
       - name: user_name
         in: formData
         type: string
@@ -218,9 +280,16 @@ def optimize_train_model():
         enum: ['no', 'yes']
         required: true
         description: Стоит ли создавать приложение по обученной модели
+      - name: tflite_quantization
+        in: formData
+        type: string
+        enum: ['none', 'float16', 'int8']
+        default: 'none'
+        required: false
+        description: Квантование TFLite модели, которая сохраняется рядом с .h5 и используется сервером для предсказаний. int8 калибруется по примерам обучающей выборки. Размер, время загрузки и задержка обоих форматов сохраняются в export_report.json модели
     responses:
-      200:
-        description: Model training parameters received
+      202:
+        description: Задача обучения поставлена в очередь. Статус - GET /api/jobs/{job_id}, модель - GET /api/jobs/{job_id}/artifact
     """
     if request.method != 'POST':
       return jsonify({'error': 'Invalid request method'}), 400
@@ -237,37 +306,52 @@ def optimize_train_model():
     neurons_per_layers = [int(neuron_count) for neuron_count in request.form.get('neurons_per_layers').split(',')]
     activation_functions = request.form.get('activation_functions').split(',')
     optimizers = request.form.get('optimizers').split(',')
+    max_parallel_trials = int(request.form.get('max_parallel_trials', 1))
+    search_strategy = request.form.get('search_strategy', 'grid')
+    eta = int(request.form.get('eta', 3))
+    max_trials = int(request.form.get('max_trials')) if request.form.get('max_trials') else None
+    execution_mode = request.form.get('execution_mode', 'single')
+    ensemble_size = int(request.form.get('ensemble_size', 8))
 
-    is_create_app = convert_param_is_create_app_to_bool(request.form.get('is_create_app'))
+    if search_strategy not in ('grid', 'hyperband', 'random', 'bayesian'):
+        return jsonify({'error': 'search_strategy must be one of: grid, hyperband, random, bayesian'}), 400
 
-    try:
-        # Создаем экземпляр тренера с новыми параметрами
-        trainer = LnnOptimizeTrainer(
-            AiModelNameConverter.convert(ai_model.lower()),
-            epochs=epochs,
-            hidden_layers=hidden_layers,
-            batch_sizes=batch_sizes,
-            neurons_per_layers=neurons_per_layers,
-            activation_functions=activation_functions,
-            optimizers=optimizers,
-            user_name=user_name,
-            dataset_name=dataset_name,
-        )
-        
-        # Запускаем обучение
-        trained_model = trainer.optimize_train(trained_model_name, is_create_app)
+    if search_strategy == 'hyperband' and len(set(epochs)) < 2:
+        return jsonify({'error': 'hyperband needs at least two different epochs values'}), 400
 
-        if not trained_model.isSuccess:
-            return jsonify({'error': f'{trained_model.errors}'}), 400
+    if execution_mode not in ('single', 'ensemble'):
+        return jsonify({'error': 'execution_mode must be one of: single, ensemble'}), 400
+
+    tflite_quantization = request.form.get('tflite_quantization', tflite_export.QUANTIZATION_NONE)
+    if tflite_quantization not in tflite_export.QUANTIZATIONS:
+        return jsonify({'error': 'tflite_quantization must be one of: none, float16, int8'}), 400
+
+    is_create_app = convert_param_is_create_app_to_bool(request.form.get('is_create_app'))
 
-        return send_file(
-            trained_model.result,
-            mimetype='application/zip',
-            as_attachment=True,
-            download_name=os.path.basename(trained_model.result))
+    job = job_queue.submit_job(
+        'optimize-train-lnn-model',
+        training_tasks.optimize_train_lnn_model,
+        trainer_kwargs={
+            'ai_model': AiModelNameConverter.convert(ai_model.lower()),
+            'epochs': epochs,
+            'hidden_layers': hidden_layers,
+            'batch_sizes': batch_sizes,
+            'neurons_per_layers': neurons_per_layers,
+            'activation_functions': activation_functions,
+            'optimizers': optimizers,
+            'user_name': user_name,
+            'dataset_name': dataset_name,
+            'max_parallel_trials': max_parallel_trials,
+            'search_strategy': search_strategy,
+            'eta': eta,
+            'max_trials': max_trials,
+            'execution_mode': execution_mode,
+            'ensemble_size': ensemble_size,
+            'tflite_quantization': tflite_quantization},
+        trained_model_name=trained_model_name,
+        is_create_app=is_create_app)
 
-    except Exception as ex:
-        abort(500, ex)
+    return jsonify({'job_id': job.id}), 202
 
 def convert_param_is_create_app_to_bool(is_create_app):
    return is_create_app == 'yes'
@@ -1,5 +1,7 @@
 import web_server.controllers_routes.datasets_routes as datasets_routes
+import web_server.controllers_routes.jobs_routes as jobs_routes
 import web_server.controllers_routes.models_routes as models_routes
+import web_server.controllers_routes.predict_routes as predict_routes
 import web_server.controllers_routes.train_cnn_models_routes as train_cnn_models_routes
 import web_server.controllers_routes.train_lnn_models_routes as train_lnn_models_routes
 
@@ -8,4 +10,6 @@ def init_routes(app):
     app.register_blueprint(datasets_routes.datasets_bp)
     app.register_blueprint(models_routes.models_bp)
     app.register_blueprint(train_cnn_models_routes.train_cnn_models_bp)
-    app.register_blueprint(train_lnn_models_routes.train_lnn_models_bp)
\ No newline at end of file
+    app.register_blueprint(train_lnn_models_routes.train_lnn_models_bp)
+    app.register_blueprint(jobs_routes.jobs_bp)
+    app.register_blueprint(predict_routes.predict_bp)
\ No newline at end of file